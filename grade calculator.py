@@ -32,32 +32,99 @@ import { Input } from "@/components/ui/input"
 import { Label } from "@/components/ui/label"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { Badge } from "@/components/ui/badge"
-import { LogOut, Plus, Trash2, Calculator, Award } from "lucide-react"
+import { LogOut, Plus, Trash2, Calculator, Award, Upload, Users, Download, Settings, Save } from "lucide-react"
+import { gradeCohort } from "@/lib/grading-engine"
+import { bandIndex, bandRanges, createGradeScale, DEFAULT_GRADE_SCALE, type GradeScale } from "@/lib/grade-scale"
+import {
+  averagePercentage,
+  EMPTY_CUMULATIVE,
+  excludeSubject,
+  gpa,
+  includeSubject,
+  includeTerm,
+  isValidSubject,
+  replaceSubject,
+  sumSubjects,
+  type TermTotals,
+  type WeightedSubject,
+} from "@/lib/term-totals"
+import { importMarkSheet, type ImportedCohort } from "@/lib/mark-sheet-import"
+import { EXPORT_TYPES, exportResults, saveStream, type ExportFormat } from "@/lib/results-export"
 
-interface Subject {
+interface Subject extends WeightedSubject {
   id: number
   name: string
-  marks: number
 }
 
+interface SavedTerm {
+  name: string
+  gpa: number
+  credits: number
+}
+
+type SubjectField = keyof WeightedSubject
+
+// An empty marks field counts as 0; anything else has to be a number
+const parseField = (field: SubjectField, text: string) => {
+  if (text.trim() === "") return field === "marks" ? 0 : Number.NaN
+  return Number(text)
+}
+
+const INITIAL_SUBJECTS: Subject[] = [
+  { id: 1, name: "Mathematics", marks: 0, maxMarks: 100, weight: 1, credits: 3 },
+  { id: 2, name: "Science", marks: 0, maxMarks: 100, weight: 1, credits: 3 },
+  { id: 3, name: "English", marks: 0, maxMarks: 100, weight: 1, credits: 3 },
+]
+
 interface GradeCalculatorProps {
   user: string
   onLogout: () => void
 }
 
 export default function GradeCalculator({ user, onLogout }: GradeCalculatorProps) {
-  const [subjects, setSubjects] = useState<Subject[]>([
-    { id: 1, name: "Mathematics", marks: 0 },
-    { id: 2, name: "Science", marks: 0 },
-    { id: 3, name: "English", marks: 0 },
-  ])
+  const [subjects, setSubjects] = useState<Subject[]>(INITIAL_SUBJECTS)
   const [newSubjectName, setNewSubjectName] = useState("")
   const [results, setResults] = useState<{
     totalMarks: number
+    totalMaxMarks: number
     averagePercentage: number
     grade: string
     gradeColor: string
+    gpa: number
+    cgpa: number
+    // The totals these results were worked out from
+    term: TermTotals
   } | null>(null)
+  const [scale, setScale] = useState<GradeScale>(DEFAULT_GRADE_SCALE)
+  // Kept in step with `subjects` one subject at a time, never re-summed per edit
+  const [totals, setTotals] = useState(() => sumSubjects(INITIAL_SUBJECTS, DEFAULT_GRADE_SCALE))
+  const [terms, setTerms] = useState<SavedTerm[]>([])
+  const [cumulative, setCumulative] = useState(EMPTY_CUMULATIVE)
+  const [scaleError, setScaleError] = useState("")
+  const [cohort, setCohort] = useState<ImportedCohort | null>(null)
+  const [importStatus, setImportStatus] = useState("")
+  const [importing, setImporting] = useState(false)
+  // Text typed into a subject's fields, kept until the field loses focus so
+  // a half-typed or briefly invalid value isn't thrown away
+  const [drafts, setDrafts] = useState<Record<number, Partial<Record<SubjectField, string>>>>({})
+
+  // A subject with its drafts applied
+  const draftSubject = (subject: Subject, draft = drafts[subject.id]) => {
+    const next = { ...subject }
+    for (const [field, text] of Object.entries(draft ?? {})) {
+      next[field as SubjectField] = parseField(field as SubjectField, text)
+    }
+    return next
+  }
+
+  const isInvalid = (subject: Subject) => subject.id in drafts && !isValidSubject(draftSubject(subject))
+  const hasInvalid = subjects.some(isInvalid)
+
+  const dropDrafts = (id: number) => {
+    const rest = { ...drafts }
+    delete rest[id]
+    setDrafts(rest)
+  }
 
   const addSubject = () => {
     if (newSubjectName.trim()) {
@@ -65,51 +132,131 @@ export default function GradeCalculator({ user, onLogout }: GradeCalculatorProps
         id: Date.now(),
         name: newSubjectName.trim(),
         marks: 0,
+        maxMarks: 100,
+        weight: 1,
+        credits: 3,
       }
       setSubjects([...subjects, newSubject])
+      setTotals(includeSubject(totals, newSubject, scale))
       setNewSubjectName("")
     }
   }
 
   const removeSubject = (id: number) => {
-    if (subjects.length > 1) {
+    const removed = subjects.find((subject) => subject.id === id)
+    if (removed && subjects.length > 1) {
       setSubjects(subjects.filter((subject) => subject.id !== id))
+      setTotals(excludeSubject(totals, removed, scale))
+      dropDrafts(id)
     }
   }
 
-  const updateMarks = (id: number, marks: number) => {
-    if (marks >= 0 && marks <= 100) {
-      setSubjects(subjects.map((subject) => (subject.id === id ? { ...subject, marks } : subject)))
+  // Marks, max marks, weight or credits for one subject. The subject only
+  // changes once all of its fields together make sense again, so lowering
+  // "Out of" below the marks just flags the row until the marks follow.
+  const editSubject = (id: number, field: SubjectField, text: string) => {
+    const previous = subjects.find((subject) => subject.id === id)
+    if (!previous) return
+
+    const draft = { ...drafts[id], [field]: text }
+    setDrafts({ ...drafts, [id]: draft })
+    const next = draftSubject(previous, draft)
+    if (isValidSubject(next)) {
+      setSubjects(subjects.map((subject) => (subject.id === id ? next : subject)))
+      setTotals(replaceSubject(totals, previous, next, scale))
     }
   }
 
-  const calculateGrade = (percentage: number): { grade: string; color: string } => {
-    if (percentage >= 90) return { grade: "A+", color: "bg-green-500" }
-    if (percentage >= 80) return { grade: "A", color: "bg-green-400" }
-    if (percentage >= 70) return { grade: "B+", color: "bg-blue-500" }
-    if (percentage >= 60) return { grade: "B", color: "bg-blue-400" }
-    if (percentage >= 50) return { grade: "C", color: "bg-yellow-500" }
-    return { grade: "F", color: "bg-red-500" }
+  // Valid drafts have already been applied; invalid ones stay on screen
+  const finishEditing = (subject: Subject) => {
+    if (subject.id in drafts && !isInvalid(subject)) dropDrafts(subject.id)
   }
 
   const calculateResults = () => {
-    const totalMarks = subjects.reduce((sum, subject) => sum + subject.marks, 0)
-    const averagePercentage = totalMarks / subjects.length
-    const { grade, color } = calculateGrade(averagePercentage)
+    const average = averagePercentage(totals)
+    const band = scale.bands[bandIndex(scale, average)]
 
     setResults({
-      totalMarks,
-      averagePercentage: Math.round(averagePercentage * 100) / 100,
-      grade,
-      gradeColor: color,
+      totalMarks: totals.totalMarks,
+      totalMaxMarks: totals.totalMaxMarks,
+      averagePercentage: Math.round(average * 100) / 100,
+      grade: band.grade,
+      gradeColor: band.color,
+      gpa: gpa(totals),
+      cgpa: gpa(includeTerm(cumulative, totals)),
+      term: totals,
     })
   }
 
   const resetCalculator = () => {
-    setSubjects(subjects.map((subject) => ({ ...subject, marks: 0 })))
+    const cleared = subjects.map((subject) => ({ ...subject, marks: 0 }))
+    setSubjects(cleared)
+    setTotals(sumSubjects(cleared, scale))
+    setDrafts({})
     setResults(null)
   }
 
+  // Any edit replaces the totals, so this is false once the form has
+  // changed since the last Calculate
+  const calculated = results !== null && results.term === totals
+
+  // Closes the term exactly as last calculated: its GPA counts towards the
+  // CGPA and marks start over
+  const saveTerm = () => {
+    if (!results || !calculated) return
+    const { term } = results
+    setTerms([...terms, { name: `Term ${terms.length + 1}`, gpa: gpa(term), credits: term.credits }])
+    setCumulative(includeTerm(cumulative, term))
+    resetCalculator()
+  }
+
+  const importSheet = async (file: File) => {
+    setImporting(true)
+    setImportStatus("Reading mark sheet...")
+    try {
+      const imported = await importMarkSheet(
+        file,
+        ({ students }) => setImportStatus(`Imported ${students.toLocaleString()} students...`),
+        scale,
+      )
+      setCohort(imported)
+      setImportStatus(
+        `Imported ${imported.results.summary.studentCount.toLocaleString()} students` +
+          (imported.invalidRows > 0 ? `, skipped ${imported.invalidRows.toLocaleString()} invalid rows` : ""),
+      )
+    } catch (error) {
+      setImportStatus(error instanceof Error ? error.message : "Import failed")
+    }
+    setImporting(false)
+  }
+
+  // A school's own scale, as a JSON list of bands
+  const loadScale = async (file: File) => {
+    try {
+      const loaded = createGradeScale(JSON.parse(await file.text()))
+      setScale(loaded)
+      setScaleError("")
+      // Grade points depend on the scale, so the running totals start over
+      setTotals(sumSubjects(subjects, loaded))
+      // Grades already on screen were worked out with the old scale
+      setResults(null)
+      if (cohort) {
+        setCohort({ ...cohort, results: gradeCohort(cohort.matrix, loaded) })
+      }
+    } catch (error) {
+      setScaleError(error instanceof Error ? `Invalid grade scale: ${error.message}` : "Invalid grade scale")
+    }
+  }
+
+  const exportCohort = async (format: ExportFormat) => {
+    if (!cohort) return
+    try {
+      await saveStream(exportResults(cohort, format, scale), `class-results.${format}`, EXPORT_TYPES[format])
+    } catch (error) {
+      setImportStatus(error instanceof Error ? `Export failed: ${error.message}` : "Export failed")
+    }
+  }
+
   return (
     <div className="min-h-screen p-4">
       <div className="max-w-4xl mx-auto">
@@ -133,7 +280,7 @@ export default function GradeCalculator({ user, onLogout }: GradeCalculatorProps
                 <Calculator className="h-5 w-5 mr-2" />
                 Enter Marks
               </CardTitle>
-              <CardDescription>Enter marks for each subject (out of 100)</CardDescription>
+              <CardDescription>Enter marks for each subject, with its maximum, weight and credit hours</CardDescription>
             </CardHeader>
             <CardContent className="space-y-4">
               {/* Add New Subject */}
@@ -151,37 +298,102 @@ export default function GradeCalculator({ user, onLogout }: GradeCalculatorProps
 
               {/* Subjects List */}
               <div className="space-y-3">
-                {subjects.map((subject) => (
-                  <div key={subject.id} className="flex items-center gap-2">
-                    <div className="flex-1">
-                      <Label className="text-sm font-medium">{subject.name}</Label>
-                      <Input
-                        type="number"
-                        min="0"
-                        max="100"
-                        value={subject.marks || ""}
-                        onChange={(e) => updateMarks(subject.id, Number.parseInt(e.target.value) || 0)}
-                        placeholder="0-100"
-                        className="mt-1"
-                      />
+                <div className="grid grid-cols-4 gap-2 text-xs text-gray-500 pr-12">
+                  <span>Marks</span>
+                  <span>Out of</span>
+                  <span>Weight</span>
+                  <span>Credits</span>
+                </div>
+                {subjects.map((subject) => {
+                  const draft = drafts[subject.id] ?? {}
+                  const invalid = isInvalid(subject)
+                  const inputClass = invalid ? "border-red-500" : undefined
+
+                  return (
+                    <div key={subject.id} className="flex items-center gap-2">
+                      <div className="flex-1">
+                        <Label className="text-sm font-medium">{subject.name}</Label>
+                        <div className="grid grid-cols-4 gap-2 mt-1">
+                          <Input
+                            type="number"
+                            min="0"
+                            max={subject.maxMarks}
+                            value={draft.marks ?? (subject.marks || "")}
+                            onChange={(e) => editSubject(subject.id, "marks", e.target.value)}
+                            onBlur={() => finishEditing(subject)}
+                            placeholder={`0-${subject.maxMarks}`}
+                            className={inputClass}
+                            aria-invalid={invalid}
+                            aria-label="Marks"
+                          />
+                          <Input
+                            type="number"
+                            min="1"
+                            value={draft.maxMarks ?? subject.maxMarks}
+                            onChange={(e) => editSubject(subject.id, "maxMarks", e.target.value)}
+                            onBlur={() => finishEditing(subject)}
+                            title="Out of"
+                            className={inputClass}
+                            aria-invalid={invalid}
+                            aria-label="Out of"
+                          />
+                          <Input
+                            type="number"
+                            min="0"
+                            step="0.5"
+                            value={draft.weight ?? subject.weight}
+                            onChange={(e) => editSubject(subject.id, "weight", e.target.value)}
+                            onBlur={() => finishEditing(subject)}
+                            title="Weight"
+                            className={inputClass}
+                            aria-invalid={invalid}
+                            aria-label="Weight"
+                          />
+                          <Input
+                            type="number"
+                            min="0"
+                            value={draft.credits ?? subject.credits}
+                            onChange={(e) => editSubject(subject.id, "credits", e.target.value)}
+                            onBlur={() => finishEditing(subject)}
+                            title="Credit hours"
+                            className={inputClass}
+                            aria-invalid={invalid}
+                            aria-label="Credit hours"
+                          />
+                        </div>
+                      </div>
+                      {subjects.length > 1 && (
+                        <Button variant="outline" size="sm" onClick={() => removeSubject(subject.id)} className="mt-6">
+                          <Trash2 className="h-4 w-4" />
+                        </Button>
+                      )}
                     </div>
-                    {subjects.length > 1 && (
-                      <Button variant="outline" size="sm" onClick={() => removeSubject(subject.id)} className="mt-6">
-                        <Trash2 className="h-4 w-4" />
-                      </Button>
-                    )}
-                  </div>
-                ))}
+                  )
+                })}
               </div>
+              {hasInvalid && (
+                <div className="text-sm text-red-600 bg-red-50 p-2 rounded">
+                  Every field needs a number: marks from 0 up to "Out of", which must be above 0, and weight and
+                  credits of 0 or more.
+                </div>
+              )}
 
               {/* Action Buttons */}
               <div className="flex gap-2 pt-4">
-                <Button onClick={calculateResults} className="flex-1">
+                <Button onClick={calculateResults} className="flex-1" disabled={hasInvalid}>
                   Calculate Grade
                 </Button>
                 <Button variant="outline" onClick={resetCalculator}>
                   Reset
                 </Button>
+                <Button
+                  variant="outline"
+                  onClick={saveTerm}
+                  disabled={!calculated}
+                  title={calculated ? "Save this term towards the CGPA" : "Calculate the grade before saving the term"}
+                >
+                  <Save className="h-4 w-4" />
+                </Button>
               </div>
             </CardContent>
           </Card>
@@ -203,19 +415,31 @@ export default function GradeCalculator({ user, onLogout }: GradeCalculatorProps
                     <div className="bg-blue-50 p-4 rounded-lg">
                       <p className="text-sm text-blue-600 font-medium">Total Marks</p>
                       <p className="text-2xl font-bold text-blue-800">
-                        {results.totalMarks}/{subjects.length * 100}
+                        {results.totalMarks}/{results.totalMaxMarks}
                       </p>
                     </div>
                     <div className="bg-purple-50 p-4 rounded-lg">
-                      <p className="text-sm text-purple-600 font-medium">Average %</p>
+                      <p className="text-sm text-purple-600 font-medium">Weighted Average %</p>
                       <p className="text-2xl font-bold text-purple-800">{results.averagePercentage}%</p>
                     </div>
+                    <div className="bg-green-50 p-4 rounded-lg">
+                      <p className="text-sm text-green-600 font-medium">Term GPA</p>
+                      <p className="text-2xl font-bold text-green-800">{results.gpa.toFixed(2)}</p>
+                    </div>
+                    <div className="bg-yellow-50 p-4 rounded-lg">
+                      <p className="text-sm text-yellow-600 font-medium">
+                        {terms.length > 0 ? `CGPA (${terms.length} saved + this term)` : "CGPA (this term only)"}
+                      </p>
+                      <p className="text-2xl font-bold text-yellow-800">{results.cgpa.toFixed(2)}</p>
+                    </div>
                   </div>
 
                   {/* Grade Badge */}
                   <div className="text-center">
                     <p className="text-sm text-gray-600 mb-2">Your Grade</p>
-                    <Badge className={`${results.gradeColor} text-white text-2xl px-6 py-2`}>{results.grade}</Badge>
+                    <Badge className="text-white text-2xl px-6 py-2" style={{ backgroundColor: results.gradeColor }}>
+                      {results.grade}
+                    </Badge>
                   </div>
 
                   {/* Subject Breakdown */}
@@ -225,40 +449,43 @@ export default function GradeCalculator({ user, onLogout }: GradeCalculatorProps
                       {subjects.map((subject) => (
                         <div key={subject.id} className="flex justify-between items-center p-2 bg-gray-50 rounded">
                           <span className="font-medium">{subject.name}</span>
-                          <span className="text-lg font-bold">{subject.marks}/100</span>
+                          <span className="text-lg font-bold">
+                            {subject.marks}/{subject.maxMarks}
+                          </span>
                         </div>
                       ))}
                     </div>
                   </div>
 
+                  {/* Previous Terms */}
+                  {terms.length > 0 && (
+                    <div>
+                      <h4 className="font-semibold mb-3">Previous Terms</h4>
+                      <div className="space-y-2">
+                        {terms.map((term) => (
+                          <div key={term.name} className="flex justify-between items-center p-2 bg-gray-50 rounded">
+                            <span className="font-medium">{term.name}</span>
+                            <span>
+                              GPA {term.gpa.toFixed(2)} · {term.credits} credits
+                            </span>
+                          </div>
+                        ))}
+                      </div>
+                    </div>
+                  )}
+
                   {/* Grade Scale */}
                   <div>
                     <h4 className="font-semibold mb-3">Grade Scale</h4>
                     <div className="text-sm space-y-1">
-                      <div className="flex justify-between">
-                        <span>A+ (90-100%)</span>
-                        <span>Excellent</span>
-                      </div>
-                      <div className="flex justify-between">
-                        <span>A (80-89%)</span>
-                        <span>Very Good</span>
-                      </div>
-                      <div className="flex justify-between">
-                        <span>B+ (70-79%)</span>
-                        <span>Good</span>
-                      </div>
-                      <div className="flex justify-between">
-                        <span>B (60-69%)</span>
-                        <span>Satisfactory</span>
-                      </div>
-                      <div className="flex justify-between">
-                        <span>C (50-59%)</span>
-                        <span>Pass</span>
-                      </div>
-                      <div className="flex justify-between">
-                        <span>F (Below 50%)</span>
-                        <span>Fail</span>
-                      </div>
+                      {bandRanges(scale).map(({ band, range }) => (
+                        <div key={band.grade} className="flex justify-between">
+                          <span>
+                            {band.grade} ({range})
+                          </span>
+                          <span>{band.label}</span>
+                        </div>
+                      ))}
                     </div>
                   </div>
                 </div>
@@ -271,6 +498,135 @@ export default function GradeCalculator({ user, onLogout }: GradeCalculatorProps
             </CardContent>
           </Card>
         </div>
+
+        {/* Class Import */}
+        <Card className="mt-6">
+          <CardHeader>
+            <CardTitle className="flex items-center">
+              <Users className="h-5 w-5 mr-2" />
+              Class Results
+            </CardTitle>
+            <CardDescription>
+              Import a CSV mark sheet: a header row of student, subject, subject, ... then one row per student
+            </CardDescription>
+          </CardHeader>
+          <CardContent className="space-y-4">
+            <div className="flex items-center gap-2">
+              <Label
+                htmlFor="mark-sheet"
+                className="inline-flex items-center cursor-pointer rounded-md border px-3 py-2 text-sm font-medium"
+              >
+                <Upload className="h-4 w-4 mr-2" />
+                Import mark sheet
+              </Label>
+              <Input
+                id="mark-sheet"
+                type="file"
+                accept=".csv,.tsv,text/csv"
+                className="hidden"
+                disabled={importing}
+                onChange={(e) => {
+                  const file = e.target.files?.[0]
+                  if (file) importSheet(file)
+                  e.target.value = ""
+                }}
+              />
+              {cohort && (
+                <>
+                  <Button variant="outline" size="sm" onClick={() => exportCohort("csv")}>
+                    <Download className="h-4 w-4 mr-2" />
+                    CSV
+                  </Button>
+                  <Button variant="outline" size="sm" onClick={() => exportCohort("jsonl")}>
+                    <Download className="h-4 w-4 mr-2" />
+                    JSON Lines
+                  </Button>
+                </>
+              )}
+              <Label
+                htmlFor="grade-scale"
+                className="inline-flex items-center cursor-pointer rounded-md border px-3 py-2 text-sm font-medium"
+              >
+                <Settings className="h-4 w-4 mr-2" />
+                Load grade scale
+              </Label>
+              <Input
+                id="grade-scale"
+                type="file"
+                accept=".json,application/json"
+                className="hidden"
+                onChange={(e) => {
+                  const file = e.target.files?.[0]
+                  if (file) loadScale(file)
+                  e.target.value = ""
+                }}
+              />
+              {importStatus && <p className="text-sm text-gray-600">{importStatus}</p>}
+            </div>
+            {scaleError && <div className="text-sm text-red-600 bg-red-50 p-2 rounded">{scaleError}</div>}
+
+            {cohort && (
+              <div className="space-y-4">
+                <div className="grid grid-cols-2 md:grid-cols-5 gap-4">
+                  <div className="bg-blue-50 p-4 rounded-lg">
+                    <p className="text-sm text-blue-600 font-medium">Students</p>
+                    <p className="text-2xl font-bold text-blue-800">
+                      {cohort.results.summary.studentCount.toLocaleString()}
+                    </p>
+                  </div>
+                  <div className="bg-purple-50 p-4 rounded-lg">
+                    <p className="text-sm text-purple-600 font-medium">Class Average %</p>
+                    <p className="text-2xl font-bold text-purple-800">
+                      {Math.round(cohort.results.summary.meanPercentage * 100) / 100}%
+                    </p>
+                  </div>
+                  <div className="bg-green-50 p-4 rounded-lg">
+                    <p className="text-sm text-green-600 font-medium">Pass Rate</p>
+                    <p className="text-2xl font-bold text-green-800">
+                      {Math.round(cohort.results.summary.passRate * 1000) / 10}%
+                    </p>
+                  </div>
+                  <div className="bg-gray-50 p-4 rounded-lg">
+                    <p className="text-sm text-gray-600 font-medium">Std. Deviation</p>
+                    <p className="text-2xl font-bold text-gray-800">
+                      {Math.round(cohort.results.summary.stdDevPercentage * 100) / 100}
+                    </p>
+                  </div>
+                  <div className="bg-yellow-50 p-4 rounded-lg">
+                    <p className="text-sm text-yellow-600 font-medium">Mean Grade Points</p>
+                    <p className="text-2xl font-bold text-yellow-800">
+                      {cohort.results.summary.meanPoints.toFixed(2)}
+                    </p>
+                  </div>
+                </div>
+
+                <div>
+                  <h4 className="font-semibold mb-3">Grade Distribution</h4>
+                  <div className="flex flex-wrap gap-2">
+                    {scale.bands.map((band, index) => (
+                      <Badge key={band.grade} className="text-white" style={{ backgroundColor: band.color }}>
+                        {band.grade}: {cohort.results.summary.bandCounts[index].toLocaleString()}
+                      </Badge>
+                    ))}
+                  </div>
+                </div>
+
+                {cohort.errors.length > 0 && (
+                  <div>
+                    <h4 className="font-semibold mb-3">Skipped Rows</h4>
+                    <div className="text-sm text-red-600 bg-red-50 p-2 rounded space-y-1 max-h-40 overflow-y-auto">
+                      {cohort.errors.map((error) => (
+                        <p key={error.line}>
+                          Row {error.line}: {error.message}
+                        </p>
+                      ))}
+                    </div>
+                  </div>
+                )}
+              </div>
+            )}
+          </CardContent>
+        </Card>
       </div>
     </div>
   )
@@ -373,3 +729,884 @@ export default function LoginPage({ onLogin }: LoginPageProps) {
     </div>
   )
 }
+import { bandIndex, DEFAULT_GRADE_SCALE } from "@/lib/grade-scale"
+
+// Batch grading for a whole class or cohort in one pass.
+//
+// Marks live in a flat, row-major Float32Array: student i's mark for subject j
+// is at i * subjectCount + j. gradeCohort walks it once, front to back, and
+// writes per-student totals, averages and grade bands into typed arrays while
+// accumulating the cohort summary, so tens of thousands of students grade in
+// a few milliseconds with no per-student objects.
+
+export const MAX_MARKS = 100
+
+export interface MarksMatrix {
+  studentCount: number
+  subjectCount: number
+  marks: Float32Array
+}
+
+export interface CohortSummary {
+  studentCount: number
+  meanPercentage: number
+  minPercentage: number
+  maxPercentage: number
+  stdDevPercentage: number
+  passRate: number
+  // Average grade points across the cohort
+  meanPoints: number
+  // Students per band, indexed like the scale's bands
+  bandCounts: Uint32Array
+  subjectAverages: Float64Array
+}
+
+export interface CohortResults {
+  totals: Float64Array
+  averages: Float64Array
+  // Index into the scale's bands for each student
+  bands: Uint8Array
+  summary: CohortSummary
+}
+
+export function createMarksMatrix(studentCount: number, subjectCount: number): MarksMatrix {
+  return { studentCount, subjectCount, marks: new Float32Array(studentCount * subjectCount) }
+}
+
+// Running cohort statistics, fed one student at a time. gradeCohort uses it
+// over a whole matrix; streaming consumers can use it directly and never hold
+// more than the current student.
+export class CohortAccumulator {
+  // The most recently added student
+  total = 0
+  average = 0
+  band = 0
+
+  readonly bandCounts: Uint32Array
+  private readonly subjectTotals: Float64Array
+  // 1 for each band that counts as a pass
+  private readonly passing: Uint8Array
+  private studentCount = 0
+  private sum = 0
+  private sumOfSquares = 0
+  private min = Infinity
+  private max = -Infinity
+  private passed = 0
+  private points = 0
+
+  constructor(
+    private readonly subjectCount: number,
+    private readonly scale = DEFAULT_GRADE_SCALE,
+  ) {
+    this.bandCounts = new Uint32Array(scale.bands.length)
+    this.subjectTotals = new Float64Array(subjectCount)
+    this.passing = Uint8Array.from(scale.bands, (band) => (band.pass ? 1 : 0))
+  }
+
+  // Grades the student whose marks start at `offset` and returns their band
+  add(marks: Float32Array, offset: number) {
+    const { subjectCount, subjectTotals } = this
+    let total = 0
+    for (let subject = 0; subject < subjectCount; subject++) {
+      const mark = marks[offset + subject]
+      total += mark
+      subjectTotals[subject] += mark
+    }
+
+    const average = subjectCount > 0 ? total / subjectCount : 0
+    const band = bandIndex(this.scale, average)
+    this.total = total
+    this.average = average
+    this.band = band
+
+    this.studentCount++
+    this.bandCounts[band]++
+    this.sum += average
+    this.sumOfSquares += average * average
+    if (average < this.min) this.min = average
+    if (average > this.max) this.max = average
+    this.passed += this.passing[band]
+    this.points += this.scale.bands[band].points
+    return band
+  }
+
+  summary(): CohortSummary {
+    const { studentCount, subjectCount } = this
+    const subjectAverages = new Float64Array(subjectCount)
+    for (let subject = 0; subject < subjectCount; subject++) {
+      subjectAverages[subject] = studentCount > 0 ? this.subjectTotals[subject] / studentCount : 0
+    }
+
+    const mean = studentCount > 0 ? this.sum / studentCount : 0
+    // Population standard deviation; clamped since rounding can leave the variance a hair below zero
+    const variance = studentCount > 0 ? Math.max(this.sumOfSquares / studentCount - mean * mean, 0) : 0
+    return {
+      studentCount,
+      meanPercentage: mean,
+      minPercentage: studentCount > 0 ? this.min : 0,
+      maxPercentage: studentCount > 0 ? this.max : 0,
+      stdDevPercentage: Math.sqrt(variance),
+      passRate: studentCount > 0 ? this.passed / studentCount : 0,
+      meanPoints: studentCount > 0 ? this.points / studentCount : 0,
+      bandCounts: this.bandCounts,
+      subjectAverages,
+    }
+  }
+}
+
+export function gradeCohort(
+  { studentCount, subjectCount, marks }: MarksMatrix,
+  scale = DEFAULT_GRADE_SCALE,
+): CohortResults {
+  const totals = new Float64Array(studentCount)
+  const averages = new Float64Array(studentCount)
+  const bandIndexes = new Uint8Array(studentCount)
+  const accumulator = new CohortAccumulator(subjectCount, scale)
+
+  for (let student = 0; student < studentCount; student++) {
+    bandIndexes[student] = accumulator.add(marks, student * subjectCount)
+    totals[student] = accumulator.total
+    averages[student] = accumulator.average
+  }
+
+  return { totals, averages, bands: bandIndexes, summary: accumulator.summary() }
+}
+
+// One student's row of a graded cohort, in the shape the calculator displays
+export function studentResult(results: CohortResults, student: number, scale = DEFAULT_GRADE_SCALE) {
+  const band = scale.bands[results.bands[student]]
+  return {
+    totalMarks: results.totals[student],
+    averagePercentage: Math.round(results.averages[student] * 100) / 100,
+    grade: band.grade,
+    gradeColor: band.color,
+    gradePoints: band.points,
+  }
+}
+import { MAX_MARKS, type MarksMatrix } from "@/lib/grading-engine"
+
+// Row-by-row mark-sheet parsing. Nothing here holds more than the current
+// row: CsvParser turns text chunks into rows as they arrive, and
+// MarkSheetBuilder validates each row straight into a growing marks matrix.
+//
+// Sheet layout: a header row of `student, subject, subject, ...`, then one
+// row per student with a mark out of 100 for every subject.
+
+const QUOTE = 34
+const LF = 10
+const CR = 13
+
+const FIELD_START = 0
+const UNQUOTED = 1
+const QUOTED = 2
+const QUOTE_IN_QUOTED = 3
+
+// RFC 4180 CSV, fed in arbitrary chunks: a field, quote or line ending may be
+// split across two pushes. The row array passed to onRow is reused for the
+// next row, so callers copy whatever they keep.
+export class CsvParser {
+  private state = FIELD_START
+  private field = ""
+  private readonly row: string[] = []
+  private readonly delimiter: number
+
+  constructor(
+    private readonly onRow: (fields: string[]) => void,
+    delimiter = ",",
+  ) {
+    this.delimiter = delimiter.charCodeAt(0)
+  }
+
+  push(chunk: string) {
+    // Start of the run of chunk text not yet copied into `field`
+    let start = 0
+    for (let i = 0; i < chunk.length; i++) {
+      const code = chunk.charCodeAt(i)
+
+      if (this.state === QUOTED) {
+        if (code === QUOTE) {
+          this.field += chunk.slice(start, i)
+          this.state = QUOTE_IN_QUOTED
+        }
+        continue
+      }
+      if (this.state === QUOTE_IN_QUOTED) {
+        if (code === QUOTE) {
+          // "" inside quotes is a literal quote
+          this.field += '"'
+          this.state = QUOTED
+          start = i + 1
+          continue
+        }
+        this.state = UNQUOTED
+        start = i
+      }
+
+      if (code === this.delimiter) {
+        this.field += chunk.slice(start, i)
+        this.endField()
+        start = i + 1
+      } else if (code === LF) {
+        this.field += chunk.slice(start, i)
+        this.endField()
+        this.endRow()
+        start = i + 1
+      } else if (code === CR) {
+        this.field += chunk.slice(start, i)
+        start = i + 1
+      } else if (code === QUOTE && this.state === FIELD_START) {
+        this.state = QUOTED
+        start = i + 1
+      } else {
+        this.state = UNQUOTED
+      }
+    }
+
+    if (this.state !== QUOTE_IN_QUOTED) {
+      this.field += chunk.slice(start)
+    }
+  }
+
+  // Ends the last row when the input doesn't finish with a newline
+  flush() {
+    if (this.state !== FIELD_START || this.field !== "" || this.row.length > 0) {
+      this.endField()
+      this.endRow()
+    }
+  }
+
+  private endField() {
+    this.row.push(this.field)
+    this.field = ""
+    this.state = FIELD_START
+  }
+
+  private endRow() {
+    this.onRow(this.row)
+    this.row.length = 0
+  }
+}
+
+export interface ImportError {
+  line: number
+  message: string
+}
+
+// Only the first few problems are kept; the rest are just counted
+const MAX_REPORTED_ERRORS = 100
+const INITIAL_CAPACITY = 1024
+
+export class MarkSheetBuilder {
+  subjects: string[] = []
+  readonly studentIds: string[] = []
+  readonly errors: ImportError[] = []
+  invalidRows = 0
+  private marks = new Float32Array(0)
+  private line = 0
+  private headerRead = false
+
+  get studentCount() {
+    return this.studentIds.length
+  }
+
+  addRow(fields: string[]) {
+    this.line++
+    if (fields.length === 1 && fields[0].trim() === "") return
+
+    if (!this.headerRead) {
+      this.headerRead = true
+      this.subjects = fields.slice(1).map((name) => name.trim())
+      if (this.subjects.length === 0) this.reject("The header needs at least one subject column")
+      return
+    }
+
+    const subjectCount = this.subjects.length
+    if (subjectCount === 0) return
+    if (fields.length !== subjectCount + 1) {
+      this.reject(`Expected ${subjectCount + 1} columns, found ${fields.length}`)
+      return
+    }
+
+    const student = this.studentCount
+    this.reserve(student + 1)
+    const offset = student * subjectCount
+    for (let subject = 0; subject < subjectCount; subject++) {
+      const text = fields[subject + 1].trim()
+      const mark = text === "" ? NaN : Number(text)
+      // Same range the calculator enforces when marks are typed in
+      if (!(mark >= 0 && mark <= MAX_MARKS)) {
+        this.reject(`${this.subjects[subject]} mark must be between 0 and ${MAX_MARKS}, got "${text}"`)
+        return
+      }
+      this.marks[offset + subject] = mark
+    }
+    this.studentIds.push(fields[0].trim())
+  }
+
+  // A view over the rows added so far; it shares the builder's buffer
+  toMatrix(): MarksMatrix {
+    const subjectCount = this.subjects.length
+    return {
+      studentCount: this.studentCount,
+      subjectCount,
+      marks: this.marks.subarray(0, this.studentCount * subjectCount),
+    }
+  }
+
+  private reserve(students: number) {
+    const needed = students * this.subjects.length
+    if (needed <= this.marks.length) return
+
+    const grown = new Float32Array(Math.max(needed, this.marks.length * 2, INITIAL_CAPACITY))
+    grown.set(this.marks)
+    this.marks = grown
+  }
+
+  private reject(message: string) {
+    this.invalidRows++
+    if (this.errors.length < MAX_REPORTED_ERRORS) {
+      this.errors.push({ line: this.line, message })
+    }
+  }
+}
+import { gradeCohort } from "@/lib/grading-engine"
+import { createGradeScale } from "@/lib/grade-scale"
+import { CsvParser, MarkSheetBuilder } from "@/lib/mark-sheet"
+import type { ImportRequest, ImportMessage } from "@/lib/mark-sheet-import"
+
+// Web Worker side of importMarkSheet. The file is streamed through the parser
+// a chunk at a time, so only the marks matrix ever grows with the sheet.
+
+const PROGRESS_INTERVAL_MS = 100
+
+const post = (message: ImportMessage, transfer: Transferable[] = []) => self.postMessage(message, transfer)
+
+self.onmessage = async (event: MessageEvent<ImportRequest>) => {
+  const { file, bands } = event.data
+  try {
+    // Only the bands are sent over; the lookup table is cheap to rebuild
+    const scale = createGradeScale(bands)
+    const builder = new MarkSheetBuilder()
+    const parser = new CsvParser((fields) => builder.addRow(fields), /\.tsv$/i.test(file.name) ? "\t" : ",")
+
+    const reader = file.stream().pipeThrough(new TextDecoderStream()).getReader()
+    let lastProgress = 0
+    for (;;) {
+      const { done, value } = await reader.read()
+      if (done) break
+      parser.push(value)
+
+      const now = performance.now()
+      if (now - lastProgress >= PROGRESS_INTERVAL_MS) {
+        lastProgress = now
+        post({ type: "progress", students: builder.studentCount, invalidRows: builder.invalidRows })
+      }
+    }
+    parser.flush()
+
+    const matrix = builder.toMatrix()
+    const results = gradeCohort(matrix, scale)
+    post(
+      {
+        type: "done",
+        cohort: {
+          subjects: builder.subjects,
+          studentIds: builder.studentIds,
+          matrix,
+          results,
+          errors: builder.errors,
+          invalidRows: builder.invalidRows,
+        },
+      },
+      [matrix.marks.buffer, results.totals.buffer, results.averages.buffer, results.bands.buffer],
+    )
+  } catch (error) {
+    post({ type: "error", message: error instanceof Error ? error.message : String(error) })
+  }
+}
+import type { CohortResults, MarksMatrix } from "@/lib/grading-engine"
+import { DEFAULT_GRADE_SCALE, type GradeBand } from "@/lib/grade-scale"
+import type { ImportError } from "@/lib/mark-sheet"
+
+// Imports a CSV (or TSV) mark sheet off the main thread. Parsing, validation
+// and grading all happen in a Web Worker that streams the file, so even very
+// large sheets never block the page or sit in memory as text.
+
+export interface ImportedCohort {
+  subjects: string[]
+  studentIds: string[]
+  matrix: MarksMatrix
+  results: CohortResults
+  // The first problems found; invalidRows counts all of them
+  errors: ImportError[]
+  invalidRows: number
+}
+
+export interface ImportProgress {
+  students: number
+  invalidRows: number
+}
+
+export interface ImportRequest {
+  file: File
+  bands: GradeBand[]
+}
+
+export type ImportMessage =
+  | ({ type: "progress" } & ImportProgress)
+  | { type: "done"; cohort: ImportedCohort }
+  | { type: "error"; message: string }
+
+export function importMarkSheet(
+  file: File,
+  onProgress?: (progress: ImportProgress) => void,
+  scale = DEFAULT_GRADE_SCALE,
+) {
+  // Spreadsheet workbooks are zip archives that can't be read row by row
+  if (/\.xlsx?$/i.test(file.name)) {
+    return Promise.reject(new Error("Excel workbooks aren't supported yet. Save the sheet as CSV and import that."))
+  }
+
+  return new Promise<ImportedCohort>((resolve, reject) => {
+    const worker = new Worker(new URL("./mark-sheet-import.worker.ts", import.meta.url))
+
+    worker.onmessage = (event: MessageEvent<ImportMessage>) => {
+      const message = event.data
+      if (message.type === "progress") {
+        onProgress?.(message)
+        return
+      }
+
+      worker.terminate()
+      if (message.type === "done") {
+        resolve(message.cohort)
+      } else {
+        reject(new Error(message.message))
+      }
+    }
+    worker.onerror = (event) => {
+      worker.terminate()
+      reject(new Error(event.message || "Import failed"))
+    }
+
+    const request: ImportRequest = { file, bands: scale.bands }
+    worker.postMessage(request)
+  })
+}
+import { CohortAccumulator, type CohortSummary, type MarksMatrix } from "@/lib/grading-engine"
+import { DEFAULT_GRADE_SCALE, type GradeScale } from "@/lib/grade-scale"
+
+// Streams graded results out as CSV or JSON Lines. Students are graded as
+// each chunk is pulled, so the stream only runs as fast as its reader takes
+// chunks and never holds more than one chunk of output. The cohort summary
+// follows the last student.
+
+export type ExportFormat = "csv" | "jsonl"
+
+export interface ExportSource {
+  subjects: string[]
+  studentIds: string[]
+  matrix: MarksMatrix
+}
+
+const STUDENTS_PER_CHUNK = 1000
+// Chunks buffered ahead of the reader before pulling stops
+const HIGH_WATER_MARK = 4
+
+export const EXPORT_TYPES: Record<ExportFormat, string> = {
+  csv: "text/csv",
+  jsonl: "application/x-ndjson",
+}
+
+export function exportResults(
+  { subjects, studentIds, matrix }: ExportSource,
+  format: ExportFormat,
+  scale = DEFAULT_GRADE_SCALE,
+) {
+  const { studentCount, subjectCount, marks } = matrix
+  const encoder = new TextEncoder()
+  const accumulator = new CohortAccumulator(subjectCount, scale)
+  let student = 0
+
+  return new ReadableStream<Uint8Array>(
+    {
+      start(controller) {
+        if (format === "csv") {
+          controller.enqueue(encoder.encode(csvRow(["student", ...subjects, "total", "average", "grade", "points"])))
+        }
+      },
+
+      pull(controller) {
+        let text = ""
+        const end = Math.min(student + STUDENTS_PER_CHUNK, studentCount)
+        for (; student < end; student++) {
+          const offset = student * subjectCount
+          const { grade, points } = scale.bands[accumulator.add(marks, offset)]
+          // Marks are stored as float32, so 72.3 would otherwise print as 72.30000305175781
+          const total = round(accumulator.total)
+          const average = round(accumulator.average)
+
+          if (format === "csv") {
+            const row: (string | number)[] = [studentIds[student]]
+            for (let subject = 0; subject < subjectCount; subject++) row.push(round(marks[offset + subject]))
+            row.push(total, average, grade, points)
+            text += csvRow(row)
+          } else {
+            const studentMarks: Record<string, number> = {}
+            for (let subject = 0; subject < subjectCount; subject++) {
+              studentMarks[subjects[subject]] = round(marks[offset + subject])
+            }
+            text += `${JSON.stringify({
+              type: "student",
+              student: studentIds[student],
+              marks: studentMarks,
+              total,
+              average,
+              grade,
+              points,
+            })}\n`
+          }
+        }
+
+        if (student === studentCount) {
+          text += formatSummary(accumulator.summary(), subjects, format, scale)
+          controller.enqueue(encoder.encode(text))
+          controller.close()
+        } else {
+          controller.enqueue(encoder.encode(text))
+        }
+      },
+    },
+    { highWaterMark: HIGH_WATER_MARK },
+  )
+}
+
+function formatSummary(summary: CohortSummary, subjects: string[], format: ExportFormat, scale: GradeScale) {
+  const statistics: [string, number][] = [
+    ["students", summary.studentCount],
+    ["mean", round(summary.meanPercentage)],
+    ["min", round(summary.minPercentage)],
+    ["max", round(summary.maxPercentage)],
+    ["std_dev", round(summary.stdDevPercentage)],
+    ["pass_rate", round(summary.passRate * 100)],
+    ["mean_points", round(summary.meanPoints)],
+    ...scale.bands.map((band, index): [string, number] => [`grade ${band.grade}`, summary.bandCounts[index]]),
+    ...subjects.map((name, index): [string, number] => [`average ${name}`, round(summary.subjectAverages[index])]),
+  ]
+
+  if (format === "jsonl") {
+    return `${JSON.stringify({ type: "summary", ...Object.fromEntries(statistics) })}\n`
+  }
+  // A blank line, then a two-column table, so the student rows stay a clean block
+  return "\n" + csvRow(["statistic", "value"]) + statistics.map((entry) => csvRow(entry)).join("")
+}
+
+function csvRow(fields: (string | number)[]) {
+  return fields.map(csvField).join(",") + "\r\n"
+}
+
+function csvField(value: string | number) {
+  const text = String(value)
+  return /[",\r\n]/.test(text) ? `"${text.replace(/"/g, '""')}"` : text
+}
+
+function round(value: number) {
+  return Math.round(value * 100) / 100
+}
+
+interface SaveFilePicker {
+  showSaveFilePicker(options: { suggestedName: string }): Promise<{
+    createWritable(): Promise<WritableStream<Uint8Array>>
+  }>
+}
+
+// Writes the stream to a file the user picks. Where the browser can write to
+// disk directly the stream is piped with backpressure; elsewhere it's
+// collected into a Blob (which browsers may keep on disk) and downloaded.
+export async function saveStream(stream: ReadableStream<Uint8Array>, fileName: string, type: string) {
+  if ("showSaveFilePicker" in window) {
+    try {
+      const handle = await (window as unknown as SaveFilePicker).showSaveFilePicker({ suggestedName: fileName })
+      await stream.pipeTo(await handle.createWritable())
+      return
+    } catch (error) {
+      // Cancelling the save dialog isn't an error
+      if ((error as DOMException).name === "AbortError") return
+      throw error
+    }
+  }
+
+  const blob = await new Response(stream, { headers: { "Content-Type": type } }).blob()
+  const url = URL.createObjectURL(blob)
+  const link = document.createElement("a")
+  link.href = url
+  link.download = fileName
+  link.click()
+  // Revoked on the next tick, once the download has picked the URL up
+  setTimeout(() => URL.revokeObjectURL(url))
+}
+// Grade scales as data. A scale is a list of bands, each the lowest
+// percentage that earns it; createGradeScale validates the list once and
+// expands it into a lookup table over 0-100 in steps of 0.1, so grading a
+// percentage is a single array read however many bands the scale has.
+//
+// Schools can supply their own scale as JSON, either at build time through
+// NEXT_PUBLIC_GRADE_SCALE or by loading a file in the calculator:
+//
+//   [{ "grade": "A", "min": 90, "points": 4, "pass": true, "label": "Excellent", "color": "#22c55e" }, ...]
+//
+// `pass` says whether the band counts towards the pass rate. Left out, only
+// the band starting at 0% fails.
+
+export interface GradeBand {
+  grade: string
+  // Lowest percentage in the band, to one decimal place
+  min: number
+  // Grade points towards a GPA
+  points: number
+  pass: boolean
+  label: string
+  // Any CSS color
+  color: string
+}
+
+export interface GradeScale {
+  // Highest band first; the last band always starts at 0
+  bands: GradeBand[]
+  // Band index for every tenth of a percent from 0 to 100
+  lookup: Uint8Array
+}
+
+const STEPS_PER_PERCENT = 10
+const LOOKUP_SIZE = 100 * STEPS_PER_PERCENT + 1
+// Percentages come out of floating point division, so 57/100 * 100 is
+// 56.99999999999999; nudging by far less than a step keeps it at 57
+const STEP_EPSILON = 1e-9
+// Band indexes are stored in a Uint8Array
+const MAX_BANDS = 255
+
+export function createGradeScale(input: unknown): GradeScale {
+  if (!Array.isArray(input) || input.length === 0) {
+    throw new Error("A grade scale must be a non-empty list of bands")
+  }
+  if (input.length > MAX_BANDS) {
+    throw new Error(`A grade scale can have at most ${MAX_BANDS} bands`)
+  }
+
+  const bands = input.map((band, index) => validateBand(band, index)).sort((a, b) => b.min - a.min)
+  for (let i = 1; i < bands.length; i++) {
+    if (bands[i].min === bands[i - 1].min) {
+      throw new Error(`Grades ${bands[i - 1].grade} and ${bands[i].grade} both start at ${bands[i].min}%`)
+    }
+  }
+  if (bands[bands.length - 1].min !== 0) {
+    throw new Error("The lowest band must start at 0% so every mark gets a grade")
+  }
+  if (new Set(bands.map((band) => band.grade)).size !== bands.length) {
+    throw new Error("Each grade can only appear once")
+  }
+  for (let i = 1; i < bands.length; i++) {
+    if (bands[i].pass && !bands[i - 1].pass) {
+      throw new Error(`Grade ${bands[i].grade} passes but the higher grade ${bands[i - 1].grade} doesn't`)
+    }
+  }
+
+  const lookup = new Uint8Array(LOOKUP_SIZE)
+  let band = bands.length - 1
+  for (let step = 0; step < LOOKUP_SIZE; step++) {
+    while (band > 0 && step >= Math.round(bands[band - 1].min * STEPS_PER_PERCENT)) band--
+    lookup[step] = band
+  }
+
+  return { bands, lookup }
+}
+
+function validateBand(band: unknown, index: number): GradeBand {
+  const { grade, min, points, pass = min !== 0, label = "", color = "#6b7280" } = (band ?? {}) as Partial<GradeBand>
+  const where = `Band ${index + 1}`
+
+  if (typeof grade !== "string" || grade.trim() === "") {
+    throw new Error(`${where} needs a grade`)
+  }
+  if (typeof min !== "number" || !(min >= 0 && min <= 100)) {
+    throw new Error(`${where} (${grade}) needs a minimum percentage between 0 and 100`)
+  }
+  if (Math.abs(min * STEPS_PER_PERCENT - Math.round(min * STEPS_PER_PERCENT)) > 1e-9) {
+    throw new Error(`${where} (${grade}) minimum can have at most one decimal place`)
+  }
+  if (typeof points !== "number" || !(points >= 0)) {
+    throw new Error(`${where} (${grade}) needs non-negative grade points`)
+  }
+  if (typeof pass !== "boolean") {
+    throw new Error(`${where} (${grade}) pass must be true or false`)
+  }
+  if (typeof label !== "string" || typeof color !== "string") {
+    throw new Error(`${where} (${grade}) label and color must be strings`)
+  }
+  return { grade: grade.trim(), min, points, pass, label, color }
+}
+
+// Band index for a percentage. Out-of-range input is clamped rather than
+// checked, which keeps the hot path free of branches.
+export function bandIndex(scale: GradeScale, percentage: number) {
+  const step = Math.floor(percentage * STEPS_PER_PERCENT + STEP_EPSILON)
+  return scale.lookup[Math.min(Math.max(step, 0), LOOKUP_SIZE - 1)]
+}
+
+// Display ranges such as "80-89%" and "Below 50%"
+export function bandRanges({ bands }: GradeScale) {
+  return bands.map((band, index) => {
+    if (index === 0) return { band, range: `${band.min}-100%` }
+
+    const next = bands[index - 1].min
+    if (index === bands.length - 1) return { band, range: `Below ${next}%` }
+
+    const step = Number.isInteger(band.min) && Number.isInteger(next) ? 1 : 0.1
+    return { band, range: `${band.min}-${Math.round((next - step) * 10) / 10}%` }
+  })
+}
+
+export const STANDARD_BANDS: GradeBand[] = [
+  { grade: "A+", min: 90, points: 4, pass: true, label: "Excellent", color: "#22c55e" },
+  { grade: "A", min: 80, points: 3.7, pass: true, label: "Very Good", color: "#4ade80" },
+  { grade: "B+", min: 70, points: 3.3, pass: true, label: "Good", color: "#3b82f6" },
+  { grade: "B", min: 60, points: 3, pass: true, label: "Satisfactory", color: "#60a5fa" },
+  { grade: "C", min: 50, points: 2, pass: true, label: "Pass", color: "#eab308" },
+  { grade: "F", min: 0, points: 0, pass: false, label: "Fail", color: "#ef4444" },
+]
+
+// A broken NEXT_PUBLIC_GRADE_SCALE falls back to the standard scale rather
+// than failing every page that imports this module
+function defaultGradeScale() {
+  const configured = process.env.NEXT_PUBLIC_GRADE_SCALE
+  if (configured) {
+    try {
+      return createGradeScale(JSON.parse(configured))
+    } catch (error) {
+      console.error("Ignoring NEXT_PUBLIC_GRADE_SCALE, using the standard grade scale:", error)
+    }
+  }
+  return createGradeScale(STANDARD_BANDS)
+}
+
+export const DEFAULT_GRADE_SCALE = defaultGradeScale()
+import { bandIndex, type GradeScale } from "@/lib/grade-scale"
+
+// Running totals for a term of weighted subjects. Every aggregate is a plain
+// sum, so a subject can be added, removed or edited by adjusting the sums
+// for that one subject instead of going back over the whole list. The sums
+// are kept as whole numbers of millionths, so taking a subject away exactly
+// cancels adding it and the totals never drift from a fresh sum however many
+// edits they go through.
+//
+//   average % = sum(weight * percentage) / sum(weight)
+//   GPA       = sum(credits * grade points) / sum(credits)
+//   CGPA      = the same, summed over every saved term
+
+export interface WeightedSubject {
+  marks: number
+  maxMarks: number
+  weight: number
+  credits: number
+}
+
+const SUM_FIELDS = ["totalMarks", "totalMaxMarks", "weightedPercentage", "weight", "creditPoints", "credits"] as const
+type SumField = (typeof SUM_FIELDS)[number]
+const SCALE = 1_000_000
+
+export interface TermTotals {
+  subjectCount: number
+  totalMarks: number
+  totalMaxMarks: number
+  weightedPercentage: number
+  weight: number
+  creditPoints: number
+  credits: number
+  // The sums above in millionths; these are what gets adjusted
+  scaled: Record<SumField, number>
+}
+
+export interface CumulativeTotals {
+  termCount: number
+  creditPoints: number
+  credits: number
+}
+
+export const EMPTY_TERM: TermTotals = {
+  subjectCount: 0,
+  totalMarks: 0,
+  totalMaxMarks: 0,
+  weightedPercentage: 0,
+  weight: 0,
+  creditPoints: 0,
+  credits: 0,
+  scaled: { totalMarks: 0, totalMaxMarks: 0, weightedPercentage: 0, weight: 0, creditPoints: 0, credits: 0 },
+}
+
+export const EMPTY_CUMULATIVE: CumulativeTotals = { termCount: 0, creditPoints: 0, credits: 0 }
+
+export function subjectPercentage({ marks, maxMarks }: WeightedSubject) {
+  return maxMarks > 0 ? (marks / maxMarks) * 100 : 0
+}
+
+export function isValidSubject({ marks, maxMarks, weight, credits }: WeightedSubject) {
+  return maxMarks > 0 && marks >= 0 && marks <= maxMarks && weight >= 0 && credits >= 0
+}
+
+function adjust(totals: TermTotals, subject: WeightedSubject, scale: GradeScale, sign: 1 | -1): TermTotals {
+  const percentage = subjectPercentage(subject)
+  const points = scale.bands[bandIndex(scale, percentage)].points
+  const amounts: Record<SumField, number> = {
+    totalMarks: subject.marks,
+    totalMaxMarks: subject.maxMarks,
+    weightedPercentage: subject.weight * percentage,
+    weight: subject.weight,
+    creditPoints: subject.credits * points,
+    credits: subject.credits,
+  }
+
+  const next = { ...totals, subjectCount: totals.subjectCount + sign, scaled: { ...totals.scaled } }
+  for (const field of SUM_FIELDS) {
+    next.scaled[field] += sign * Math.round(amounts[field] * SCALE)
+    next[field] = next.scaled[field] / SCALE
+  }
+  return next
+}
+
+export function includeSubject(totals: TermTotals, subject: WeightedSubject, scale: GradeScale) {
+  return adjust(totals, subject, scale, 1)
+}
+
+export function excludeSubject(totals: TermTotals, subject: WeightedSubject, scale: GradeScale) {
+  return adjust(totals, subject, scale, -1)
+}
+
+export function replaceSubject(
+  totals: TermTotals,
+  previous: WeightedSubject,
+  next: WeightedSubject,
+  scale: GradeScale,
+) {
+  return includeSubject(excludeSubject(totals, previous, scale), next, scale)
+}
+
+// From scratch, for a new list or after the grade scale changes
+export function sumSubjects(subjects: WeightedSubject[], scale: GradeScale) {
+  return subjects.reduce((totals, subject) => includeSubject(totals, subject, scale), EMPTY_TERM)
+}
+
+export function averagePercentage(totals: TermTotals) {
+  return totals.weight > 0 ? totals.weightedPercentage / totals.weight : 0
+}
+
+export function gpa(totals: TermTotals | CumulativeTotals) {
+  return totals.credits > 0 ? totals.creditPoints / totals.credits : 0
+}
+
+export function includeTerm(cumulative: CumulativeTotals, term: TermTotals): CumulativeTotals {
+  return {
+    termCount: cumulative.termCount + 1,
+    creditPoints: cumulative.creditPoints + term.creditPoints,
+    credits: cumulative.credits + term.credits,
+  }
+}
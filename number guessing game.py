@@ -1,169 +1,244 @@
 import { type NextRequest, NextResponse } from "next/server"
+import { handleGameAction, type GameActionResult } from "@/lib/game-actions"
+import { readJsonBody, validateGameAction } from "@/lib/game-request"
+import { clientIp, getRateLimiter, REMOTE_ADDRESS_HEADER } from "@/lib/rate-limit"
+import { rejectedRequests, requestErrors } from "@/lib/game-metrics"
 
-// In-memory storage (in production, use a database)
-const games = new Map<
-  string,
-  {
-    targetNumber: number
-    attempts: number
-    maxAttempts: number
-    status: "playing" | "won" | "lost"
-    minRange: number
-    maxRange: number
-  }
->()
-
-const playerStats = new Map<
-  string,
-  {
-    totalGames: number
-    gamesWon: number
-    totalScore: number
-    bestStreak: number
-    currentStreak: number
-  }
->()
+const MAX_BATCH_SIZE = 5000
 
 export async function POST(request: NextRequest) {
   try {
-    const { action, gameId, guess, playerId } = await request.json()
-
-    switch (action) {
-      case "start":
-        const targetNumber = Math.floor(Math.random() * 100) + 1
-        const newGameId = Math.random().toString(36).substring(7)
-
-        games.set(newGameId, {
-          targetNumber,
-          attempts: 0,
-          maxAttempts: 7,
-          status: "playing",
-          minRange: 1,
-          maxRange: 100,
-        })
-
-        return NextResponse.json({
-          success: true,
-          gameId: newGameId,
-          message: "New game started! Guess a number between 1 and 100.",
-          maxAttempts: 7,
-        })
+    const body = await readJsonBody(request)
+    if (!body.ok) {
+      rejectedRequests.inc({ error: body.error.error })
+      return NextResponse.json(body.error, { status: body.status })
+    }
 
-      case "guess":
-        const game = games.get(gameId)
-        if (!game) {
-          return NextResponse.json({ success: false, message: "Game not found" })
-        }
+    const limiter = getRateLimiter()
+    const ip = clientIp(request.headers, request.headers.get(REMOTE_ADDRESS_HEADER) ?? undefined)
 
-        if (game.status !== "playing") {
-          return NextResponse.json({ success: false, message: "Game is already finished" })
-        }
+    // { batch: [op, op, ...] } runs each op in order; one failing op doesn't
+    // stop the rest
+    const batch = (body.value as { batch?: unknown }).batch
+    if (Array.isArray(batch)) {
+      if (batch.length > MAX_BATCH_SIZE) {
+        rejectedRequests.inc({ error: "batch_too_large" })
+        return NextResponse.json(
+          { success: false, error: "batch_too_large", message: `Batch is limited to ${MAX_BATCH_SIZE} operations` },
+          { status: 413 },
+        )
+      }
 
-        const guessNumber = Number.parseInt(guess)
-        if (isNaN(guessNumber) || guessNumber < 1 || guessNumber > 100) {
-          return NextResponse.json({ success: false, message: "Please enter a valid number between 1 and 100" })
-        }
+      // The batch is charged once, against its own bucket, instead of every
+      // operation going through the per-action player/IP rules
+      const limited = await limiter.checkBatch(batch.length, ip)
+      if (!limited.ok) {
+        rejectedRequests.inc({ error: "rate_limited" })
+        return NextResponse.json(limited.error, {
+          status: limited.status,
+          headers: { "Retry-After": String(Math.ceil(limited.retryAfterMs / 1000)) },
+        })
+      }
 
-        game.attempts++
-        let message = ""
-        let gameEnded = false
-        let score = 0
-
-        if (guessNumber === game.targetNumber) {
-          game.status = "won"
-          score = Math.max(100 - (game.attempts - 1) * 10, 10)
-          message = `🎉 Congratulations! You guessed it in ${game.attempts} attempt${game.attempts === 1 ? "" : "s"}!`
-          gameEnded = true
-
-          // Update player stats
-          updatePlayerStats(playerId, true, score)
-        } else if (game.attempts >= game.maxAttempts) {
-          game.status = "lost"
-          message = `😔 Game over! The number was ${game.targetNumber}.`
-          gameEnded = true
-
-          // Update player stats
-          updatePlayerStats(playerId, false, 0)
-        } else {
-          const remaining = game.maxAttempts - game.attempts
-          if (guessNumber < game.targetNumber) {
-            message = `📈 Too low! Try higher. ${remaining} attempt${remaining === 1 ? "" : "s"} remaining.`
-          } else {
-            message = `📉 Too high! Try lower. ${remaining} attempt${remaining === 1 ? "" : "s"} remaining.`
-          }
+      const results: GameActionResult[] = []
+      for (const raw of batch) {
+        const op = validateGameAction(raw)
+        if (!op.ok) {
+          rejectedRequests.inc({ error: op.error.error })
+          results.push(op.error)
+          continue
         }
 
-        return NextResponse.json({
-          success: true,
-          message,
-          attempts: game.attempts,
-          maxAttempts: game.maxAttempts,
-          status: game.status,
-          score,
-          gameEnded,
-        })
-
-      case "stats":
-        const stats = playerStats.get(playerId) || {
-          totalGames: 0,
-          gamesWon: 0,
-          totalScore: 0,
-          bestStreak: 0,
-          currentStreak: 0,
+        try {
+          results.push(await handleGameAction(op.value))
+        } catch (error) {
+          results.push({ success: false, message: "Server error" })
         }
+      }
+      return NextResponse.json({ success: true, results })
+    }
 
-        return NextResponse.json({
-          success: true,
-          stats,
-        })
+    const op = validateGameAction(body.value)
+    if (!op.ok) {
+      rejectedRequests.inc({ error: op.error.error })
+      return NextResponse.json(op.error, { status: op.status })
+    }
 
-      default:
-        return NextResponse.json({ success: false, message: "Invalid action" })
+    const limited = await limiter.check(op.value, ip)
+    if (!limited.ok) {
+      rejectedRequests.inc({ error: "rate_limited" })
+      return NextResponse.json(limited.error, {
+        status: limited.status,
+        headers: { "Retry-After": String(Math.ceil(limited.retryAfterMs / 1000)) },
+      })
     }
+    return NextResponse.json(await handleGameAction(op.value))
   } catch (error) {
+    requestErrors.inc({ route: "game" })
     return NextResponse.json({ success: false, message: "Server error" })
   }
 }
+import { createHash } from "node:crypto"
+import { type NextRequest, NextResponse } from "next/server"
+import { getLeaderboardIndex, toLeaderboardRow, type LeaderboardIndex } from "@/lib/leaderboard-index"
 
-function updatePlayerStats(playerId: string, won: boolean, score: number) {
-  const stats = playerStats.get(playerId) || {
-    totalGames: 0,
-    gamesWon: 0,
-    totalScore: 0,
-    bestStreak: 0,
-    currentStreak: 0,
+const DEFAULT_LIMIT = 10
+const MAX_LIMIT = 100
+const DEFAULT_WINDOW = 5
+const MAX_WINDOW = 50
+
+// Serialized responses keyed by query string. An entry is fresh while the
+// index version matches; once stale it is still served for STALE_MS while a
+// rebuild runs in the background.
+const STALE_MS = 2000
+const MAX_CACHED_RESPONSES = 1000
+const CACHE_CONTROL = "public, max-age=1, stale-while-revalidate=30"
+
+interface CachedResponse {
+  version: number
+  builtAt: number
+  status: number
+  etag: string
+  body: string
+}
+
+const responseCache = new Map<string, CachedResponse>()
+const rebuilding = new Set<string>()
+
+// GET /api/leaderboard?limit=&cursor=     one page, `nextCursor` continues it
+// GET /api/leaderboard?around=<playerId>&window=N   N above and N below a player
+export async function GET(request: NextRequest) {
+  const index = await getLeaderboardIndex()
+  const params = request.nextUrl.searchParams
+  params.sort()
+  const key = params.toString()
+
+  let cached = responseCache.get(key)
+  if (!cached || cached.version !== index.currentVersion) {
+    if (cached && Date.now() - cached.builtAt < STALE_MS) {
+      scheduleRebuild(index, key, params)
+    } else {
+      cached = buildResponse(index, key, params)
+    }
   }
 
-  stats.totalGames++
-  stats.totalScore += score
+  const headers = {
+    ETag: cached.etag,
+    "Cache-Control": CACHE_CONTROL,
+  }
 
-  if (won) {
-    stats.gamesWon++
-    stats.currentStreak++
-    stats.bestStreak = Math.max(stats.bestStreak, stats.currentStreak)
-  } else {
-    stats.currentStreak = 0
+  if (cached.status === 200 && request.headers.get("if-none-match") === cached.etag) {
+    return new NextResponse(null, { status: 304, headers })
   }
 
-  playerStats.set(playerId, stats)
+  return new NextResponse(cached.body, {
+    status: cached.status,
+    headers: { ...headers, "Content-Type": "application/json" },
+  })
 }
-import { NextResponse } from "next/server"
 
-// Mock leaderboard data (in production, use a database)
-const leaderboard = [
-  { id: "1", name: "Alex Champion", score: 2450, gamesWon: 28, winRate: 93 },
-  { id: "2", name: "Sarah Genius", score: 2180, gamesWon: 24, winRate: 89 },
-  { id: "3", name: "Mike Master", score: 1950, gamesWon: 22, winRate: 85 },
-  { id: "4", name: "Lisa Legend", score: 1720, gamesWon: 19, winRate: 82 },
-  { id: "5", name: "Tom Tactician", score: 1580, gamesWon: 17, winRate: 78 },
-]
+function scheduleRebuild(index: LeaderboardIndex, key: string, params: URLSearchParams) {
+  if (rebuilding.has(key)) return
+  rebuilding.add(key)
 
-export async function GET() {
-  return NextResponse.json({
-    success: true,
-    leaderboard: leaderboard.sort((a, b) => b.score - a.score),
+  setImmediate(() => {
+    try {
+      buildResponse(index, key, params)
+    } finally {
+      rebuilding.delete(key)
+    }
   })
 }
+
+function buildResponse(index: LeaderboardIndex, key: string, params: URLSearchParams) {
+  const version = index.currentVersion
+  const { status, payload } = computeLeaderboard(index, params)
+  const body = JSON.stringify(payload)
+  const cached: CachedResponse = {
+    version,
+    builtAt: Date.now(),
+    status,
+    // From the body, not the version: versions are per process, and cluster
+    // workers can share a number while holding different boards
+    etag: `"lb-${createHash("sha1").update(body).digest("base64url")}"`,
+    body,
+  }
+
+  responseCache.delete(key)
+  responseCache.set(key, cached)
+  if (responseCache.size > MAX_CACHED_RESPONSES) {
+    responseCache.delete(responseCache.keys().next().value as string)
+  }
+  return cached
+}
+
+function computeLeaderboard(index: LeaderboardIndex, params: URLSearchParams) {
+  const around = params.get("around")
+  if (around) {
+    const rank = index.rank(around)
+    if (rank === 0) {
+      return { status: 404, payload: { success: false, message: "Player not ranked" } }
+    }
+
+    const window = clamp(params.get("window"), DEFAULT_WINDOW, MAX_WINDOW)
+    const offset = Math.max(0, rank - 1 - window)
+    const entries = index.range(offset, rank - offset + window)
+
+    return {
+      status: 200,
+      payload: {
+        success: true,
+        rank,
+        total: index.size,
+        leaderboard: entries.map((entry, i) => toLeaderboardRow(entry, offset + i + 1)),
+      },
+    }
+  }
+
+  const limit = clamp(params.get("limit"), DEFAULT_LIMIT, MAX_LIMIT)
+  const cursor = params.get("cursor")
+  let offset = 0
+  if (cursor) {
+    const position = decodeCursor(cursor)
+    if (!position) {
+      return { status: 400, payload: { success: false, message: "Invalid cursor" } }
+    }
+    // Resume after the last entry served, even if ranks shifted in between
+    offset = index.countThrough(position.score, position.id)
+  }
+
+  const entries = index.range(offset, limit)
+  const last = entries[entries.length - 1]
+  const hasMore = offset + entries.length < index.size
+
+  return {
+    status: 200,
+    payload: {
+      success: true,
+      total: index.size,
+      leaderboard: entries.map((entry, i) => toLeaderboardRow(entry, offset + i + 1)),
+      nextCursor: last && hasMore ? encodeCursor(last.score, last.id) : null,
+    },
+  }
+}
+
+function clamp(value: string | null, fallback: number, max: number) {
+  const parsed = Number.parseInt(value || "")
+  if (isNaN(parsed) || parsed < 1) return fallback
+  return Math.min(parsed, max)
+}
+
+function encodeCursor(score: number, id: string) {
+  return Buffer.from(`${score}:${id}`).toString("base64url")
+}
+
+function decodeCursor(cursor: string) {
+  const decoded = Buffer.from(cursor, "base64url").toString()
+  const separator = decoded.indexOf(":")
+  const score = Number(decoded.slice(0, separator))
+  if (separator < 1 || !Number.isFinite(score)) return null
+  return { score, id: decoded.slice(separator + 1) }
+}
 import type React from "react"
 import type { Metadata } from "next"
 import { Inter } from "next/font/google"
@@ -205,6 +280,18 @@ import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/com
 import { Badge } from "@/components/ui/badge"
 import { Separator } from "@/components/ui/separator"
 import { RefreshCw, Trophy, Target, Zap, TrendingUp, Medal, Award } from "lucide-react"
+import {
+  DEFAULT_DIFFICULTY,
+  evaluateGuess,
+  GUESS_CORRECT,
+  GUESS_OUT_OF_ATTEMPTS,
+  GUESS_TOO_LOW,
+  isInRange,
+  randomTarget,
+  RULES,
+  scoreFor,
+} from "@/lib/game-rules"
+import { entropySeed, Xoshiro128 } from "@/lib/rng"
 
 // Logo Component
 function Logo({ size = "md", showText = true }: { size?: "sm" | "md" | "lg"; showText?: boolean }) {
@@ -297,12 +384,15 @@ function Leaderboard() {
   )
 }
 
+const rules = RULES[DEFAULT_DIFFICULTY]
+const { minRange, maxRange, maxAttempts } = rules
+const random = new Xoshiro128(entropySeed())
+
 // Main Game Component
 export default function GuessWiseGame() {
   const [targetNumber, setTargetNumber] = useState<number>(0)
   const [userGuess, setUserGuess] = useState<string>("")
   const [attempts, setAttempts] = useState<number>(0)
-  const [maxAttempts] = useState<number>(7)
   const [feedback, setFeedback] = useState<string>("")
   const [gameStatus, setGameStatus] = useState<"playing" | "won" | "lost">("playing")
   const [score, setScore] = useState<number>(0)
@@ -314,18 +404,15 @@ export default function GuessWiseGame() {
     currentStreak: 0,
   })
 
-  // Generate random number between 1 and 100
-  const generateRandomNumber = () => {
-    return Math.floor(Math.random() * 100) + 1
-  }
-
   // Initialize new game
   const startNewGame = () => {
-    const newTarget = generateRandomNumber()
+    const newTarget = randomTarget(rules, random)
     setTargetNumber(newTarget)
     setUserGuess("")
     setAttempts(0)
-    setFeedback("🎯 I'm thinking of a number between 1 and 100. You have 7 attempts to guess it!")
+    setFeedback(
+      `🎯 I'm thinking of a number between ${minRange} and ${maxRange}. You have ${maxAttempts} attempts to guess it!`,
+    )
     setGameStatus("playing")
     setScore(0)
   }
@@ -334,18 +421,19 @@ export default function GuessWiseGame() {
   const makeGuess = () => {
     const guess = Number.parseInt(userGuess)
 
-    if (isNaN(guess) || guess < 1 || guess > 100) {
-      setFeedback("⚠️ Please enter a valid number between 1 and 100")
+    if (isNaN(guess) || !isInRange(rules, guess)) {
+      setFeedback(`⚠️ Please enter a valid number between ${minRange} and ${maxRange}`)
       return
     }
 
     const newAttempts = attempts + 1
     setAttempts(newAttempts)
+    const outcome = evaluateGuess(targetNumber, guess, newAttempts, maxAttempts)
 
-    if (guess === targetNumber) {
+    if (outcome === GUESS_CORRECT) {
       // Player won
       setGameStatus("won")
-      const roundScore = Math.max(100 - (newAttempts - 1) * 10, 10)
+      const roundScore = scoreFor(rules.scoring, newAttempts, maxAttempts)
       setScore(roundScore)
       setFeedback(
         `🎉 Congratulations! You guessed it in ${newAttempts} attempt${newAttempts === 1 ? "" : "s"}! (+${roundScore} points)`,
@@ -359,7 +447,7 @@ export default function GuessWiseGame() {
         currentStreak: prev.currentStreak + 1,
         bestStreak: Math.max(prev.bestStreak, prev.currentStreak + 1),
       }))
-    } else if (newAttempts >= maxAttempts) {
+    } else if (outcome === GUESS_OUT_OF_ATTEMPTS) {
       // Player lost
       setGameStatus("lost")
       setFeedback(`😔 Game over! The number was ${targetNumber}. Better luck next time!`)
@@ -373,7 +461,7 @@ export default function GuessWiseGame() {
     } else {
       // Continue playing
       const remaining = maxAttempts - newAttempts
-      if (guess < targetNumber) {
+      if (outcome === GUESS_TOO_LOW) {
         setFeedback(`📈 Too low! Try a higher number. ${remaining} attempt${remaining === 1 ? "" : "s"} remaining.`)
       } else {
         setFeedback(`📉 Too high! Try a lower number. ${remaining} attempt${remaining === 1 ? "" : "s"} remaining.`)
@@ -421,7 +509,7 @@ export default function GuessWiseGame() {
                       <Target className="h-5 w-5 text-blue-600" />
                       Current Game
                     </CardTitle>
-                    <CardDescription>Guess the number between 1 and 100</CardDescription>
+                    <CardDescription>Guess the number between {minRange} and {maxRange}</CardDescription>
                   </CardHeader>
 
                   <CardContent className="space-y-4">
@@ -450,12 +538,12 @@ export default function GuessWiseGame() {
                       <div className="flex gap-2">
                         <Input
                           type="number"
-                          placeholder="Enter your guess (1-100)"
+                          placeholder={`Enter your guess (${minRange}-${maxRange})`}
                           value={userGuess}
                           onChange={(e) => setUserGuess(e.target.value)}
                           onKeyPress={handleKeyPress}
-                          min={1}
-                          max={100}
+                          min={minRange}
+                          max={maxRange}
                           className="flex-1 text-lg"
                         />
                         <Button
@@ -540,8 +628,8 @@ export default function GuessWiseGame() {
                   <div>
                     <h4 className="font-semibold text-gray-800 mb-2">Game Rules:</h4>
                     <ul className="space-y-1">
-                      <li>• Guess a number between 1 and 100</li>
-                      <li>• You have 7 attempts to find it</li>
+                      <li>• Guess a number between {minRange} and {maxRange}</li>
+                      <li>• You have {maxAttempts} attempts to find it</li>
                       <li>• Get hints: "too high" or "too low"</li>
                       <li>• Win faster for more points!</li>
                     </ul>
@@ -585,14 +673,19 @@ import { Card, CardContent, CardDescription, CardFooter, CardHeader, CardTitle }
 import { Badge } from "@/components/ui/badge"
 import { Separator } from "@/components/ui/separator"
 import { RefreshCw, Trophy, Target, Zap, TrendingUp } from "lucide-react"
+import { getGameConnection, getPlayerId } from "@/lib/game-client"
+import { DEFAULT_DIFFICULTY, RULES } from "@/lib/game-rules"
 import { Logo } from "./logo"
 
+const defaultRules = RULES[DEFAULT_DIFFICULTY]
+
 export default function GameBoard() {
   const [gameId, setGameId] = useState<string>("")
-  const [playerId] = useState<string>(() => Math.random().toString(36).substring(7))
+  const [playerId] = useState<string>(() => getPlayerId())
   const [userGuess, setUserGuess] = useState<string>("")
   const [attempts, setAttempts] = useState<number>(0)
-  const [maxAttempts, setMaxAttempts] = useState<number>(7)
+  const [maxAttempts, setMaxAttempts] = useState<number>(defaultRules.maxAttempts)
+  const [range, setRange] = useState({ min: defaultRules.minRange, max: defaultRules.maxRange })
   const [feedback, setFeedback] = useState<string>("")
   const [gameStatus, setGameStatus] = useState<"playing" | "won" | "lost">("playing")
   const [score, setScore] = useState<number>(0)
@@ -609,21 +702,19 @@ export default function GameBoard() {
   const startNewGame = async () => {
     setLoading(true)
     try {
-      const response = await fetch("/api/game", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ action: "start" }),
-      })
-
-      const data = await response.json()
+      const data = await getGameConnection().send({ action: "start", playerId, includeStats: true })
       if (data.success) {
         setGameId(data.gameId)
         setUserGuess("")
         setAttempts(0)
         setMaxAttempts(data.maxAttempts)
+        setRange({ min: data.minRange, max: data.maxRange })
         setFeedback(data.message)
         setGameStatus("playing")
         setScore(0)
+        if (data.stats) {
+          setStats(data.stats)
+        }
       }
     } catch (error) {
       setFeedback("Error starting game. Please try again.")
@@ -636,18 +727,13 @@ export default function GameBoard() {
 
     setLoading(true)
     try {
-      const response = await fetch("/api/game", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          action: "guess",
-          gameId,
-          guess: userGuess,
-          playerId,
-        }),
+      const data = await getGameConnection().send({
+        action: "guess",
+        gameId,
+        guess: userGuess,
+        playerId,
+        includeStats: true,
       })
-
-      const data = await response.json()
       if (data.success) {
         setFeedback(data.message)
         setAttempts(data.attempts)
@@ -655,7 +741,9 @@ export default function GameBoard() {
         if (data.gameEnded) {
           setScore(data.score || 0)
           setTotalScore((prev) => prev + (data.score || 0))
-          loadStats()
+          if (data.stats) {
+            setStats(data.stats)
+          }
         }
       } else {
         setFeedback(data.message)
@@ -667,23 +755,6 @@ export default function GameBoard() {
     setLoading(false)
   }
 
-  const loadStats = async () => {
-    try {
-      const response = await fetch("/api/game", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ action: "stats", playerId }),
-      })
-
-      const data = await response.json()
-      if (data.success) {
-        setStats(data.stats)
-      }
-    } catch (error) {
-      console.error("Error loading stats:", error)
-    }
-  }
-
   const handleKeyPress = (e: React.KeyboardEvent) => {
     if (e.key === "Enter" && gameStatus === "playing") {
       makeGuess()
@@ -692,7 +763,6 @@ export default function GameBoard() {
 
   useEffect(() => {
     startNewGame()
-    loadStats()
   }, [])
 
   const winRate = stats.totalGames > 0 ? Math.round((stats.gamesWon / stats.totalGames) * 100) : 0
@@ -715,7 +785,7 @@ export default function GameBoard() {
                   <Target className="h-5 w-5 text-blue-600" />
                   Current Game
                 </CardTitle>
-                <CardDescription>Guess the number between 1 and 100</CardDescription>
+                <CardDescription>Guess the number between {range.min} and {range.max}</CardDescription>
               </CardHeader>
 
               <CardContent className="space-y-4">
@@ -744,12 +814,12 @@ export default function GameBoard() {
                   <div className="flex gap-2">
                     <Input
                       type="number"
-                      placeholder="Enter your guess (1-100)"
+                      placeholder={`Enter your guess (${range.min}-${range.max})`}
                       value={userGuess}
                       onChange={(e) => setUserGuess(e.target.value)}
                       onKeyPress={handleKeyPress}
-                      min={1}
-                      max={100}
+                      min={range.min}
+                      max={range.max}
                       className="flex-1"
                       disabled={loading}
                     />
@@ -818,31 +888,60 @@ export default function GameBoard() {
 }
 "use client"
 
-import { useState, useEffect } from "react"
+import { useState, useEffect, useRef } from "react"
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import { Badge } from "@/components/ui/badge"
 import { Trophy, Medal, Award } from "lucide-react"
+import { getGameConnection } from "@/lib/game-client"
 
 interface LeaderboardEntry {
   id: string
+  rank: number
   name: string
   score: number
   gamesWon: number
   winRate: number
 }
 
+const PAGE_SIZE = 20
+// The API's largest page
+const MAX_PAGE_SIZE = 100
+// Spread refetches out so one change doesn't bring every client in at once
+const REFRESH_JITTER_MS = 2000
+
 export function Leaderboard() {
   const [leaderboard, setLeaderboard] = useState<LeaderboardEntry[]>([])
   const [loading, setLoading] = useState(true)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const sentinelRef = useRef<HTMLDivElement>(null)
+  const loadedRef = useRef(0)
+
+  const requestPage = async (cursor: string | null, limit = PAGE_SIZE) => {
+    const params = new URLSearchParams({ limit: String(limit) })
+    if (cursor) params.set("cursor", cursor)
+
+    const response = await fetch(`/api/leaderboard?${params}`)
+    return response.json()
+  }
+
+  const fetchPage = async (cursor: string | null) => {
+    const data = await requestPage(cursor)
+    if (!data.success) return
+
+    setLeaderboard((prev) => {
+      if (!cursor) return data.leaderboard
+      // A player whose score moved between pages can show up twice
+      const seen = new Set(prev.map((player) => player.id))
+      return [...prev, ...data.leaderboard.filter((player: LeaderboardEntry) => !seen.has(player.id))]
+    })
+    setNextCursor(data.nextCursor)
+  }
 
   useEffect(() => {
     const fetchLeaderboard = async () => {
       try {
-        const response = await fetch("/api/leaderboard")
-        const data = await response.json()
-        if (data.success) {
-          setLeaderboard(data.leaderboard)
-        }
+        await fetchPage(null)
       } catch (error) {
         console.error("Error fetching leaderboard:", error)
       }
@@ -852,16 +951,79 @@ export function Leaderboard() {
     fetchLeaderboard()
   }, [])
 
-  const getRankIcon = (index: number) => {
-    switch (index) {
-      case 0:
-        return <Trophy className="h-5 w-5 text-yellow-500" />
+  // Re-read every row already on screen, so the list keeps its length and
+  // the scroll position stays put
+  const refreshLoaded = async () => {
+    const wanted = Math.max(loadedRef.current, PAGE_SIZE)
+    const rows: LeaderboardEntry[] = []
+    let cursor: string | null = null
+    do {
+      const data = await requestPage(cursor, Math.min(wanted - rows.length, MAX_PAGE_SIZE))
+      if (!data.success) return
+      const seen = new Set(rows.map((player) => player.id))
+      rows.push(...data.leaderboard.filter((player: LeaderboardEntry) => !seen.has(player.id)))
+      cursor = data.nextCursor
+    } while (cursor && rows.length < wanted)
+
+    setLeaderboard(rows)
+    setNextCursor(cursor)
+  }
+
+  // Tell the server how deep we're showing; it only pushes changes there
+  useEffect(() => {
+    loadedRef.current = leaderboard.length
+    getGameConnection().watchLeaderboard(Math.max(leaderboard.length, PAGE_SIZE))
+  }, [leaderboard.length])
+
+  useEffect(() => {
+    const connection = getGameConnection()
+    let timer: ReturnType<typeof setTimeout> | undefined
+    const unsubscribe = connection.onLeaderboardChange(() => {
+      if (timer) return
+      timer = setTimeout(() => {
+        timer = undefined
+        refreshLoaded().catch((error) => console.error("Error fetching leaderboard:", error))
+      }, Math.random() * REFRESH_JITTER_MS)
+    })
+
+    return () => {
+      unsubscribe()
+      clearTimeout(timer)
+      connection.watchLeaderboard(0)
+    }
+  }, [])
+
+  // Pull the next page when the bottom of the list scrolls into view
+  useEffect(() => {
+    const sentinel = sentinelRef.current
+    if (!sentinel || !nextCursor || loadingMore) return
+
+    const observer = new IntersectionObserver(async ([entry]) => {
+      if (!entry.isIntersecting) return
+      observer.disconnect()
+      setLoadingMore(true)
+      try {
+        await fetchPage(nextCursor)
+      } catch (error) {
+        console.error("Error fetching leaderboard:", error)
+      }
+      setLoadingMore(false)
+    })
+    observer.observe(sentinel)
+
+    return () => observer.disconnect()
+  }, [nextCursor, loadingMore])
+
+  const getRankIcon = (rank: number) => {
+    switch (rank) {
       case 1:
-        return <Medal className="h-5 w-5 text-gray-400" />
+        return <Trophy className="h-5 w-5 text-yellow-500" />
       case 2:
+        return <Medal className="h-5 w-5 text-gray-400" />
+      case 3:
         return <Award className="h-5 w-5 text-amber-600" />
       default:
-        return <span className="text-lg font-bold text-gray-500">#{index + 1}</span>
+        return <span className="text-lg font-bold text-gray-500">#{rank}</span>
     }
   }
 
@@ -889,10 +1051,10 @@ export function Leaderboard() {
           Leaderboard
         </CardTitle>
       </CardHeader>
-      <CardContent className="space-y-3">
-        {leaderboard.map((player, index) => (
+      <CardContent className="space-y-3 max-h-[32rem] overflow-y-auto">
+        {leaderboard.map((player) => (
           <div key={player.id} className="flex items-center gap-3 p-3 bg-gray-50 rounded-lg">
-            <div className="flex-shrink-0">{getRankIcon(index)}</div>
+            <div className="flex-shrink-0">{getRankIcon(player.rank)}</div>
             <div className="flex-1 min-w-0">
               <div className="font-semibold text-gray-800 truncate">{player.name}</div>
               <div className="text-sm text-gray-600">
@@ -904,6 +1066,11 @@ export function Leaderboard() {
             </Badge>
           </div>
         ))}
+        {nextCursor && (
+          <div ref={sentinelRef} className="text-center text-sm text-gray-500 py-2">
+            {loadingMore ? "Loading..." : ""}
+          </div>
+        )}
       </CardContent>
     </Card>
   )
@@ -1018,28 +1185,38 @@ import { Card, CardContent, CardDescription, CardFooter, CardHeader, CardTitle }
 import { Badge } from "@/components/ui/badge"
 import { Separator } from "@/components/ui/separator"
 import { RefreshCw, Trophy, Target, Zap } from "lucide-react"
+import {
+  DEFAULT_DIFFICULTY,
+  evaluateGuess,
+  GUESS_CORRECT,
+  GUESS_OUT_OF_ATTEMPTS,
+  GUESS_TOO_LOW,
+  isInRange,
+  randomTarget,
+  RULES,
+  scoreFor,
+  type Difficulty,
+} from "@/lib/game-rules"
+import { entropySeed, Xoshiro128 } from "@/lib/rng"
+
+const random = new Xoshiro128(entropySeed())
 
 export default function NumberGuessingGame() {
   const [targetNumber, setTargetNumber] = useState<number>(0)
   const [userGuess, setUserGuess] = useState<string>("")
   const [attempts, setAttempts] = useState<number>(0)
-  const [maxAttempts] = useState<number>(7)
   const [feedback, setFeedback] = useState<string>("")
   const [gameStatus, setGameStatus] = useState<"playing" | "won" | "lost">("playing")
   const [roundsPlayed, setRoundsPlayed] = useState<number>(0)
   const [roundsWon, setRoundsWon] = useState<number>(0)
   const [score, setScore] = useState<number>(0)
-  const [minRange] = useState<number>(1)
-  const [maxRange] = useState<number>(100)
-
-  // Generate random number between min and max range
-  const generateRandomNumber = () => {
-    return Math.floor(Math.random() * (maxRange - minRange + 1)) + minRange
-  }
+  const [difficulty] = useState<Difficulty>(DEFAULT_DIFFICULTY)
+  const rules = RULES[difficulty]
+  const { minRange, maxRange, maxAttempts } = rules
 
   // Initialize game
   const initializeGame = () => {
-    setTargetNumber(generateRandomNumber())
+    setTargetNumber(randomTarget(rules, random))
     setUserGuess("")
     setAttempts(0)
     setFeedback(`I'm thinking of a number between ${minRange} and ${maxRange}. You have ${maxAttempts} attempts!`)
@@ -1064,28 +1241,29 @@ export default function NumberGuessingGame() {
   const handleGuess = () => {
     const guess = Number.parseInt(userGuess)
 
-    if (isNaN(guess) || guess < minRange || guess > maxRange) {
+    if (isNaN(guess) || !isInRange(rules, guess)) {
       setFeedback(`Please enter a valid number between ${minRange} and ${maxRange}`)
       return
     }
 
     const newAttempts = attempts + 1
     setAttempts(newAttempts)
+    const outcome = evaluateGuess(targetNumber, guess, newAttempts, maxAttempts)
 
-    if (guess === targetNumber) {
+    if (outcome === GUESS_CORRECT) {
       setGameStatus("won")
       setRoundsWon((prev) => prev + 1)
-      const roundScore = Math.max(100 - (newAttempts - 1) * 10, 10)
+      const roundScore = scoreFor(rules.scoring, newAttempts, maxAttempts)
       setScore((prev) => prev + roundScore)
       setFeedback(
         `🎉 Congratulations! You guessed it in ${newAttempts} attempt${newAttempts === 1 ? "" : "s"}! (+${roundScore} points)`,
       )
-    } else if (newAttempts >= maxAttempts) {
+    } else if (outcome === GUESS_OUT_OF_ATTEMPTS) {
       setGameStatus("lost")
       setFeedback(`😔 Game over! The number was ${targetNumber}. Better luck next time!`)
     } else {
       const remainingAttempts = maxAttempts - newAttempts
-      if (guess < targetNumber) {
+      if (outcome === GUESS_TOO_LOW) {
         setFeedback(
           `📈 Too low! Try a higher number. ${remainingAttempts} attempt${remainingAttempts === 1 ? "" : "s"} remaining.`,
         )
@@ -1202,3 +1380,3763 @@ export default function NumberGuessingGame() {
     </div>
   )
 }
+interface SessionStoreOptions {
+  maxEntries: number
+  idleTtlMs: number
+  finishedTtlMs: number
+  sweepIntervalMs: number
+}
+
+interface SessionEntry<T> {
+  value: T
+  expiresAt: number
+}
+
+export interface SessionStoreCounters {
+  live: number
+  evicted: number
+  expired: number
+}
+
+// Bounded session map: idle games expire, finished games are dropped after a
+// short grace period, and the least recently used entry goes when the cap is hit.
+// Map iteration order doubles as the LRU list (oldest first).
+export class SessionStore<T extends { status: "playing" | "won" | "lost" }> {
+  private readonly entries = new Map<string, SessionEntry<T>>()
+  private readonly options: SessionStoreOptions
+  private evicted = 0
+  private expired = 0
+
+  constructor(options: SessionStoreOptions) {
+    this.options = options
+
+    const timer = setInterval(() => this.sweep(), options.sweepIntervalMs)
+    // Don't keep the process alive just for housekeeping
+    timer.unref?.()
+  }
+
+  get size() {
+    return this.entries.size
+  }
+
+  get(id: string): T | undefined {
+    const entry = this.entries.get(id)
+    if (!entry) return undefined
+
+    const now = Date.now()
+    if (entry.expiresAt <= now) {
+      this.remove(id, entry)
+      return undefined
+    }
+
+    // Move to the most recently used end
+    this.entries.delete(id)
+    this.entries.set(id, entry)
+    entry.expiresAt = now + this.ttlFor(entry.value)
+    return entry.value
+  }
+
+  set(id: string, value: T) {
+    this.entries.delete(id)
+    this.entries.set(id, { value, expiresAt: Date.now() + this.ttlFor(value) })
+
+    while (this.entries.size > this.options.maxEntries) {
+      const oldest = this.entries.keys().next().value as string
+      this.entries.delete(oldest)
+      this.evicted++
+    }
+  }
+
+  delete(id: string) {
+    return this.entries.delete(id)
+  }
+
+  // Live entries with their expiry, least recently used first
+  *dump(): IterableIterator<[id: string, value: T, expiresAt: number]> {
+    for (const [id, entry] of this.entries) {
+      yield [id, entry.value, entry.expiresAt]
+    }
+  }
+
+  // Put back an entry from dump(), keeping its original expiry
+  restore(id: string, value: T, expiresAt: number) {
+    if (expiresAt <= Date.now()) return
+    this.set(id, value)
+    this.entries.get(id)!.expiresAt = expiresAt
+  }
+
+  sweep(now = Date.now()) {
+    for (const [id, entry] of this.entries) {
+      if (entry.expiresAt <= now) {
+        this.remove(id, entry)
+      }
+    }
+  }
+
+  counters(): SessionStoreCounters {
+    return { live: this.entries.size, evicted: this.evicted, expired: this.expired }
+  }
+
+  private ttlFor(value: T) {
+    return value.status === "playing" ? this.options.idleTtlMs : this.options.finishedTtlMs
+  }
+
+  private remove(id: string, entry: SessionEntry<T>) {
+    this.entries.delete(id)
+    if (entry.value.status === "playing") {
+      this.expired++
+    } else {
+      this.evicted++
+    }
+  }
+}
+import type { Difficulty } from "@/lib/game-rules"
+import { SessionStore } from "@/lib/session-store"
+
+export interface GameState {
+  targetNumber: number
+  attempts: number
+  maxAttempts: number
+  status: "playing" | "won" | "lost"
+  difficulty: Difficulty
+  minRange: number
+  maxRange: number
+  startedAt: number
+}
+
+export interface PlayerStats {
+  totalGames: number
+  gamesWon: number
+  totalScore: number
+  bestStreak: number
+  currentStreak: number
+}
+
+// Storage contract behind the /api/game handler. Backends may be remote, so
+// every call is async even when the in-memory one could answer synchronously.
+export interface GameStore {
+  getGame(gameId: string): Promise<GameState | undefined>
+  saveGame(gameId: string, game: GameState): Promise<void>
+  // Writes a guess back only if the game is still playing and still at
+  // `previousAttempts`, so two concurrent guesses can't both count. False
+  // means another guess got there first; re-read and try again.
+  updateGame(gameId: string, game: GameState, previousAttempts: number): Promise<boolean>
+  getStats(playerId: string): Promise<PlayerStats | undefined>
+  saveStats(playerId: string, stats: PlayerStats): Promise<void>
+  saveStatsBatch(entries: [playerId: string, stats: PlayerStats][]): Promise<void>
+  // Folds each delta into the stored row atomically, so writers never
+  // overwrite each other's updates
+  applyStatsDeltas(entries: [playerId: string, delta: StatsDelta][]): Promise<void>
+  listStats(): AsyncIterable<[playerId: string, stats: PlayerStats]>
+}
+
+export const GAME_IDLE_TTL_MS = 30 * 60 * 1000
+export const GAME_FINISHED_TTL_MS = 60 * 1000
+
+export function emptyStats(): PlayerStats {
+  return {
+    totalGames: 0,
+    gamesWon: 0,
+    totalScore: 0,
+    bestStreak: 0,
+    currentStreak: 0,
+  }
+}
+
+// The change a run of finished games makes to a player's stats. Counts add
+// up; streaks are described by the wins before the first loss, the wins
+// after the last loss and the longest run in between, which is enough to
+// apply the run to any starting row.
+export interface StatsDelta {
+  games: number
+  wins: number
+  score: number
+  lost: boolean
+  leadingWins: number
+  trailingWins: number
+  bestRun: number
+}
+
+export function outcomeDelta(won: boolean, score: number): StatsDelta {
+  const wins = won ? 1 : 0
+  return { games: 1, wins, score, lost: !won, leadingWins: wins, trailingWins: wins, bestRun: wins }
+}
+
+// `first` followed by `second`
+export function mergeDeltas(first: StatsDelta, second: StatsDelta): StatsDelta {
+  return {
+    games: first.games + second.games,
+    wins: first.wins + second.wins,
+    score: first.score + second.score,
+    lost: first.lost || second.lost,
+    leadingWins: first.lost ? first.leadingWins : first.leadingWins + second.leadingWins,
+    trailingWins: second.lost ? second.trailingWins : first.trailingWins + second.leadingWins,
+    bestRun: Math.max(first.bestRun, second.bestRun, first.trailingWins + second.leadingWins),
+  }
+}
+
+// Same arithmetic as the SQL upsert in SqliteGameStore.applyStatsDeltas
+export function applyDelta(stats: PlayerStats, delta: StatsDelta) {
+  stats.totalGames += delta.games
+  stats.gamesWon += delta.wins
+  stats.totalScore += delta.score
+  stats.bestStreak = Math.max(stats.bestStreak, stats.currentStreak + delta.leadingWins, delta.bestRun)
+  stats.currentStreak = delta.lost ? delta.trailingWins : stats.currentStreak + delta.leadingWins
+}
+
+// Fold one finished game into a player's stats, in place
+export function applyOutcome(stats: PlayerStats, won: boolean, score: number) {
+  stats.totalGames++
+  stats.totalScore += score
+
+  if (won) {
+    stats.gamesWon++
+    stats.currentStreak++
+    stats.bestStreak = Math.max(stats.bestStreak, stats.currentStreak)
+  } else {
+    stats.currentStreak = 0
+  }
+}
+
+export class MemoryGameStore implements GameStore {
+  readonly games = new SessionStore<GameState>({
+    maxEntries: 100_000,
+    idleTtlMs: GAME_IDLE_TTL_MS,
+    finishedTtlMs: GAME_FINISHED_TTL_MS,
+    sweepIntervalMs: 30 * 1000,
+  })
+  readonly playerStats = new Map<string, PlayerStats>()
+
+  async getGame(gameId: string) {
+    return this.games.get(gameId)
+  }
+
+  async saveGame(gameId: string, game: GameState) {
+    this.games.set(gameId, game)
+  }
+
+  async updateGame(gameId: string, game: GameState, previousAttempts: number) {
+    const current = this.games.get(gameId)
+    if (current?.status !== "playing" || current.attempts !== previousAttempts) return false
+    this.games.set(gameId, game)
+    return true
+  }
+
+  async getStats(playerId: string) {
+    return this.playerStats.get(playerId)
+  }
+
+  async saveStats(playerId: string, stats: PlayerStats) {
+    this.playerStats.set(playerId, stats)
+  }
+
+  async saveStatsBatch(entries: [string, PlayerStats][]) {
+    for (const [playerId, stats] of entries) {
+      this.playerStats.set(playerId, stats)
+    }
+  }
+
+  async applyStatsDeltas(entries: [string, StatsDelta][]) {
+    for (const [playerId, delta] of entries) {
+      // A fresh object, so anyone holding the previous one isn't changed under them
+      const stats = { ...(this.playerStats.get(playerId) || emptyStats()) }
+      applyDelta(stats, delta)
+      this.playerStats.set(playerId, stats)
+    }
+  }
+
+  async *listStats(): AsyncIterable<[string, PlayerStats]> {
+    yield* this.playerStats
+  }
+}
+
+let storePromise: Promise<GameStore> | undefined
+
+// One store per process, picked by GAME_STORE ("memory" or "sqlite").
+// The SQLite driver is only loaded when it is actually selected.
+export function getGameStore(): Promise<GameStore> {
+  if (!storePromise) {
+    storePromise = createGameStore()
+  }
+  return storePromise
+}
+
+async function createGameStore(): Promise<GameStore> {
+  switch (process.env.GAME_STORE || "memory") {
+    case "sqlite":
+      const { SqliteGameStore } = await import("@/lib/sqlite-game-store")
+      return new SqliteGameStore(process.env.GAME_DB_PATH || "data/guesswise.db")
+    case "memory":
+      const store = new MemoryGameStore()
+      if (process.env.GAME_SNAPSHOT !== "off") {
+        const { enableSnapshots } = await import("@/lib/snapshot")
+        await enableSnapshots(store)
+      }
+      return store
+    default:
+      throw new Error(`Unknown GAME_STORE backend: ${process.env.GAME_STORE}`)
+  }
+}
+import Database from "better-sqlite3"
+import { mkdirSync } from "node:fs"
+import { dirname } from "node:path"
+import {
+  GAME_FINISHED_TTL_MS,
+  GAME_IDLE_TTL_MS,
+  type GameState,
+  type GameStore,
+  type PlayerStats,
+  type StatsDelta,
+} from "@/lib/game-store"
+
+interface GameRow {
+  target_number: number
+  attempts: number
+  max_attempts: number
+  status: GameState["status"]
+  difficulty: GameState["difficulty"]
+  min_range: number
+  max_range: number
+  started_at: number
+}
+
+interface StatsRow {
+  total_games: number
+  games_won: number
+  total_score: number
+  best_streak: number
+  current_streak: number
+}
+
+// SQLite-backed store shared by every worker on the host. One connection per
+// process, WAL so readers never block the writer, and all statements prepared
+// once up front.
+export class SqliteGameStore implements GameStore {
+  private readonly db: Database.Database
+  private readonly selectGame: Database.Statement
+  private readonly upsertGame: Database.Statement
+  private readonly updateGuessedGame: Database.Statement
+  private readonly deleteExpiredGames: Database.Statement
+  private readonly selectStats: Database.Statement
+  private readonly upsertStats: Database.Statement
+  private readonly selectAllStats: Database.Statement
+  private readonly upsertStatsBatch: Database.Transaction<(entries: [string, PlayerStats][]) => void>
+  private readonly mergeStats: Database.Statement
+  private readonly mergeStatsBatch: Database.Transaction<(entries: [string, StatsDelta][]) => void>
+
+  constructor(path: string) {
+    mkdirSync(dirname(path), { recursive: true })
+
+    this.db = new Database(path)
+    this.db.pragma("journal_mode = WAL")
+    this.db.pragma("synchronous = NORMAL")
+    this.db.pragma("busy_timeout = 5000")
+
+    this.db.exec(`
+      CREATE TABLE IF NOT EXISTS games (
+        id TEXT PRIMARY KEY,
+        target_number INTEGER NOT NULL,
+        attempts INTEGER NOT NULL,
+        max_attempts INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        min_range INTEGER NOT NULL,
+        max_range INTEGER NOT NULL,
+        expires_at INTEGER NOT NULL,
+        started_at INTEGER NOT NULL DEFAULT 0,
+        difficulty TEXT NOT NULL DEFAULT 'normal'
+      );
+      CREATE INDEX IF NOT EXISTS games_expires_at ON games (expires_at);
+
+      CREATE TABLE IF NOT EXISTS player_stats (
+        player_id TEXT PRIMARY KEY,
+        total_games INTEGER NOT NULL,
+        games_won INTEGER NOT NULL,
+        total_score INTEGER NOT NULL,
+        best_streak INTEGER NOT NULL,
+        current_streak INTEGER NOT NULL
+      );
+    `)
+
+    // Databases created before games tracked their start time
+    const gameColumns = this.db.pragma("table_info(games)") as { name: string }[]
+    if (!gameColumns.some((column) => column.name === "started_at")) {
+      this.db.exec("ALTER TABLE games ADD COLUMN started_at INTEGER NOT NULL DEFAULT 0")
+    }
+    // ...and before games had a difficulty; all of those were played on normal
+    if (!gameColumns.some((column) => column.name === "difficulty")) {
+      this.db.exec("ALTER TABLE games ADD COLUMN difficulty TEXT NOT NULL DEFAULT 'normal'")
+    }
+
+    this.selectGame = this.db.prepare(`
+      SELECT target_number, attempts, max_attempts, status, difficulty, min_range, max_range, started_at
+      FROM games WHERE id = ? AND expires_at > ?
+    `)
+    this.upsertGame = this.db.prepare(`
+      INSERT INTO games (
+        id, target_number, attempts, max_attempts, status, difficulty, min_range, max_range, started_at, expires_at
+      )
+      VALUES (
+        @id, @targetNumber, @attempts, @maxAttempts, @status, @difficulty, @minRange, @maxRange, @startedAt, @expiresAt
+      )
+      ON CONFLICT (id) DO UPDATE SET
+        attempts = excluded.attempts,
+        status = excluded.status,
+        expires_at = excluded.expires_at
+    `)
+    // Compare-and-set on the attempt count: of two guesses that read the same
+    // row, only the first to write changes it
+    this.updateGuessedGame = this.db.prepare(`
+      UPDATE games SET attempts = @attempts, status = @status, expires_at = @expiresAt
+      WHERE id = @id AND status = 'playing' AND attempts = @previousAttempts AND expires_at > @now
+    `)
+    this.deleteExpiredGames = this.db.prepare("DELETE FROM games WHERE expires_at <= ?")
+    this.selectStats = this.db.prepare(
+      "SELECT total_games, games_won, total_score, best_streak, current_streak FROM player_stats WHERE player_id = ?",
+    )
+    this.upsertStats = this.db.prepare(`
+      INSERT INTO player_stats (player_id, total_games, games_won, total_score, best_streak, current_streak)
+      VALUES (@playerId, @totalGames, @gamesWon, @totalScore, @bestStreak, @currentStreak)
+      ON CONFLICT (player_id) DO UPDATE SET
+        total_games = excluded.total_games,
+        games_won = excluded.games_won,
+        total_score = excluded.total_score,
+        best_streak = excluded.best_streak,
+        current_streak = excluded.current_streak
+    `)
+    this.selectAllStats = this.db.prepare(
+      "SELECT player_id, total_games, games_won, total_score, best_streak, current_streak FROM player_stats",
+    )
+    this.upsertStatsBatch = this.db.transaction((entries: [string, PlayerStats][]) => {
+      for (const [playerId, stats] of entries) {
+        this.upsertStats.run({ playerId, ...stats })
+      }
+    })
+    // Every worker's deltas are merged in the row itself; the right-hand sides
+    // all see the row as it was before this update
+    this.mergeStats = this.db.prepare(`
+      INSERT INTO player_stats (player_id, total_games, games_won, total_score, best_streak, current_streak)
+      VALUES (@playerId, @games, @wins, @score, @bestRun, CASE WHEN @lost THEN @trailingWins ELSE @leadingWins END)
+      ON CONFLICT (player_id) DO UPDATE SET
+        total_games = total_games + @games,
+        games_won = games_won + @wins,
+        total_score = total_score + @score,
+        best_streak = MAX(best_streak, current_streak + @leadingWins, @bestRun),
+        current_streak = CASE WHEN @lost THEN @trailingWins ELSE current_streak + @leadingWins END
+    `)
+    this.mergeStatsBatch = this.db.transaction((entries: [string, StatsDelta][]) => {
+      for (const [playerId, delta] of entries) {
+        this.mergeStats.run({ playerId, ...delta, lost: delta.lost ? 1 : 0 })
+      }
+    })
+
+    const timer = setInterval(() => this.deleteExpiredGames.run(Date.now()), 60 * 1000)
+    timer.unref?.()
+  }
+
+  async getGame(gameId: string): Promise<GameState | undefined> {
+    const row = this.selectGame.get(gameId, Date.now()) as GameRow | undefined
+    if (!row) return undefined
+
+    return {
+      targetNumber: row.target_number,
+      attempts: row.attempts,
+      maxAttempts: row.max_attempts,
+      status: row.status,
+      difficulty: row.difficulty,
+      minRange: row.min_range,
+      maxRange: row.max_range,
+      startedAt: row.started_at,
+    }
+  }
+
+  async saveGame(gameId: string, game: GameState) {
+    const ttl = game.status === "playing" ? GAME_IDLE_TTL_MS : GAME_FINISHED_TTL_MS
+    this.upsertGame.run({ id: gameId, ...game, expiresAt: Date.now() + ttl })
+  }
+
+  async updateGame(gameId: string, game: GameState, previousAttempts: number) {
+    const now = Date.now()
+    const ttl = game.status === "playing" ? GAME_IDLE_TTL_MS : GAME_FINISHED_TTL_MS
+    const { changes } = this.updateGuessedGame.run({
+      id: gameId,
+      attempts: game.attempts,
+      status: game.status,
+      expiresAt: now + ttl,
+      previousAttempts,
+      now,
+    })
+    return changes === 1
+  }
+
+  async getStats(playerId: string): Promise<PlayerStats | undefined> {
+    const row = this.selectStats.get(playerId) as StatsRow | undefined
+    return row && statsFromRow(row)
+  }
+
+  async saveStats(playerId: string, stats: PlayerStats) {
+    this.upsertStats.run({ playerId, ...stats })
+  }
+
+  async saveStatsBatch(entries: [string, PlayerStats][]) {
+    // One transaction, one WAL commit for the whole batch
+    this.upsertStatsBatch(entries)
+  }
+
+  async applyStatsDeltas(entries: [string, StatsDelta][]) {
+    this.mergeStatsBatch(entries)
+  }
+
+  async *listStats(): AsyncIterable<[string, PlayerStats]> {
+    for (const row of this.selectAllStats.iterate() as Iterable<StatsRow & { player_id: string }>) {
+      yield [row.player_id, statsFromRow(row)]
+    }
+  }
+
+  close() {
+    this.db.close()
+  }
+}
+
+function statsFromRow(row: StatsRow): PlayerStats {
+  return {
+    totalGames: row.total_games,
+    gamesWon: row.games_won,
+    totalScore: row.total_score,
+    bestStreak: row.best_streak,
+    currentStreak: row.current_streak,
+  }
+}
+type ShutdownTask = () => Promise<void> | void
+
+const tasks: ShutdownTask[] = []
+let installed = false
+
+// Run registered tasks once on SIGTERM/SIGINT, then let the signal take the
+// process down as it would have without us. Repeats of the signal while the
+// tasks run are ignored: under cluster.ts a Ctrl+C reaches a worker both
+// from the terminal and from the primary.
+export function onShutdown(task: ShutdownTask) {
+  tasks.push(task)
+  if (installed) return
+  installed = true
+
+  for (const signal of ["SIGTERM", "SIGINT"] as const) {
+    const handler = async () => {
+      if (running) return
+      await runShutdownTasks()
+      process.removeListener(signal, handler)
+      process.kill(process.pid, signal)
+    }
+    process.on(signal, handler)
+  }
+  process.once("beforeExit", () => {
+    void runShutdownTasks()
+  })
+}
+
+let running: Promise<void> | undefined
+
+export function runShutdownTasks() {
+  if (!running) {
+    running = Promise.allSettled(tasks.map((task) => task())).then((results) => {
+      for (const result of results) {
+        if (result.status === "rejected") {
+          console.error("Shutdown task failed:", result.reason)
+        }
+      }
+    })
+  }
+  return running
+}
+import {
+  applyDelta,
+  emptyStats,
+  getGameStore,
+  mergeDeltas,
+  outcomeDelta,
+  type PlayerStats,
+  type StatsDelta,
+} from "@/lib/game-store"
+import { onShutdown } from "@/lib/shutdown"
+
+interface StatsWriteBufferOptions {
+  maxPending: number
+  flushIntervalMs: number
+}
+
+// Write-behind buffer for player stats. Finished games only touch memory:
+// each one is recorded as a delta, deltas for the same player collapse into
+// one per flush, and the batch is merged into the store on a size or time
+// trigger. Only deltas are ever written, so workers sharing a store can't
+// overwrite each other's updates, and recording never waits on a read.
+export class StatsWriteBuffer {
+  private pending = new Map<string, StatsDelta>()
+  private inflight = new Map<string, StatsDelta>()
+  private flushing: Promise<void> | undefined
+  // Bumped whenever deltas move into the store, see get()
+  private flushes = 0
+  private readonly options: StatsWriteBufferOptions
+
+  constructor(options: StatsWriteBufferOptions) {
+    this.options = options
+
+    const timer = setInterval(() => void this.flush(), options.flushIntervalMs)
+    timer.unref?.()
+  }
+
+  get pendingCount() {
+    return this.pending.size
+  }
+
+  // Stored stats with this process's unflushed games applied on top
+  async get(playerId: string): Promise<PlayerStats | undefined> {
+    const store = await getGameStore()
+    for (;;) {
+      const flushes = this.flushes
+      const stored = await store.getStats(playerId)
+      // A flush finishing mid-read may or may not be in `stored`; read again
+      if (flushes !== this.flushes) continue
+
+      const inflight = this.inflight.get(playerId)
+      const pending = this.pending.get(playerId)
+      if (!inflight && !pending) return stored
+
+      const stats = { ...(stored || emptyStats()) }
+      if (inflight) applyDelta(stats, inflight)
+      if (pending) applyDelta(stats, pending)
+      return stats
+    }
+  }
+
+  record(playerId: string, won: boolean, score: number) {
+    const delta = outcomeDelta(won, score)
+    const pending = this.pending.get(playerId)
+    this.pending.set(playerId, pending ? mergeDeltas(pending, delta) : delta)
+    if (this.pending.size >= this.options.maxPending) {
+      void this.flush()
+    }
+  }
+
+  flush(): Promise<void> {
+    if (this.flushing) {
+      // Chain so nothing recorded during the current flush is left behind
+      return this.flushing.then(() => (this.pending.size > 0 ? this.flush() : undefined))
+    }
+    if (this.pending.size === 0) return Promise.resolve()
+
+    this.inflight = this.pending
+    this.pending = new Map()
+    this.flushing = this.writeInflight().finally(() => {
+      this.flushing = undefined
+    })
+    return this.flushing
+  }
+
+  private async writeInflight() {
+    const batch = [...this.inflight]
+    try {
+      const store = await getGameStore()
+      await store.applyStatsDeltas(batch)
+    } catch (error) {
+      console.error("Failed to flush player stats:", error)
+      // Requeue ahead of anything recorded since, keeping the games in order
+      for (const [playerId, delta] of batch) {
+        const later = this.pending.get(playerId)
+        this.pending.set(playerId, later ? mergeDeltas(delta, later) : delta)
+      }
+    } finally {
+      this.inflight = new Map()
+      this.flushes++
+    }
+  }
+}
+
+let buffer: StatsWriteBuffer | undefined
+
+export function getStatsWriteBuffer() {
+  if (!buffer) {
+    buffer = new StatsWriteBuffer({
+      maxPending: Number(process.env.STATS_FLUSH_MAX_PENDING) || 500,
+      flushIntervalMs: Number(process.env.STATS_FLUSH_INTERVAL_MS) || 1000,
+    })
+    const instance = buffer
+    onShutdown(() => instance.flush())
+  }
+  return buffer
+}
+import { getGameStore } from "@/lib/game-store"
+
+export interface LeaderboardEntry {
+  id: string
+  name?: string
+  score: number
+  gamesWon: number
+  totalGames: number
+}
+
+const MAX_LEVEL = 32
+const LEVEL_PROBABILITY = 0.25
+
+class SkipNode {
+  readonly forward: (SkipNode | null)[]
+  // span[i] = number of level-0 steps that forward[i] jumps over
+  readonly span: number[]
+
+  constructor(
+    public entry: LeaderboardEntry,
+    level: number,
+  ) {
+    this.forward = new Array(level).fill(null)
+    this.span = new Array(level).fill(0)
+  }
+}
+
+// Highest score first; ties broken by id so every entry has a stable position
+function compare(a: LeaderboardEntry, b: LeaderboardEntry) {
+  if (a.score !== b.score) return b.score - a.score
+  return a.id < b.id ? -1 : a.id > b.id ? 1 : 0
+}
+
+// Ranked skip list (the same layout Redis uses for sorted sets). Updates,
+// rank lookups and seeking to an offset are all O(log n); reading a page is
+// O(log n + limit).
+export class LeaderboardIndex {
+  private readonly head = new SkipNode({ id: "", score: 0, gamesWon: 0, totalGames: 0 }, MAX_LEVEL)
+  private readonly nodes = new Map<string, SkipNode>()
+  private level = 1
+  private length = 0
+  private version = 0
+  // Best (lowest) rank touched since the last takeChangedRank()
+  private changedFrom = Infinity
+
+  get size() {
+    return this.nodes.size
+  }
+
+  // Bumped on every change, so callers can cheaply tell if a page is stale
+  // or whether anything moved since they last looked
+  get currentVersion() {
+    return this.version
+  }
+
+  // Lowest rank whose row changed since the previous call, or Infinity if
+  // nothing did. Everything ranked above it is exactly as it was.
+  takeChangedRank() {
+    const rank = this.changedFrom
+    this.changedFrom = Infinity
+    return rank
+  }
+
+  upsert(entry: LeaderboardEntry) {
+    const existing = this.nodes.get(entry.id)
+    if (existing && existing.entry.score === entry.score) {
+      // Position is unchanged, only the payload moves
+      existing.entry = { ...existing.entry, ...entry }
+      this.markChanged(this.rank(entry.id))
+      this.version++
+      return
+    }
+
+    if (existing) {
+      // Rows between the old and new position all shift by one
+      this.markChanged(this.rank(entry.id))
+      entry = { ...existing.entry, ...entry }
+      this.unlink(existing.entry)
+    }
+    this.nodes.set(entry.id, this.insert(entry))
+    this.markChanged(this.rank(entry.id))
+    this.version++
+  }
+
+  remove(id: string) {
+    const node = this.nodes.get(id)
+    if (!node) return false
+
+    this.markChanged(this.rank(id))
+    this.unlink(node.entry)
+    this.nodes.delete(id)
+    this.version++
+    return true
+  }
+
+  get(id: string) {
+    return this.nodes.get(id)?.entry
+  }
+
+  // 1-based rank, or 0 if the player isn't ranked
+  rank(id: string) {
+    const node = this.nodes.get(id)
+    if (!node) return 0
+
+    let rank = 0
+    let x = this.head
+    for (let i = this.level - 1; i >= 0; i--) {
+      let next = x.forward[i]
+      while (next && compare(next.entry, node.entry) <= 0) {
+        rank += x.span[i]
+        x = next
+        next = x.forward[i]
+      }
+      if (x === node) return rank
+    }
+    return 0
+  }
+
+  // Number of entries ranked at or ahead of the (score, id) position,
+  // whether or not that exact entry is still in the index
+  countThrough(score: number, id: string) {
+    const key: LeaderboardEntry = { id, score, gamesWon: 0, totalGames: 0 }
+
+    let count = 0
+    let x = this.head
+    for (let i = this.level - 1; i >= 0; i--) {
+      while (x.forward[i] && compare(x.forward[i]!.entry, key) <= 0) {
+        count += x.span[i]
+        x = x.forward[i]!
+      }
+    }
+    return count
+  }
+
+  // Entries at 0-based positions [offset, offset + limit)
+  range(offset: number, limit: number): LeaderboardEntry[] {
+    const result: LeaderboardEntry[] = []
+    if (limit <= 0 || offset < 0 || offset >= this.length) return result
+
+    let node = this.nodeAt(offset + 1)
+    while (node && result.length < limit) {
+      result.push(node.entry)
+      node = node.forward[0]
+    }
+    return result
+  }
+
+  private markChanged(rank: number) {
+    if (rank < this.changedFrom) this.changedFrom = rank
+  }
+
+  private nodeAt(rank: number) {
+    let traversed = 0
+    let x = this.head
+    for (let i = this.level - 1; i >= 0; i--) {
+      while (x.forward[i] && traversed + x.span[i] <= rank) {
+        traversed += x.span[i]
+        x = x.forward[i]!
+      }
+      if (traversed === rank) return x
+    }
+    return null
+  }
+
+  private insert(entry: LeaderboardEntry) {
+    const update = new Array<SkipNode>(MAX_LEVEL)
+    const rank = new Array<number>(MAX_LEVEL)
+
+    let x = this.head
+    for (let i = this.level - 1; i >= 0; i--) {
+      rank[i] = i === this.level - 1 ? 0 : rank[i + 1]
+      while (x.forward[i] && compare(x.forward[i]!.entry, entry) < 0) {
+        rank[i] += x.span[i]
+        x = x.forward[i]!
+      }
+      update[i] = x
+    }
+
+    const level = randomLevel()
+    if (level > this.level) {
+      for (let i = this.level; i < level; i++) {
+        rank[i] = 0
+        update[i] = this.head
+        this.head.span[i] = this.length
+      }
+      this.level = level
+    }
+
+    const node = new SkipNode(entry, level)
+    for (let i = 0; i < level; i++) {
+      node.forward[i] = update[i].forward[i]
+      update[i].forward[i] = node
+      node.span[i] = update[i].span[i] - (rank[0] - rank[i])
+      update[i].span[i] = rank[0] - rank[i] + 1
+    }
+    for (let i = level; i < this.level; i++) {
+      update[i].span[i]++
+    }
+    this.length++
+    return node
+  }
+
+  private unlink(entry: LeaderboardEntry) {
+    const update = new Array<SkipNode>(MAX_LEVEL)
+
+    let x = this.head
+    for (let i = this.level - 1; i >= 0; i--) {
+      while (x.forward[i] && compare(x.forward[i]!.entry, entry) < 0) {
+        x = x.forward[i]!
+      }
+      update[i] = x
+    }
+
+    const node = x.forward[0]
+    if (!node || node.entry.id !== entry.id) return
+
+    for (let i = 0; i < this.level; i++) {
+      if (update[i].forward[i] === node) {
+        update[i].span[i] += node.span[i] - 1
+        update[i].forward[i] = node.forward[i]
+      } else {
+        update[i].span[i]--
+      }
+    }
+    while (this.level > 1 && !this.head.forward[this.level - 1]) {
+      this.level--
+    }
+    this.length--
+  }
+}
+
+function randomLevel() {
+  let level = 1
+  while (level < MAX_LEVEL && Math.random() < LEVEL_PROBABILITY) {
+    level++
+  }
+  return level
+}
+
+export function toLeaderboardRow(entry: LeaderboardEntry, rank: number) {
+  return {
+    id: entry.id,
+    rank,
+    name: entry.name || `Player ${entry.id.slice(0, 6)}`,
+    score: entry.score,
+    gamesWon: entry.gamesWon,
+    winRate: entry.totalGames > 0 ? Math.round((entry.gamesWon / entry.totalGames) * 100) : 0,
+  }
+}
+
+// Sample players so a dev or demo install doesn't show an empty board. Never
+// in production unless LEADERBOARD_DEMO=on asks for it.
+const SAMPLE_PLAYERS: LeaderboardEntry[] = [
+  { id: "sample1", name: "Alex Champion", score: 2450, gamesWon: 28, totalGames: 30 },
+  { id: "sample2", name: "Sarah Genius", score: 2180, gamesWon: 24, totalGames: 27 },
+  { id: "sample3", name: "Mike Master", score: 1950, gamesWon: 22, totalGames: 26 },
+  { id: "sample4", name: "Lisa Legend", score: 1720, gamesWon: 19, totalGames: 23 },
+  { id: "sample5", name: "Tom Tactician", score: 1580, gamesWon: 17, totalGames: 22 },
+]
+
+let indexPromise: Promise<LeaderboardIndex> | undefined
+
+// Built once per process from the stats already in the store, then kept
+// current by updatePlayerStats.
+export function getLeaderboardIndex(): Promise<LeaderboardIndex> {
+  if (!indexPromise) {
+    indexPromise = buildLeaderboardIndex()
+  }
+  return indexPromise
+}
+
+function seedSamplePlayers() {
+  const demo = process.env.LEADERBOARD_DEMO
+  return demo ? demo === "on" : process.env.NODE_ENV !== "production"
+}
+
+async function buildLeaderboardIndex() {
+  const index = new LeaderboardIndex()
+  if (seedSamplePlayers()) {
+    for (const entry of SAMPLE_PLAYERS) {
+      index.upsert(entry)
+    }
+  }
+
+  const store = await getGameStore()
+  for await (const [playerId, stats] of store.listStats()) {
+    index.upsert({
+      id: playerId,
+      score: stats.totalScore,
+      gamesWon: stats.gamesWon,
+      totalGames: stats.totalGames,
+    })
+  }
+  return index
+}
+import { emptyStats, getGameStore, type GameState, type PlayerStats } from "@/lib/game-store"
+import { getStatsWriteBuffer } from "@/lib/stats-write-buffer"
+import { getLeaderboardIndex } from "@/lib/leaderboard-index"
+import { getEventLog } from "@/lib/event-log"
+import { recordOutcome } from "@/lib/game-analytics"
+import { createId, shardOf } from "@/lib/ids"
+import { getTargetPool } from "@/lib/rng"
+import { localShard } from "@/lib/shard-router"
+import {
+  evaluateGuess,
+  GUESS_CORRECT,
+  GUESS_OUT_OF_ATTEMPTS,
+  GUESS_TOO_LOW,
+  isInRange,
+  RULES,
+  scoreFor,
+  type Difficulty,
+  type GuessOutcome,
+} from "@/lib/game-rules"
+import { publishLeaderboardEntry } from "@/lib/leaderboard-replication"
+import { actionDuration, actionTotal } from "@/lib/game-metrics"
+
+// An operation as clients send it
+export interface GameAction {
+  action: string
+  gameId?: string
+  guess?: unknown
+  playerId?: string
+  includeStats?: boolean
+  difficulty?: string
+}
+
+// The same operation after validateGameAction; fields an action doesn't use
+// are left empty
+export interface ValidGameAction {
+  action: "start" | "guess" | "stats"
+  gameId: string
+  guess: number
+  playerId: string
+  includeStats: boolean
+  difficulty: Difficulty
+}
+
+export interface GameActionResult {
+  success: boolean
+  message?: string
+  [key: string]: unknown
+}
+
+// The start/guess/stats logic behind /api/game, independent of transport.
+// Input must already have been through validateGameAction.
+export async function handleGameAction(op: ValidGameAction): Promise<GameActionResult> {
+  const { action } = op
+  const started = performance.now()
+  try {
+    const result = await runGameAction(op)
+    actionTotal.inc({ action, outcome: result.success ? "ok" : "rejected" })
+    return result
+  } catch (error) {
+    actionTotal.inc({ action, outcome: "error" })
+    throw error
+  } finally {
+    actionDuration.observe((performance.now() - started) / 1000, { action })
+  }
+}
+
+async function runGameAction({
+  action,
+  gameId,
+  guess,
+  playerId,
+  includeStats,
+  difficulty,
+}: ValidGameAction): Promise<GameActionResult> {
+  const store = await getGameStore()
+
+  switch (action) {
+    case "start":
+      const rules = RULES[difficulty]
+      const targetNumber = getTargetPool(rules.minRange, rules.maxRange).take()
+      // Same shard as the player, so the game and their stats live together.
+      // Without a player, a shard this worker owns so guesses come back here.
+      const newGameId = createId(shardOf(playerId) ?? localShard())
+
+      await store.saveGame(newGameId, {
+        targetNumber,
+        attempts: 0,
+        maxAttempts: rules.maxAttempts,
+        status: "playing",
+        difficulty,
+        minRange: rules.minRange,
+        maxRange: rules.maxRange,
+        startedAt: Date.now(),
+      })
+      getEventLog()?.append({ type: "start", gameId: newGameId, playerId, value: targetNumber })
+
+      return {
+        success: true,
+        gameId: newGameId,
+        message: `New game started! Guess a number between ${rules.minRange} and ${rules.maxRange}.`,
+        maxAttempts: rules.maxAttempts,
+        minRange: rules.minRange,
+        maxRange: rules.maxRange,
+        // Lets the client skip a separate "stats" request on load
+        stats: includeStats ? (await getStatsWriteBuffer().get(playerId)) || emptyStats() : undefined,
+      }
+
+    case "guess":
+      const guessNumber = guess
+      let game: GameState
+      let outcome: GuessOutcome
+      // Guesses on one game can race, within a worker or across workers
+      // sharing a store. Each is judged against the game as read and only
+      // counts if nothing else wrote it since; the loser re-reads and is
+      // judged again, so attempts never go past the limit and a game is
+      // won or lost exactly once.
+      for (;;) {
+        const current = await store.getGame(gameId)
+        if (!current) {
+          return { success: false, message: "Game not found" }
+        }
+
+        if (current.status !== "playing") {
+          return { success: false, message: "Game is already finished" }
+        }
+
+        if (!isInRange(current, guessNumber)) {
+          return {
+            success: false,
+            message: `Please enter a valid number between ${current.minRange} and ${current.maxRange}`,
+          }
+        }
+
+        const attempts = current.attempts + 1
+        outcome = evaluateGuess(current.targetNumber, guessNumber, attempts, current.maxAttempts)
+        const status = outcome === GUESS_CORRECT ? "won" : outcome === GUESS_OUT_OF_ATTEMPTS ? "lost" : "playing"
+        // A copy: the in-memory store hands out the stored object itself.
+        // Written back before anything else so other workers see the new
+        // attempt count and finished games pick up the shorter retention.
+        game = { ...current, attempts, status }
+        if (await store.updateGame(gameId, game, current.attempts)) break
+      }
+
+      const eventLog = getEventLog()
+      eventLog?.append({ type: "guess", gameId, playerId, value: guessNumber })
+      let message = ""
+      let gameEnded = false
+      let score = 0
+      let updatedStats
+
+      if (outcome === GUESS_CORRECT) {
+        score = scoreFor(RULES[game.difficulty].scoring, game.attempts, game.maxAttempts)
+        message = `🎉 Congratulations! You guessed it in ${game.attempts} attempt${game.attempts === 1 ? "" : "s"}!`
+        gameEnded = true
+
+        // Update player stats
+        eventLog?.append({ type: "won", gameId, playerId, value: score })
+        recordOutcome(game, true, score)
+        updatedStats = await updatePlayerStats(playerId, true, score, includeStats)
+      } else if (outcome === GUESS_OUT_OF_ATTEMPTS) {
+        message = `😔 Game over! The number was ${game.targetNumber}.`
+        gameEnded = true
+
+        // Update player stats
+        eventLog?.append({ type: "lost", gameId, playerId, value: 0 })
+        recordOutcome(game, false, 0)
+        updatedStats = await updatePlayerStats(playerId, false, 0, includeStats)
+      } else {
+        const remaining = game.maxAttempts - game.attempts
+        if (outcome === GUESS_TOO_LOW) {
+          message = `📈 Too low! Try higher. ${remaining} attempt${remaining === 1 ? "" : "s"} remaining.`
+        } else {
+          message = `📉 Too high! Try lower. ${remaining} attempt${remaining === 1 ? "" : "s"} remaining.`
+        }
+      }
+
+      return {
+        success: true,
+        message,
+        attempts: game.attempts,
+        maxAttempts: game.maxAttempts,
+        status: game.status,
+        score,
+        gameEnded,
+        // Stats only change when a game ends, so that's the only time they're sent
+        stats: includeStats ? updatedStats : undefined,
+      }
+
+    case "stats":
+      const stats = (await getStatsWriteBuffer().get(playerId)) || emptyStats()
+
+      return {
+        success: true,
+        stats,
+      }
+
+    default:
+      return { success: false, message: "Invalid action" }
+  }
+}
+
+// Records a finished game without waiting on the store: the durable write
+// happens on the next batch flush, and the leaderboard entry is the index's
+// own plus this game. The store is only read when the caller wants the stats.
+async function updatePlayerStats(
+  playerId: string,
+  won: boolean,
+  score: number,
+  includeStats: boolean,
+): Promise<PlayerStats | undefined> {
+  const buffer = getStatsWriteBuffer()
+  // Recorded before any await, so concurrent finishes for one player all count
+  buffer.record(playerId, won, score)
+
+  const leaderboard = await getLeaderboardIndex()
+  // Read and written with no await in between, so finishes can't interleave
+  const current = leaderboard.get(playerId)
+  const entry = {
+    id: playerId,
+    score: (current?.score ?? 0) + score,
+    gamesWon: (current?.gamesWon ?? 0) + (won ? 1 : 0),
+    totalGames: (current?.totalGames ?? 0) + 1,
+  }
+  leaderboard.upsert(entry)
+  // Other cluster workers keep a full copy of the board
+  publishLeaderboardEntry(entry)
+
+  return includeStats ? (await buffer.get(playerId)) || emptyStats() : undefined
+}
+import type { GameAction, GameActionResult } from "@/lib/game-actions"
+
+// Compact framing for the game socket. Frames are JSON arrays so the field
+// names never go over the wire.
+//
+//   client -> server   [seq, "s", playerId, includeStats, difficulty?]     start
+//                      [seq, "g", gameId, guess, playerId, includeStats]   guess
+//                      [seq, "t", playerId]                                stats
+//                      ["w", depth]                                        watch ranks 1..depth
+//   server -> client   [seq, result]                                       reply
+//                      [0, "lb", version]                                  leaderboard moved
+//
+// includeStats is sent as 1/0. seq 0 is reserved for server pushes, and a
+// socket only gets "lb" pushes for changes within the depth it last watched.
+
+export type ServerFrame = [seq: number, result: GameActionResult] | [seq: 0, type: "lb", version: number]
+
+export function encodeAction(seq: number, { action, gameId, guess, playerId, includeStats, difficulty }: GameAction) {
+  const stats = includeStats ? 1 : 0
+  switch (action) {
+    case "start":
+      return JSON.stringify(difficulty ? [seq, "s", playerId, stats, difficulty] : [seq, "s", playerId, stats])
+    case "guess":
+      return JSON.stringify([seq, "g", gameId, guess, playerId, stats])
+    case "stats":
+      return JSON.stringify([seq, "t", playerId])
+    default:
+      throw new Error(`Unsupported action: ${action}`)
+  }
+}
+
+export function decodeAction(frame: string): { seq: number; action: GameAction } | null {
+  let parsed: unknown
+  try {
+    parsed = JSON.parse(frame)
+  } catch {
+    return null
+  }
+  if (!Array.isArray(parsed) || typeof parsed[0] !== "number" || parsed[0] < 1) return null
+
+  const [seq, op] = parsed
+  switch (op) {
+    case "s":
+      return {
+        seq,
+        action: { action: "start", playerId: parsed[2], includeStats: parsed[3] === 1, difficulty: parsed[4] },
+      }
+    case "g":
+      return {
+        seq,
+        action: { action: "guess", gameId: parsed[2], guess: parsed[3], playerId: parsed[4], includeStats: parsed[5] === 1 },
+      }
+    case "t":
+      return { seq, action: { action: "stats", playerId: parsed[2] } }
+    default:
+      return { seq, action: { action: String(op) } }
+  }
+}
+
+export function encodeWatch(depth: number) {
+  return JSON.stringify(["w", depth])
+}
+
+// The depth from a watch frame, or null for any other frame
+export function decodeWatch(frame: string) {
+  if (!frame.startsWith('["w"')) return null
+  try {
+    const depth = JSON.parse(frame)[1]
+    return Number.isSafeInteger(depth) && depth >= 0 ? (depth as number) : null
+  } catch {
+    return null
+  }
+}
+
+export function encodeResult(seq: number, result: GameActionResult) {
+  return JSON.stringify([seq, result])
+}
+
+export function encodeLeaderboardChanged(version: number) {
+  return JSON.stringify([0, "lb", version])
+}
+import type { IncomingMessage, Server } from "node:http"
+import type { Duplex } from "node:stream"
+import { WebSocketServer, type WebSocket } from "ws"
+import { handleGameAction } from "@/lib/game-actions"
+import { decodeAction, decodeWatch, encodeLeaderboardChanged, encodeResult } from "@/lib/game-protocol"
+import { validateGameAction } from "@/lib/game-request"
+import { clientIp, getRateLimiter } from "@/lib/rate-limit"
+import { rejectedRequests } from "@/lib/game-metrics"
+import { getLeaderboardIndex } from "@/lib/leaderboard-index"
+
+export const GAME_SOCKET_PATH = "/api/game/socket"
+
+const MAX_FRAME_BYTES = 4 * 1024
+const HEARTBEAT_MS = 30 * 1000
+const LEADERBOARD_PUSH_MS = 1000
+
+// Long-lived game channel next to the JSON POST API. Route handlers can't
+// take over a connection, so this hooks the upgrade event of the custom
+// server (server.ts) and runs the same handleGameAction as /api/game.
+export function attachGameSocket(server: Server) {
+  const wss = new WebSocketServer({ noServer: true, maxPayload: MAX_FRAME_BYTES })
+  const alive = new WeakSet<WebSocket>()
+  // How many leaderboard rows each socket has on screen
+  const watching = new WeakMap<WebSocket, number>()
+
+  server.on("upgrade", (request: IncomingMessage, socket: Duplex, head: Buffer) => {
+    const { pathname } = new URL(request.url || "/", "http://localhost")
+    if (pathname !== GAME_SOCKET_PATH) return
+
+    wss.handleUpgrade(request, socket, head, (ws) => wss.emit("connection", ws, request))
+  })
+
+  wss.on("connection", (ws, request: IncomingMessage) => {
+    const ip = clientIp(request.headers, request.socket.remoteAddress)
+    alive.add(ws)
+    ws.on("pong", () => alive.add(ws))
+
+    ws.on("message", async (data) => {
+      const text = data.toString()
+      const depth = decodeWatch(text)
+      if (depth !== null) {
+        watching.set(ws, depth)
+        return
+      }
+
+      const decoded = decodeAction(text)
+      if (!decoded) {
+        ws.close(1003, "Malformed frame")
+        return
+      }
+
+      const op = validateGameAction(decoded.action)
+      let result
+      if (!op.ok) {
+        rejectedRequests.inc({ error: op.error.error })
+        result = op.error
+      } else {
+        const limited = await getRateLimiter().check(op.value, ip)
+        if (!limited.ok) {
+          rejectedRequests.inc({ error: "rate_limited" })
+          result = limited.error
+        } else {
+          try {
+            result = await handleGameAction(op.value)
+          } catch (error) {
+            result = { success: false, message: "Server error" }
+          }
+        }
+      }
+      if (ws.readyState === ws.OPEN) {
+        ws.send(encodeResult(decoded.seq, result))
+      }
+    })
+  })
+
+  // Drop connections that stopped answering pings
+  const heartbeat = setInterval(() => {
+    for (const ws of wss.clients) {
+      if (!alive.has(ws)) {
+        ws.terminate()
+        continue
+      }
+      alive.delete(ws)
+      ws.ping()
+    }
+  }, HEARTBEAT_MS)
+
+  // Coalesce leaderboard changes into at most one push per interval, sent only
+  // to sockets whose visible rows changed
+  const push = setInterval(async () => {
+    const index = await getLeaderboardIndex()
+    const changedRank = index.takeChangedRank()
+    if (changedRank === Infinity) return
+
+    const frame = encodeLeaderboardChanged(index.currentVersion)
+    for (const ws of wss.clients) {
+      if (ws.readyState === ws.OPEN && (watching.get(ws) ?? 0) >= changedRank) ws.send(frame)
+    }
+  }, LEADERBOARD_PUSH_MS)
+
+  wss.on("close", () => {
+    clearInterval(heartbeat)
+    clearInterval(push)
+  })
+
+  return wss
+}
+import { startAppServer } from "@/lib/app-server"
+
+const port = Number(process.env.PORT) || 3000
+
+startAppServer(port).then(() => {
+  console.log(`> GuessWise ready on http://localhost:${port}`)
+})
+"use client"
+
+import type { GameAction } from "@/lib/game-actions"
+import { encodeAction, encodeWatch, type ServerFrame } from "@/lib/game-protocol"
+import { createId, isId } from "@/lib/ids"
+import { ROUTING_KEY_HEADER, routingKey } from "@/lib/shard-router"
+
+// Reconnects back off exponentially up to the cap, with jitter so a server
+// restart doesn't bring every client back in the same instant
+const RECONNECT_BASE_MS = 1000
+const RECONNECT_MAX_MS = 60 * 1000
+
+// Browser side of the game socket. Requests go over the socket when it is
+// open and fall back to POST /api/game otherwise, so callers never care
+// which transport answered.
+export class GameConnection {
+  private socket: WebSocket | null = null
+  private seq = 0
+  private readonly pending = new Map<number, { resolve: (result: any) => void; reject: (error: Error) => void }>()
+  private readonly leaderboardListeners = new Set<() => void>()
+  private watchDepth = 0
+  private reconnectAttempts = 0
+
+  constructor(private readonly url: string) {
+    this.connect()
+  }
+
+  async send(action: GameAction): Promise<any> {
+    const socket = this.socket
+    if (!socket || socket.readyState !== WebSocket.OPEN) {
+      const response = await fetch("/api/game", {
+        method: "POST",
+        headers: { "Content-Type": "application/json", [ROUTING_KEY_HEADER]: routingKey(action) ?? "" },
+        body: JSON.stringify(action),
+      })
+      return response.json()
+    }
+
+    const seq = ++this.seq
+    return new Promise((resolve, reject) => {
+      this.pending.set(seq, { resolve, reject })
+      socket.send(encodeAction(seq, action))
+    })
+  }
+
+  onLeaderboardChange(listener: () => void) {
+    this.leaderboardListeners.add(listener)
+    return () => {
+      this.leaderboardListeners.delete(listener)
+    }
+  }
+
+  // Only changes within the top `depth` ranks are pushed; 0 stops them
+  watchLeaderboard(depth: number) {
+    if (depth === this.watchDepth) return
+    this.watchDepth = depth
+    if (this.socket?.readyState === WebSocket.OPEN) this.socket.send(encodeWatch(depth))
+  }
+
+  private connect() {
+    const socket = new WebSocket(this.url)
+
+    socket.onmessage = (event) => {
+      const frame = JSON.parse(event.data) as ServerFrame
+      if (frame[0] === 0) {
+        for (const listener of this.leaderboardListeners) listener()
+        return
+      }
+
+      const request = this.pending.get(frame[0])
+      if (request) {
+        this.pending.delete(frame[0])
+        request.resolve(frame[1])
+      }
+    }
+
+    socket.onclose = () => {
+      this.socket = null
+      for (const request of this.pending.values()) {
+        request.reject(new Error("Game connection closed"))
+      }
+      this.pending.clear()
+
+      const ceiling = Math.min(RECONNECT_BASE_MS * 2 ** this.reconnectAttempts, RECONNECT_MAX_MS)
+      this.reconnectAttempts++
+      setTimeout(() => this.connect(), ceiling / 2 + Math.random() * (ceiling / 2))
+    }
+
+    socket.onopen = () => {
+      this.socket = socket
+      this.reconnectAttempts = 0
+      // A new connection starts with nothing watched
+      if (this.watchDepth > 0) socket.send(encodeWatch(this.watchDepth))
+    }
+  }
+}
+
+const PLAYER_ID_KEY = "guesswise:playerId"
+
+// Kept across reloads so stats follow the player. It also pins the socket:
+// a player's games share their shard, so one connection serves all of them.
+export function getPlayerId() {
+  if (typeof window === "undefined") return createId()
+
+  let playerId = window.localStorage.getItem(PLAYER_ID_KEY)
+  if (!isId(playerId)) {
+    playerId = createId()
+    window.localStorage.setItem(PLAYER_ID_KEY, playerId)
+  }
+  return playerId
+}
+
+let connection: GameConnection | undefined
+
+export function getGameConnection() {
+  if (!connection) {
+    const protocol = window.location.protocol === "https:" ? "wss:" : "ws:"
+    const player = encodeURIComponent(getPlayerId())
+    connection = new GameConnection(`${protocol}//${window.location.host}/api/game/socket?player=${player}`)
+  }
+  return connection
+}
+// Fixed-width IDs: 2 shard characters followed by 20 random ones, all from a
+// 32-letter alphabet without look-alikes (no i, l, o, u). 100 random bits
+// keep collisions out of reach, and the shard prefix lets a router place a
+// game or player without a lookup.
+
+const ALPHABET = "0123456789abcdefghjkmnpqrstvwxyz"
+const RANDOM_CHARS = 20
+export const ID_LENGTH = 2 + RANDOM_CHARS
+export const SHARD_COUNT = 32 * 32
+
+const ID_PATTERN = /^[0-9a-hjkmnp-tv-z]{22}$/
+
+// getRandomValues is cheap per call but not free; draw in bulk
+const pool = new Uint8Array(4096)
+let poolOffset = pool.length
+
+function reserveRandomBytes(count: number) {
+  if (poolOffset + count > pool.length) {
+    crypto.getRandomValues(pool)
+    poolOffset = 0
+  }
+  const start = poolOffset
+  poolOffset += count
+  return start
+}
+
+export function createId(shard?: number) {
+  const start = reserveRandomBytes(RANDOM_CHARS + 2)
+  if (shard === undefined) {
+    shard = ((pool[start + RANDOM_CHARS] << 8) | pool[start + RANDOM_CHARS + 1]) % SHARD_COUNT
+  }
+
+  let id = ALPHABET[(shard >> 5) & 31] + ALPHABET[shard & 31]
+  for (let i = 0; i < RANDOM_CHARS; i++) {
+    // 256 is a multiple of 32, so masking keeps every letter equally likely
+    id += ALPHABET[pool[start + i] & 31]
+  }
+  return id
+}
+
+export function isId(value: unknown): value is string {
+  return typeof value === "string" && ID_PATTERN.test(value)
+}
+
+// Shard encoded in an ID, or undefined if it isn't one of ours
+export function shardOf(id: unknown) {
+  if (!isId(id)) return undefined
+  return ALPHABET.indexOf(id[0]) * 32 + ALPHABET.indexOf(id[1])
+}
+import { createServer } from "node:http"
+import cluster from "node:cluster"
+import next from "next"
+import { attachGameSocket } from "@/lib/game-socket"
+import { subscribeLeaderboardReplication } from "@/lib/leaderboard-replication"
+import { getRateLimiter, REMOTE_ADDRESS_HEADER } from "@/lib/rate-limit"
+
+// Next.js plus the game socket on one port. Used directly by server.ts and
+// once per worker by cluster.ts.
+export async function startAppServer(port: number, host?: string) {
+  // Refuse to start on a bad RATE_LIMITS rather than fail every request
+  getRateLimiter()
+
+  const app = next({ dev: process.env.NODE_ENV !== "production" })
+  const handle = app.getRequestHandler()
+  await app.prepare()
+
+  const server = createServer((req, res) => {
+    req.headers[REMOTE_ADDRESS_HEADER] = req.socket.remoteAddress
+    return handle(req, res)
+  })
+  attachGameSocket(server)
+  if (cluster.isWorker) {
+    subscribeLeaderboardReplication()
+  }
+
+  await new Promise<void>((resolve) => server.listen(port, host, resolve))
+  return server
+}
+import type { GameAction } from "@/lib/game-actions"
+import { SHARD_COUNT, shardOf } from "@/lib/ids"
+
+// Clients put an operation's routing key here so the cluster primary can
+// pick a worker without reading the body
+export const ROUTING_KEY_HEADER = "x-game-key"
+
+// Guesses follow the game; everything else follows the player, and games are
+// minted in their player's shard, so a player's games and stats always end
+// up on the same worker.
+export function routingKey(op: Partial<GameAction> | null | undefined) {
+  return op?.action === "guess" ? op.gameId : op?.playerId
+}
+
+// Which worker owns an operation
+export function workerFor(op: Partial<GameAction> | null | undefined, workerCount: number) {
+  return workerForKey(routingKey(op), workerCount)
+}
+
+export function workerForKey(key: unknown, workerCount: number) {
+  const shard = shardOf(key)
+  return shard === undefined ? undefined : shard % workerCount
+}
+
+// A random shard owned by this cluster worker, or undefined outside a
+// cluster. For IDs minted without a player to follow.
+export function localShard() {
+  if (!process.env.WORKER_INDEX || !process.env.WORKER_COUNT) return undefined
+  const index = Number(process.env.WORKER_INDEX)
+  const count = Number(process.env.WORKER_COUNT)
+
+  const owned = Math.ceil((SHARD_COUNT - index) / count)
+  return index + count * Math.floor(Math.random() * owned)
+}
+import cluster from "node:cluster"
+import { getLeaderboardIndex, type LeaderboardEntry } from "@/lib/leaderboard-index"
+
+// Each cluster worker owns a slice of the players but serves the whole
+// leaderboard, so workers forward their upserts through the primary and
+// apply everyone else's. Updates are shipped in small batches.
+
+const FLUSH_MS = 100
+
+interface LeaderboardMessage {
+  type: "leaderboard"
+  entries: LeaderboardEntry[]
+}
+
+let outgoing: LeaderboardEntry[] = []
+let flushTimer: ReturnType<typeof setTimeout> | undefined
+
+export function publishLeaderboardEntry(entry: LeaderboardEntry) {
+  if (!cluster.isWorker) return
+
+  outgoing.push(entry)
+  if (!flushTimer) {
+    flushTimer = setTimeout(() => {
+      const message: LeaderboardMessage = { type: "leaderboard", entries: outgoing }
+      outgoing = []
+      flushTimer = undefined
+      process.send?.(message)
+    }, FLUSH_MS)
+  }
+}
+
+// Worker side: apply entries published by the other workers
+export function subscribeLeaderboardReplication() {
+  process.on("message", async (message: LeaderboardMessage) => {
+    if (message?.type !== "leaderboard") return
+
+    const index = await getLeaderboardIndex()
+    for (const entry of message.entries) {
+      index.upsert(entry)
+    }
+  })
+}
+
+// Primary side: fan each batch out to every worker except its sender
+export function relayLeaderboardUpdates() {
+  cluster.on("message", (sender, message: LeaderboardMessage) => {
+    if (message?.type !== "leaderboard") return
+
+    for (const worker of Object.values(cluster.workers || {})) {
+      if (worker && worker !== sender && worker.isConnected()) {
+        worker.send(message)
+      }
+    }
+  })
+}
+import cluster from "node:cluster"
+import { Agent, createServer, request as httpRequest, type IncomingMessage, type ServerResponse } from "node:http"
+import { connect } from "node:net"
+import { availableParallelism } from "node:os"
+import { startAppServer } from "@/lib/app-server"
+import { relayLeaderboardUpdates } from "@/lib/leaderboard-replication"
+import { ROUTING_KEY_HEADER, workerFor, workerForKey } from "@/lib/shard-router"
+import type { GameAction, GameActionResult } from "@/lib/game-actions"
+
+// Multi-core entry point. The primary forks one worker per core, each running
+// the full app on its own loopback port and owning the shards where
+// shard % workers === its index. The primary only routes: /api/game
+// requests and game sockets go to the owning worker, everything else is
+// spread round-robin. On SIGTERM/SIGINT it passes the signal on and waits
+// for the workers, which flush their state on the way down.
+
+const port = Number(process.env.PORT) || 3000
+const workerCount = Number(process.env.GAME_WORKERS) || availableParallelism()
+const MAX_BODY_BYTES = 1024 * 1024
+const SHUTDOWN_TIMEOUT_MS = 30 * 1000
+
+// Routing keys in a single-operation body. A guess carries its gameId; the
+// other actions only carry a playerId.
+const GAME_ID_FIELD = /"gameId"\s*:\s*"([^"]*)"/
+const PLAYER_ID_FIELD = /"playerId"\s*:\s*"([^"]*)"/
+
+const workerPort = (index: number) => port + 1 + index
+
+if (cluster.isPrimary) {
+  startPrimary()
+} else {
+  // Workers are only reachable through the primary
+  startAppServer(Number(process.env.WORKER_PORT), "127.0.0.1")
+}
+
+function startPrimary() {
+  let stopping = false
+  const forkWorker = (index: number) => {
+    const worker = cluster.fork({
+      WORKER_INDEX: String(index),
+      WORKER_COUNT: String(workerCount),
+      WORKER_PORT: String(workerPort(index)),
+    })
+    // Restart a crashed worker on the same port so its shards come back
+    worker.on("exit", (code, signal) => {
+      if (!stopping && signal !== "SIGTERM" && signal !== "SIGINT") forkWorker(index)
+    })
+  }
+  for (let i = 0; i < workerCount; i++) {
+    forkWorker(i)
+  }
+  relayLeaderboardUpdates()
+
+  const agent = new Agent({ keepAlive: true, maxSockets: 256 })
+  let nextWorker = 0
+  const roundRobin = () => (nextWorker = (nextWorker + 1) % workerCount)
+
+  const forward = (index: number, req: IncomingMessage, res: ServerResponse, body?: Buffer) => {
+    const headers = { ...req.headers, "x-forwarded-for": forwardedFor(req) }
+    const upstream = httpRequest(
+      { host: "127.0.0.1", port: workerPort(index), method: req.method, path: req.url, headers, agent },
+      (upstreamRes) => {
+        res.writeHead(upstreamRes.statusCode || 502, upstreamRes.headers)
+        upstreamRes.pipe(res)
+      },
+    )
+    upstream.on("error", () => {
+      if (!res.headersSent) res.writeHead(502)
+      res.end()
+    })
+
+    if (body) {
+      upstream.end(body)
+    } else {
+      req.pipe(upstream)
+    }
+  }
+
+  // `client` is the X-Forwarded-For to send, so per-IP limits still apply
+  const postBatch = (index: number, ops: GameAction[], client: string) =>
+    new Promise<GameActionResult[]>((resolve, reject) => {
+      const body = JSON.stringify({ batch: ops })
+      const upstream = httpRequest(
+        {
+          host: "127.0.0.1",
+          port: workerPort(index),
+          method: "POST",
+          path: "/api/game",
+          headers: {
+            "Content-Type": "application/json",
+            "Content-Length": Buffer.byteLength(body),
+            "X-Forwarded-For": client,
+          },
+          agent,
+        },
+        async (upstreamRes) => {
+          try {
+            const data = JSON.parse((await readBody(upstreamRes, Infinity)).toString())
+            resolve(data.results || ops.map(() => ({ success: false, message: data.message || "Server error" })))
+          } catch (error) {
+            reject(error)
+          }
+        },
+      )
+      upstream.on("error", reject)
+      upstream.end(body)
+    })
+
+  // Split a batch by owning worker, run the pieces in parallel and put the
+  // results back in request order. Order within each worker is preserved.
+  const routeBatch = async (ops: GameAction[], req: IncomingMessage, res: ServerResponse) => {
+    const client = forwardedFor(req)
+    const groups = new Map<number, number[]>()
+    ops.forEach((op, i) => {
+      const index = workerFor(op, workerCount) ?? 0
+      const group = groups.get(index) || []
+      group.push(i)
+      groups.set(index, group)
+    })
+
+    const results = new Array<GameActionResult>(ops.length)
+    await Promise.all(
+      [...groups].map(async ([index, positions]) => {
+        try {
+          const groupResults = await postBatch(index, positions.map((i) => ops[i]), client)
+          positions.forEach((position, i) => (results[position] = groupResults[i]))
+        } catch (error) {
+          positions.forEach((position) => (results[position] = { success: false, message: "Server error" }))
+        }
+      }),
+    )
+
+    res.writeHead(200, { "Content-Type": "application/json" })
+    res.end(JSON.stringify({ success: true, results }))
+  }
+
+  const server = createServer(async (req, res) => {
+    const { pathname, searchParams } = new URL(req.url || "/", "http://localhost")
+    if (req.method !== "POST" || pathname !== "/api/game") {
+      // ?worker=<index> reaches one worker, for per-worker metrics
+      const pinned = Number(searchParams.get("worker") ?? NaN)
+      forward(Number.isInteger(pinned) && pinned >= 0 && pinned < workerCount ? pinned : roundRobin(), req, res)
+      return
+    }
+
+    // Our own clients name the routing key up front, so the body streams
+    // straight through
+    const key = req.headers[ROUTING_KEY_HEADER]
+    if (typeof key === "string" && key) {
+      forward(workerForKey(key, workerCount) ?? roundRobin(), req, res)
+      return
+    }
+
+    let body: Buffer
+    try {
+      body = await readBody(req, MAX_BODY_BYTES)
+    } catch (error) {
+      res.writeHead(413).end()
+      return
+    }
+
+    const text = body.toString()
+    if (/^\s*\{\s*"batch"/.test(text)) {
+      // Batches have to be split per worker, which needs the real parse
+      let parsed
+      try {
+        parsed = JSON.parse(text)
+      } catch (error) {
+        // Let a worker produce the usual error response
+        forward(roundRobin(), req, res, body)
+        return
+      }
+      if (Array.isArray(parsed?.batch)) {
+        await routeBatch(parsed.batch, req, res)
+        return
+      }
+    }
+
+    // Otherwise a scan for the key is enough; the worker still validates
+    const found = (GAME_ID_FIELD.exec(text) ?? PLAYER_ID_FIELD.exec(text))?.[1]
+    forward(workerForKey(found, workerCount) ?? roundRobin(), req, res, body)
+  })
+
+  // Game sockets are pinned to the worker that owns the player's shard
+  server.on("upgrade", (req, socket, head) => {
+    const player = new URL(req.url || "/", "http://localhost").searchParams.get("player")
+    const index = workerForKey(player, workerCount) ?? roundRobin()
+
+    const upstream = connect(workerPort(index), "127.0.0.1", () => {
+      let preamble = `${req.method} ${req.url} HTTP/${req.httpVersion}\r\n`
+      for (let i = 0; i < req.rawHeaders.length; i += 2) {
+        if (req.rawHeaders[i].toLowerCase() === "x-forwarded-for") continue
+        preamble += `${req.rawHeaders[i]}: ${req.rawHeaders[i + 1]}\r\n`
+      }
+      preamble += `X-Forwarded-For: ${forwardedFor(req)}\r\n`
+      upstream.write(preamble + "\r\n")
+      upstream.write(head)
+      socket.pipe(upstream).pipe(socket)
+    })
+    upstream.on("error", () => socket.destroy())
+    socket.on("error", () => upstream.destroy())
+  })
+
+  server.listen(port, () => {
+    console.log(`> GuessWise routing ${workerCount} workers on http://localhost:${port}`)
+  })
+
+  // A worker loses its IPC channel, and exits on the spot, when the primary
+  // dies, so stay up until every worker has run its shutdown tasks
+  for (const signal of ["SIGTERM", "SIGINT"] as const) {
+    process.once(signal, async () => {
+      stopping = true
+      server.close()
+
+      const running = Object.values(cluster.workers || {}).filter((worker) => worker && !worker.isDead())
+      let timer: ReturnType<typeof setTimeout> | undefined
+      await Promise.race([
+        Promise.all(
+          running.map(
+            (worker) =>
+              new Promise((resolve) => {
+                worker!.once("exit", resolve)
+                worker!.process.kill(signal)
+              }),
+          ),
+        ),
+        new Promise((resolve) => (timer = setTimeout(resolve, SHUTDOWN_TIMEOUT_MS))),
+      ])
+      clearTimeout(timer)
+      process.kill(process.pid, signal)
+    })
+  }
+}
+
+// The client's address appended to any X-Forwarded-For it arrived with;
+// workers only ever see the primary as their peer
+function forwardedFor(req: IncomingMessage) {
+  return [req.headers["x-forwarded-for"], req.socket.remoteAddress].filter(Boolean).join(", ")
+}
+
+function readBody(stream: IncomingMessage, limit: number) {
+  return new Promise<Buffer>((resolve, reject) => {
+    const chunks: Buffer[] = []
+    let size = 0
+    stream.on("data", (chunk: Buffer) => {
+      size += chunk.length
+      if (size > limit) {
+        reject(new Error("Body too large"))
+        stream.destroy()
+        return
+      }
+      chunks.push(chunk)
+    })
+    stream.on("end", () => resolve(Buffer.concat(chunks)))
+    stream.on("error", reject)
+  })
+}
+import { execSync } from "node:child_process"
+import { mkdirSync, writeFileSync } from "node:fs"
+import { join } from "node:path"
+import { monitorEventLoopDelay, performance } from "node:perf_hooks"
+import { parseArgs } from "node:util"
+import { startAppServer } from "@/lib/app-server"
+import type { GameAction } from "@/lib/game-actions"
+import { createId } from "@/lib/ids"
+import { ROUTING_KEY_HEADER, routingKey } from "@/lib/shard-router"
+
+// Load generator for the game API.
+//
+//   tsx scripts/bench-game-api.ts [--duration 30] [--warmup 5] [--concurrency 50] [--url http://host:port]
+//
+// Without --url the app is started in this process, so heap growth and
+// event-loop lag describe the server (plus the small cost of the generator).
+// That needs a production build: `next build`, then run with
+// NODE_ENV=production, or the numbers would be the dev server's.
+// Each virtual player starts a game, plays it out with a binary search, and
+// now and then checks their stats or the leaderboard. Results are written to
+// bench-results/<timestamp>-<commit>.json for comparison across commits.
+
+const { values: args } = parseArgs({
+  options: {
+    url: { type: "string" },
+    port: { type: "string", default: "3100" },
+    duration: { type: "string", default: "30" },
+    warmup: { type: "string", default: "5" },
+    concurrency: { type: "string", default: "50" },
+    out: { type: "string", default: "bench-results" },
+  },
+})
+
+const STATS_PROBABILITY = 0.1
+const LEADERBOARD_PROBABILITY = 0.05
+
+type Op = "start" | "guess" | "stats" | "leaderboard"
+
+const samples: Record<Op, number[]> = { start: [], guess: [], stats: [], leaderboard: [] }
+const errors: Record<Op, number> = { start: 0, guess: 0, stats: 0, leaderboard: 0 }
+let recording = false
+
+// Only a 2xx with { success: true } counts as a sample; a 429 or a failed
+// action is an error, or a server shedding load would look fast
+async function timed(op: Op, request: () => Promise<Response>) {
+  const started = performance.now()
+  try {
+    const response = await request()
+    const data = await response.json()
+    if (!response.ok || !data?.success) {
+      if (recording) errors[op]++
+      return undefined
+    }
+    if (recording) samples[op].push(performance.now() - started)
+    return data
+  } catch (error) {
+    if (recording) errors[op]++
+    return undefined
+  }
+}
+
+function postGame(baseUrl: string, body: GameAction) {
+  return fetch(`${baseUrl}/api/game`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", [ROUTING_KEY_HEADER]: routingKey(body) ?? "" },
+    body: JSON.stringify(body),
+  })
+}
+
+async function player(baseUrl: string, deadline: number) {
+  // Real IDs, so a clustered target routes them like any other player
+  const playerId = createId()
+
+  while (Date.now() < deadline) {
+    const started = await timed("start", () => postGame(baseUrl, { action: "start", playerId }))
+    if (!started) {
+      // Don't spin against a server that is refusing starts
+      await new Promise((resolve) => setTimeout(resolve, 100))
+      continue
+    }
+
+    let low: number = started.minRange
+    let high: number = started.maxRange
+    let playing = true
+    while (playing && Date.now() < deadline) {
+      const guess = Math.floor((low + high) / 2)
+      const data = await timed("guess", () =>
+        postGame(baseUrl, { action: "guess", gameId: started.gameId, guess, playerId }),
+      )
+      if (!data) break
+
+      playing = !data.gameEnded
+      if (data.message.includes("Too low")) low = guess + 1
+      else high = guess - 1
+    }
+
+    if (Math.random() < STATS_PROBABILITY) {
+      await timed("stats", () => postGame(baseUrl, { action: "stats", playerId }))
+    }
+    if (Math.random() < LEADERBOARD_PROBABILITY) {
+      await timed("leaderboard", () => fetch(`${baseUrl}/api/leaderboard?limit=10`))
+    }
+  }
+}
+
+function summarize(values: number[], errorCount: number, seconds: number) {
+  const sorted = Float64Array.from(values).sort()
+  const at = (q: number) => (sorted.length ? sorted[Math.min(sorted.length - 1, Math.floor(q * sorted.length))] : 0)
+  const mean = sorted.length ? sorted.reduce((sum, value) => sum + value, 0) / sorted.length : 0
+
+  return {
+    count: sorted.length,
+    errors: errorCount,
+    throughput: round(sorted.length / seconds),
+    meanMs: round(mean),
+    p50Ms: round(at(0.5)),
+    p95Ms: round(at(0.95)),
+    p99Ms: round(at(0.99)),
+    maxMs: round(sorted.length ? sorted[sorted.length - 1] : 0),
+  }
+}
+
+function round(value: number) {
+  return Math.round(value * 1000) / 1000
+}
+
+function currentCommit() {
+  try {
+    return execSync("git rev-parse --short HEAD", { stdio: ["ignore", "pipe", "ignore"] }).toString().trim()
+  } catch {
+    return "unknown"
+  }
+}
+
+async function main() {
+  const duration = Number(args.duration) * 1000
+  const warmup = Number(args.warmup) * 1000
+  const concurrency = Number(args.concurrency)
+  const inProcess = !args.url
+
+  let baseUrl = args.url!
+  if (inProcess) {
+    if (process.env.NODE_ENV !== "production") {
+      console.error("In-process benchmarks need NODE_ENV=production (after `next build`)")
+      process.exit(1)
+    }
+    // Every virtual player shares one address; don't measure the limiter
+    process.env.RATE_LIMITS ??= "off"
+    await startAppServer(Number(args.port), "127.0.0.1")
+    baseUrl = `http://127.0.0.1:${args.port}`
+  }
+
+  const deadline = Date.now() + warmup + duration
+  const players = Array.from({ length: concurrency }, () => player(baseUrl, deadline))
+
+  await new Promise((resolve) => setTimeout(resolve, warmup))
+  global.gc?.()
+  const loopDelay = monitorEventLoopDelay({ resolution: 10 })
+  loopDelay.enable()
+  const heapStart = process.memoryUsage().heapUsed
+  let heapPeak = heapStart
+  const heapSampler = setInterval(() => {
+    heapPeak = Math.max(heapPeak, process.memoryUsage().heapUsed)
+  }, 250)
+  const measuredFrom = performance.now()
+  recording = true
+
+  await Promise.all(players)
+
+  recording = false
+  const seconds = (performance.now() - measuredFrom) / 1000
+  clearInterval(heapSampler)
+  loopDelay.disable()
+  const heapEnd = process.memoryUsage().heapUsed
+
+  const ops = Object.fromEntries(
+    (Object.keys(samples) as Op[]).map((op) => [op, summarize(samples[op], errors[op], seconds)]),
+  )
+  const all = summarize(Object.values(samples).flat(), Object.values(errors).reduce((sum, n) => sum + n, 0), seconds)
+
+  const commit = currentCommit()
+  const report = {
+    commit,
+    timestamp: new Date().toISOString(),
+    config: { target: inProcess ? "in-process" : baseUrl, durationSeconds: duration / 1000, concurrency },
+    total: all,
+    ops,
+    // Only meaningful when the server runs in this process
+    heap: inProcess
+      ? { startBytes: heapStart, endBytes: heapEnd, peakBytes: heapPeak, growthBytes: heapEnd - heapStart }
+      : null,
+    eventLoop: inProcess
+      ? {
+          meanMs: round(loopDelay.mean / 1e6),
+          p50Ms: round(loopDelay.percentile(50) / 1e6),
+          p99Ms: round(loopDelay.percentile(99) / 1e6),
+          maxMs: round(loopDelay.max / 1e6),
+        }
+      : null,
+  }
+
+  mkdirSync(args.out!, { recursive: true })
+  const file = join(args.out!, `${report.timestamp.replace(/[:.]/g, "-")}-${commit}.json`)
+  writeFileSync(file, JSON.stringify(report, null, 2))
+
+  console.table({ ...ops, total: all })
+  console.log(`Results written to ${file}`)
+  process.exit(0)
+}
+
+main()
+// Minimal Prometheus client: counters, gauges and histograms with labels,
+// rendered in the text exposition format. Hot-path updates are a map lookup
+// and an increment; gauges are computed only when scraped.
+
+type Labels = Record<string, string>
+
+function labelKey(labels?: Labels) {
+  if (!labels) return ""
+  return Object.keys(labels)
+    .sort()
+    .map((name) => `${name}="${labels[name].replace(/\\/g, "\\\\").replace(/"/g, '\\"').replace(/\n/g, "\\n")}"`)
+    .join(",")
+}
+
+// Each cluster worker keeps its own counters, so every series says which
+// worker it came from. "0" outside a cluster.
+export const WORKER_ID = process.env.WORKER_INDEX ?? "0"
+const WORKER_LABEL = `worker="${WORKER_ID}"`
+
+function withWorker(key: string) {
+  return key ? `${WORKER_LABEL},${key}` : WORKER_LABEL
+}
+
+function series(name: string, key: string, value: number) {
+  return `${name}{${withWorker(key)}} ${value}`
+}
+
+interface Metric {
+  render(): Promise<string[]> | string[]
+}
+
+const registry: Metric[] = []
+
+export class Counter implements Metric {
+  private readonly values = new Map<string, number>()
+
+  constructor(
+    private readonly name: string,
+    private readonly help: string,
+  ) {
+    registry.push(this)
+  }
+
+  inc(labels?: Labels, value = 1) {
+    const key = labelKey(labels)
+    this.values.set(key, (this.values.get(key) || 0) + value)
+  }
+
+  render() {
+    const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} counter`]
+    for (const [key, value] of this.values) {
+      lines.push(series(this.name, key, value))
+    }
+    return lines
+  }
+}
+
+export class Gauge implements Metric {
+  constructor(
+    private readonly name: string,
+    private readonly help: string,
+    private readonly collect: () => Promise<[Labels | undefined, number][]> | [Labels | undefined, number][],
+    private readonly type: "gauge" | "counter" = "gauge",
+  ) {
+    registry.push(this)
+  }
+
+  async render() {
+    const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} ${this.type}`]
+    for (const [labels, value] of await this.collect()) {
+      lines.push(series(this.name, labelKey(labels), value))
+    }
+    return lines
+  }
+}
+
+export class Histogram implements Metric {
+  private readonly values = new Map<string, { buckets: Float64Array; sum: number; count: number }>()
+
+  constructor(
+    private readonly name: string,
+    private readonly help: string,
+    private readonly bounds: number[],
+  ) {
+    registry.push(this)
+  }
+
+  observe(value: number, labels?: Labels) {
+    const key = labelKey(labels)
+    let entry = this.values.get(key)
+    if (!entry) {
+      entry = { buckets: new Float64Array(this.bounds.length), sum: 0, count: 0 }
+      this.values.set(key, entry)
+    }
+
+    for (let i = 0; i < this.bounds.length; i++) {
+      if (value <= this.bounds[i]) {
+        entry.buckets[i]++
+        break
+      }
+    }
+    entry.sum += value
+    entry.count++
+  }
+
+  render() {
+    const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} histogram`]
+    for (const [key, entry] of this.values) {
+      const prefix = `${withWorker(key)},`
+      let cumulative = 0
+      this.bounds.forEach((bound, i) => {
+        cumulative += entry.buckets[i]
+        lines.push(`${this.name}_bucket{${prefix}le="${bound}"} ${cumulative}`)
+      })
+      lines.push(`${this.name}_bucket{${prefix}le="+Inf"} ${entry.count}`)
+      lines.push(series(`${this.name}_sum`, key, entry.sum))
+      lines.push(series(`${this.name}_count`, key, entry.count))
+    }
+    return lines
+  }
+}
+
+export async function renderMetrics() {
+  const sections = await Promise.all(registry.map((metric) => metric.render()))
+  return sections.flat().join("\n") + "\n"
+}
+import { monitorEventLoopDelay } from "node:perf_hooks"
+import { Counter, Gauge, Histogram } from "@/lib/metrics"
+import { getGameStore, MemoryGameStore } from "@/lib/game-store"
+import { getStatsWriteBuffer } from "@/lib/stats-write-buffer"
+import { getLeaderboardIndex } from "@/lib/leaderboard-index"
+
+// Metrics for the game service, exposed by /api/metrics
+
+export const actionTotal = new Counter("guesswise_game_actions_total", "Game actions handled, by action and outcome")
+
+export const actionDuration = new Histogram(
+  "guesswise_game_action_duration_seconds",
+  "Time spent handling a game action",
+  [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1],
+)
+
+export const requestErrors = new Counter("guesswise_request_errors_total", "Requests that failed with a server error")
+
+export const rejectedRequests = new Counter(
+  "guesswise_rejected_requests_total",
+  "Requests or operations rejected by validation, by error code",
+)
+
+async function memoryStore() {
+  const store = await getGameStore()
+  return store instanceof MemoryGameStore ? store : undefined
+}
+
+new Gauge("guesswise_games_live", "Game sessions currently held in memory", async () => {
+  const store = await memoryStore()
+  return store ? [[undefined, store.games.size]] : []
+})
+
+new Gauge("guesswise_players_live", "Player stats entries currently held in memory", async () => {
+  const store = await memoryStore()
+  return store ? [[undefined, store.playerStats.size]] : []
+})
+
+new Gauge(
+  "guesswise_game_sessions_removed_total",
+  "Game sessions dropped from memory, by reason",
+  async () => {
+    const store = await memoryStore()
+    if (!store) return []
+    const { evicted, expired } = store.games.counters()
+    return [
+      [{ reason: "evicted" }, evicted],
+      [{ reason: "expired" }, expired],
+    ]
+  },
+  "counter",
+)
+
+new Gauge("guesswise_stats_pending_writes", "Player stats waiting for the next batch flush", () => [
+  [undefined, getStatsWriteBuffer().pendingCount],
+])
+
+new Gauge("guesswise_leaderboard_players", "Players in the leaderboard index", async () => [
+  [undefined, (await getLeaderboardIndex()).size],
+])
+
+// Delay since the previous scrape, so each sample reflects the recent past
+const loopDelay = monitorEventLoopDelay({ resolution: 10 })
+loopDelay.enable()
+
+new Gauge("guesswise_event_loop_delay_seconds", "Event loop delay since the last scrape", () => {
+  const result: [Record<string, string>, number][] = [
+    [{ quantile: "0.5" }, loopDelay.percentile(50) / 1e9],
+    [{ quantile: "0.99" }, loopDelay.percentile(99) / 1e9],
+    [{ quantile: "1" }, loopDelay.max / 1e9],
+  ]
+  loopDelay.reset()
+  return result
+})
+import { timingSafeEqual } from "node:crypto"
+import { type NextRequest, NextResponse } from "next/server"
+
+// Operational endpoints (/api/metrics, /api/analytics) want
+// `Authorization: Bearer $METRICS_TOKEN` and stay closed until it is set.
+export function rejectUnauthorized(request: NextRequest) {
+  const token = process.env.METRICS_TOKEN
+  if (!token) {
+    return new NextResponse("Set METRICS_TOKEN to enable this endpoint", { status: 403 })
+  }
+
+  const given = Buffer.from(request.headers.get("authorization") || "")
+  const expected = Buffer.from(`Bearer ${token}`)
+  if (given.length !== expected.length || !timingSafeEqual(given, expected)) {
+    return new NextResponse("Unauthorized", { status: 401 })
+  }
+  return undefined
+}
+import { type NextRequest, NextResponse } from "next/server"
+import { renderMetrics } from "@/lib/metrics"
+import { rejectUnauthorized } from "@/lib/operator-auth"
+import "@/lib/game-metrics"
+
+// Prometheus scrape endpoint; needs METRICS_TOKEN. Under cluster.ts every
+// worker has its own numbers: scrape each one with ?worker=<index>.
+export async function GET(request: NextRequest) {
+  const rejected = rejectUnauthorized(request)
+  if (rejected) return rejected
+
+  return new NextResponse(await renderMetrics(), {
+    headers: { "Content-Type": "text/plain; version=0.0.4" },
+  })
+}
+import type { NextRequest } from "next/server"
+import type { ValidGameAction } from "@/lib/game-actions"
+import { isId } from "@/lib/ids"
+import { DEFAULT_DIFFICULTY, isDifficulty, RULES } from "@/lib/game-rules"
+
+// Request parsing for /api/game. Bodies are size-capped while streaming in
+// and shape-checked before JSON.parse runs, and each operation goes through
+// a validator compiled once from the schema table below.
+
+export const MAX_BODY_BYTES = 1024 * 1024
+
+export type RequestErrorCode =
+  | "unsupported_media_type"
+  | "body_too_large"
+  | "malformed_body"
+  | "batch_too_large"
+  | "invalid_action"
+  | "invalid_game_id"
+  | "invalid_player_id"
+  | "invalid_guess"
+  | "invalid_include_stats"
+  | "invalid_difficulty"
+  | "rate_limited"
+
+export interface RequestError {
+  success: false
+  error: RequestErrorCode
+  message: string
+}
+
+export type Checked<T> = { ok: true; value: T } | { ok: false; status: number; error: RequestError }
+
+function reject(status: number, error: RequestErrorCode, message: string): Checked<never> {
+  return { ok: false, status, error: { success: false, error, message } }
+}
+
+export async function readJsonBody(request: NextRequest): Promise<Checked<unknown>> {
+  if (!request.headers.get("content-type")?.includes("application/json")) {
+    return reject(415, "unsupported_media_type", "Expected an application/json body")
+  }
+  if (Number(request.headers.get("content-length")) > MAX_BODY_BYTES) {
+    return reject(413, "body_too_large", "Request body is too large")
+  }
+
+  const text = await readLimited(request, MAX_BODY_BYTES)
+  if (text === null) {
+    return reject(413, "body_too_large", "Request body is too large")
+  }
+  // Anything that isn't an object can be turned away without parsing it
+  if (!startsWithBrace(text)) {
+    return reject(400, "malformed_body", "Body must be a JSON object")
+  }
+
+  try {
+    return { ok: true, value: JSON.parse(text) }
+  } catch {
+    return reject(400, "malformed_body", "Body is not valid JSON")
+  }
+}
+
+// Reads the body as text, or returns null as soon as it passes `limit` bytes
+async function readLimited(request: NextRequest, limit: number) {
+  if (!request.body) return ""
+
+  const reader = request.body.getReader()
+  const decoder = new TextDecoder()
+  let size = 0
+  let text = ""
+  for (;;) {
+    const { done, value } = await reader.read()
+    if (done) break
+
+    size += value.byteLength
+    if (size > limit) {
+      await reader.cancel()
+      return null
+    }
+    text += decoder.decode(value, { stream: true })
+  }
+  return text + decoder.decode()
+}
+
+function startsWithBrace(text: string) {
+  for (let i = 0; i < text.length; i++) {
+    const code = text.charCodeAt(i)
+    // space, tab, newline, carriage return
+    if (code === 32 || code === 9 || code === 10 || code === 13) continue
+    return code === 123
+  }
+  return false
+}
+
+type FieldType = "id" | "guess" | "flag" | "difficulty"
+
+const SCHEMAS: Record<ValidGameAction["action"], Record<string, FieldType>> = {
+  start: { playerId: "id", includeStats: "flag", difficulty: "difficulty" },
+  guess: { gameId: "id", guess: "guess", playerId: "id", includeStats: "flag" },
+  stats: { playerId: "id" },
+}
+
+const INVALID = Symbol("invalid")
+const INTEGER_PATTERN = /^\s*-?\d{1,15}\s*$/
+
+// Each coercion runs exactly once per field; the result is what the game
+// logic sees, so `guess` is never parsed again downstream
+const COERCIONS: Record<FieldType, (value: unknown) => unknown> = {
+  id: (value) => (isId(value) ? value : INVALID),
+  guess: (value) => {
+    if (typeof value === "number") return Number.isSafeInteger(value) ? value : INVALID
+    if (typeof value === "string" && INTEGER_PATTERN.test(value)) return Number(value)
+    return INVALID
+  },
+  flag: (value) => (value === undefined ? false : typeof value === "boolean" ? value : INVALID),
+  difficulty: (value) => (value === undefined ? DEFAULT_DIFFICULTY : isDifficulty(value) ? value : INVALID),
+}
+
+const FIELD_ERRORS: Record<string, [RequestErrorCode, string]> = {
+  gameId: ["invalid_game_id", "Game not found"],
+  playerId: ["invalid_player_id", "A valid playerId is required"],
+  // The range depends on the game, so the handler reports out-of-range guesses
+  guess: ["invalid_guess", "Please enter a valid whole number"],
+  includeStats: ["invalid_include_stats", "includeStats must be a boolean"],
+  difficulty: ["invalid_difficulty", `difficulty must be one of ${Object.keys(RULES).join(", ")}`],
+}
+
+function compile(action: ValidGameAction["action"], schema: Record<string, FieldType>) {
+  const fields = Object.entries(schema).map(([name, type]) => [name, COERCIONS[type]] as const)
+
+  return (input: Record<string, unknown>): Checked<ValidGameAction> => {
+    const value: ValidGameAction = {
+      action,
+      gameId: "",
+      guess: 0,
+      playerId: "",
+      includeStats: false,
+      difficulty: DEFAULT_DIFFICULTY,
+    }
+    for (const [name, coerce] of fields) {
+      const coerced = coerce(input[name])
+      if (coerced === INVALID) {
+        const [error, message] = FIELD_ERRORS[name]
+        return reject(400, error, message)
+      }
+      ;(value as unknown as Record<string, unknown>)[name] = coerced
+    }
+    return { ok: true, value }
+  }
+}
+
+const VALIDATORS = new Map(
+  (Object.keys(SCHEMAS) as ValidGameAction["action"][]).map((action) => [action, compile(action, SCHEMAS[action])]),
+)
+
+export function validateGameAction(input: unknown): Checked<ValidGameAction> {
+  if (typeof input !== "object" || input === null || Array.isArray(input)) {
+    return reject(400, "malformed_body", "Each operation must be a JSON object")
+  }
+
+  const validator = VALIDATORS.get((input as { action?: unknown }).action as ValidGameAction["action"])
+  if (!validator) {
+    return reject(400, "invalid_action", "Invalid action")
+  }
+  return validator(input as Record<string, unknown>)
+}
+import type { ValidGameAction } from "@/lib/game-actions"
+import type { RequestError } from "@/lib/game-request"
+
+// Token-bucket rate limiting for game actions, keyed by player and by client
+// IP. Each bucket holds up to `burst` tokens and refills at `perSecond`.
+
+export interface RateLimitRule {
+  perSecond: number
+  burst: number
+}
+
+export interface RateLimitRules {
+  player: Record<ValidGameAction["action"], RateLimitRule>
+  ip: Record<ValidGameAction["action"], RateLimitRule>
+  // Per IP, in operations: a batch costs one token per operation it carries
+  // and skips the per-action rules above
+  batch: RateLimitRule
+}
+
+export interface TakeResult {
+  allowed: boolean
+  retryAfterMs: number
+}
+
+// Where bucket state lives. The in-memory store is per process; a shared
+// backend (Redis and the like) can implement the same call to enforce limits
+// across workers.
+export interface BucketStore {
+  take(key: string, rule: RateLimitRule, now: number, cost?: number): Promise<TakeResult> | TakeResult
+}
+
+// IPs get more headroom than players since many players can share one NAT.
+// Batches (bots, load generators, replay tooling) are charged as a unit
+// against their own, much larger bucket; its burst should stay at or above
+// the largest batch /api/game accepts (5000), or such batches never fit.
+export const DEFAULT_RULES: RateLimitRules = {
+  player: {
+    start: { perSecond: 1, burst: 5 },
+    guess: { perSecond: 10, burst: 20 },
+    stats: { perSecond: 5, burst: 10 },
+  },
+  ip: {
+    start: { perSecond: 20, burst: 50 },
+    guess: { perSecond: 200, burst: 400 },
+    stats: { perSecond: 100, burst: 200 },
+  },
+  batch: { perSecond: 2000, burst: 10000 },
+}
+
+export class MemoryBucketStore implements BucketStore {
+  private readonly buckets = new Map<string, { tokens: number; updatedAt: number }>()
+
+  // Past the cap the least recently used bucket is dropped, which at worst
+  // hands an idle client a fresh burst
+  constructor(private readonly maxBuckets: number) {}
+
+  take(key: string, rule: RateLimitRule, now: number, cost = 1): TakeResult {
+    let bucket = this.buckets.get(key)
+    if (bucket) {
+      this.buckets.delete(key)
+      bucket.tokens = Math.min(rule.burst, bucket.tokens + ((now - bucket.updatedAt) / 1000) * rule.perSecond)
+      bucket.updatedAt = now
+    } else {
+      bucket = { tokens: rule.burst, updatedAt: now }
+      if (this.buckets.size >= this.maxBuckets) {
+        this.buckets.delete(this.buckets.keys().next().value as string)
+      }
+    }
+    this.buckets.set(key, bucket)
+
+    if (bucket.tokens >= cost) {
+      bucket.tokens -= cost
+      return { allowed: true, retryAfterMs: 0 }
+    }
+    return { allowed: false, retryAfterMs: ((cost - bucket.tokens) / rule.perSecond) * 1000 }
+  }
+}
+
+export type RateLimitResult = { ok: true } | { ok: false; status: 429; retryAfterMs: number; error: RequestError }
+
+export class RateLimiter {
+  constructor(
+    private readonly store: BucketStore,
+    private readonly rules: RateLimitRules,
+  ) {}
+
+  async check(op: ValidGameAction, ip: string): Promise<RateLimitResult> {
+    const now = Date.now()
+    const byIp = await this.store.take(`ip:${ip}:${op.action}`, this.rules.ip[op.action], now)
+    const byPlayer = byIp.allowed
+      ? await this.store.take(`player:${op.playerId}:${op.action}`, this.rules.player[op.action], now)
+      : byIp
+    return byPlayer.allowed ? { ok: true } : rateLimited(byPlayer.retryAfterMs)
+  }
+
+  // A whole batch of `size` operations, checked once up front
+  async checkBatch(size: number, ip: string): Promise<RateLimitResult> {
+    const taken = await this.store.take(`batch:${ip}`, this.rules.batch, Date.now(), size)
+    return taken.allowed ? { ok: true } : rateLimited(taken.retryAfterMs)
+  }
+}
+
+function rateLimited(retryAfterMs: number): RateLimitResult {
+  return {
+    ok: false,
+    status: 429,
+    retryAfterMs,
+    error: { success: false, error: "rate_limited", message: "Too many requests. Please slow down." },
+  }
+}
+
+// Route handlers can't see the socket, so the app server (lib/app-server)
+// copies its peer address into this header, replacing any the client sent
+export const REMOTE_ADDRESS_HEADER = "x-guesswise-remote-address"
+
+let trustedProxies: Set<string> | undefined
+
+// TRUSTED_PROXIES is a comma-separated list of proxy addresses whose
+// X-Forwarded-For we believe. Loopback by default, which covers the cluster
+// primary and a proxy on the same host.
+function isTrustedProxy(address: string) {
+  trustedProxies ??= new Set(
+    (process.env.TRUSTED_PROXIES ?? "127.0.0.1,::1").split(",").map((entry) => normalizeAddress(entry.trim())),
+  )
+  return trustedProxies.has(normalizeAddress(address))
+}
+
+function normalizeAddress(address: string) {
+  return address.startsWith("::ffff:") ? address.slice(7) : address
+}
+
+// The socket address, unless that is a trusted proxy: then the rightmost
+// X-Forwarded-For hop that isn't one, since every hop left of the nearest
+// untrusted address could have been written by the client
+export function clientIp(headers: Headers | Record<string, string | string[] | undefined>, remoteAddress?: string) {
+  if (!remoteAddress) return "unknown"
+  if (!isTrustedProxy(remoteAddress)) return normalizeAddress(remoteAddress)
+
+  const get = (name: string) => {
+    const value = headers instanceof Headers ? headers.get(name) : headers[name]
+    return Array.isArray(value) ? value.join(",") : value
+  }
+  const hops = (get("x-forwarded-for") || "")
+    .split(",")
+    .map((hop) => hop.trim())
+    .filter(Boolean)
+  for (let i = hops.length - 1; i >= 0; i--) {
+    if (!isTrustedProxy(hops[i])) return normalizeAddress(hops[i])
+  }
+  return normalizeAddress(hops[0] || get("x-real-ip") || remoteAddress)
+}
+
+const RULE_FIELDS = ["perSecond", "burst"] as const
+
+// DEFAULT_RULES with RATE_LIMITS laid over it field by field. Anything that
+// isn't a known scope, action or field, or isn't a positive number, throws.
+export function parseRateLimits(json: string): RateLimitRules {
+  let overrides: unknown
+  try {
+    overrides = JSON.parse(json)
+  } catch (error) {
+    throw new Error(`RATE_LIMITS is not valid JSON: ${(error as Error).message}`)
+  }
+  const isObject = (value: unknown): value is Record<string, unknown> =>
+    typeof value === "object" && value !== null && !Array.isArray(value)
+  if (!isObject(overrides)) throw new Error("RATE_LIMITS must be a JSON object")
+
+  const overrideRule = (target: RateLimitRule, rule: unknown, path: string) => {
+    if (!isObject(rule)) throw new Error(`${path} must be an object`)
+    for (const [field, value] of Object.entries(rule)) {
+      if (!(RULE_FIELDS as readonly string[]).includes(field)) {
+        throw new Error(`${path}: unknown field "${field}" (expected perSecond or burst)`)
+      }
+      if (typeof value !== "number" || !Number.isFinite(value) || value <= 0) {
+        throw new Error(`${path}.${field} must be a positive number`)
+      }
+      target[field as (typeof RULE_FIELDS)[number]] = value
+    }
+  }
+
+  const rules: RateLimitRules = structuredClone(DEFAULT_RULES)
+  for (const [scope, actions] of Object.entries(overrides)) {
+    if (scope === "batch") {
+      overrideRule(rules.batch, actions, "RATE_LIMITS.batch")
+      continue
+    }
+    if (scope !== "player" && scope !== "ip") {
+      throw new Error(`RATE_LIMITS: unknown scope "${scope}" (expected "player", "ip" or "batch")`)
+    }
+    if (!isObject(actions)) throw new Error(`RATE_LIMITS.${scope} must be an object`)
+
+    for (const [action, rule] of Object.entries(actions)) {
+      if (!(action in rules[scope])) throw new Error(`RATE_LIMITS.${scope}: unknown action "${action}"`)
+      overrideRule(rules[scope][action as ValidGameAction["action"]], rule, `RATE_LIMITS.${scope}.${action}`)
+    }
+  }
+  return rules
+}
+
+let limiter: RateLimiter | undefined
+
+// Rules can be overridden with RATE_LIMITS, a JSON object shaped like
+// DEFAULT_RULES where any field may be left out (e.g.
+// {"player":{"start":{"burst":10}},"batch":{"perSecond":5000}}), or switched
+// off entirely with RATE_LIMITS=off. A bad value throws rather than limiting with garbage.
+export function getRateLimiter() {
+  if (!limiter) {
+    if (process.env.RATE_LIMITS === "off") {
+      limiter = new RateLimiter({ take: () => ({ allowed: true, retryAfterMs: 0 }) }, DEFAULT_RULES)
+      return limiter
+    }
+
+    const rules = process.env.RATE_LIMITS ? parseRateLimits(process.env.RATE_LIMITS) : DEFAULT_RULES
+    limiter = new RateLimiter(new MemoryBucketStore(100_000), rules)
+  }
+  return limiter
+}
+import { open, readFile, rename } from "node:fs/promises"
+import { mkdirSync } from "node:fs"
+import { dirname } from "node:path"
+import type { GameState, MemoryGameStore, PlayerStats } from "@/lib/game-store"
+import { getStatsWriteBuffer } from "@/lib/stats-write-buffer"
+import { onShutdown } from "@/lib/shutdown"
+
+// Binary snapshots of the in-memory store so deploys keep games and streaks.
+//
+// Layout: "GWSN", u16 version, f64 taken-at, then tagged records until a 0 tag.
+//   1  game   u8 id length, id, f64 target, u16 attempts, u16 max attempts,
+//             u8 status, f64 min, f64 max, f64 expires-at, f64 started-at,
+//             u8 difficulty (version 1 files stop before started-at,
+//             version 2 before difficulty)
+//   2  stats  u8 id length, id, u32 total games, u32 games won, f64 total score,
+//             u32 best streak, u32 current streak
+//
+// Records are streamed out in small chunks, so a periodic snapshot never holds
+// the event loop for longer than it takes to encode one chunk.
+
+const MAGIC = "GWSN"
+const VERSION = 3
+const CHUNK_BYTES = 64 * 1024
+const MAX_RECORD_BYTES = 64 + 255
+
+const TAG_END = 0
+const TAG_GAME = 1
+const TAG_STATS = 2
+
+const STATUSES: GameState["status"][] = ["playing", "won", "lost"]
+const DIFFICULTIES: GameState["difficulty"][] = ["easy", "normal", "hard", "expert"]
+
+export async function writeSnapshot(store: MemoryGameStore, path: string) {
+  // Copy everything before the first await: requests keep running while the
+  // file is written, and guesses update game objects in place
+  const games = Array.from(store.games.dump(), ([id, game, expiresAt]) => [id, { ...game }, expiresAt] as const)
+  const playerStats = Array.from(store.playerStats, ([id, stats]) => [id, { ...stats }] as const)
+
+  mkdirSync(dirname(path), { recursive: true })
+  const tmpPath = `${path}.tmp`
+  const file = await open(tmpPath, "w")
+
+  try {
+    let chunk = Buffer.allocUnsafe(CHUNK_BYTES)
+    let offset = 0
+    const flush = async () => {
+      await file.write(chunk, 0, offset)
+      // The previous chunk may still be referenced by the pending write
+      chunk = Buffer.allocUnsafe(CHUNK_BYTES)
+      offset = 0
+    }
+
+    offset += chunk.write(MAGIC, offset, "latin1")
+    offset = chunk.writeUInt16LE(VERSION, offset)
+    offset = chunk.writeDoubleLE(Date.now(), offset)
+
+    for (const [id, game, expiresAt] of games) {
+      if (id.length > 255) continue
+      if (offset + MAX_RECORD_BYTES > CHUNK_BYTES) await flush()
+
+      offset = chunk.writeUInt8(TAG_GAME, offset)
+      offset = chunk.writeUInt8(id.length, offset)
+      offset += chunk.write(id, offset, "latin1")
+      offset = chunk.writeDoubleLE(game.targetNumber, offset)
+      offset = chunk.writeUInt16LE(game.attempts, offset)
+      offset = chunk.writeUInt16LE(game.maxAttempts, offset)
+      offset = chunk.writeUInt8(STATUSES.indexOf(game.status), offset)
+      offset = chunk.writeDoubleLE(game.minRange, offset)
+      offset = chunk.writeDoubleLE(game.maxRange, offset)
+      offset = chunk.writeDoubleLE(expiresAt, offset)
+      offset = chunk.writeDoubleLE(game.startedAt, offset)
+      offset = chunk.writeUInt8(DIFFICULTIES.indexOf(game.difficulty), offset)
+    }
+
+    for (const [id, stats] of playerStats) {
+      if (id.length > 255) continue
+      if (offset + MAX_RECORD_BYTES > CHUNK_BYTES) await flush()
+
+      offset = chunk.writeUInt8(TAG_STATS, offset)
+      offset = chunk.writeUInt8(id.length, offset)
+      offset += chunk.write(id, offset, "latin1")
+      offset = chunk.writeUInt32LE(stats.totalGames, offset)
+      offset = chunk.writeUInt32LE(stats.gamesWon, offset)
+      offset = chunk.writeDoubleLE(stats.totalScore, offset)
+      offset = chunk.writeUInt32LE(stats.bestStreak, offset)
+      offset = chunk.writeUInt32LE(stats.currentStreak, offset)
+    }
+
+    offset = chunk.writeUInt8(TAG_END, offset)
+    await flush()
+    await file.sync()
+  } finally {
+    await file.close()
+  }
+
+  // Readers only ever see a complete snapshot
+  await rename(tmpPath, path)
+}
+
+export async function restoreSnapshot(store: MemoryGameStore, path: string) {
+  let data: Buffer
+  try {
+    data = await readFile(path)
+  } catch (error) {
+    if ((error as NodeJS.ErrnoException).code === "ENOENT") return false
+    throw error
+  }
+
+  const version = data.readUInt16LE(4)
+  if (data.toString("latin1", 0, 4) !== MAGIC || version < 1 || version > VERSION) {
+    throw new Error(`Unrecognized snapshot format in ${path}`)
+  }
+
+  let offset = 14
+  for (;;) {
+    const tag = data.readUInt8(offset++)
+    if (tag === TAG_END) break
+
+    const idLength = data.readUInt8(offset++)
+    const id = data.toString("latin1", offset, offset + idLength)
+    offset += idLength
+
+    if (tag === TAG_GAME) {
+      const game: GameState = {
+        targetNumber: data.readDoubleLE(offset),
+        attempts: data.readUInt16LE(offset + 8),
+        maxAttempts: data.readUInt16LE(offset + 10),
+        status: STATUSES[data.readUInt8(offset + 12)],
+        difficulty: version >= 3 ? DIFFICULTIES[data.readUInt8(offset + 45)] : "normal",
+        minRange: data.readDoubleLE(offset + 13),
+        maxRange: data.readDoubleLE(offset + 21),
+        startedAt: version >= 2 ? data.readDoubleLE(offset + 37) : 0,
+      }
+      store.games.restore(id, game, data.readDoubleLE(offset + 29))
+      offset += version >= 3 ? 46 : version >= 2 ? 45 : 37
+    } else if (tag === TAG_STATS) {
+      const stats: PlayerStats = {
+        totalGames: data.readUInt32LE(offset),
+        gamesWon: data.readUInt32LE(offset + 4),
+        totalScore: data.readDoubleLE(offset + 8),
+        bestStreak: data.readUInt32LE(offset + 16),
+        currentStreak: data.readUInt32LE(offset + 20),
+      }
+      store.playerStats.set(id, stats)
+      offset += 24
+    } else {
+      throw new Error(`Corrupt snapshot record at byte ${offset} in ${path}`)
+    }
+  }
+  return true
+}
+
+// Restore on boot, snapshot every GAME_SNAPSHOT_INTERVAL_MS, and once more on
+// shutdown after pending stats have been flushed into the store. Cluster
+// workers each keep their own file.
+export async function enableSnapshots(store: MemoryGameStore) {
+  const base = process.env.GAME_SNAPSHOT_PATH || "data/guesswise.snapshot"
+  const path = process.env.WORKER_INDEX ? `${base}.${process.env.WORKER_INDEX}` : base
+  const intervalMs = Number(process.env.GAME_SNAPSHOT_INTERVAL_MS) || 60 * 1000
+
+  try {
+    await restoreSnapshot(store, path)
+  } catch (error) {
+    console.error("Ignoring unreadable game snapshot:", error)
+  }
+
+  let running: Promise<void> | undefined
+  const snapshot = () => {
+    if (!running) {
+      running = writeSnapshot(store, path)
+        .catch((error) => console.error("Failed to write game snapshot:", error))
+        .finally(() => {
+          running = undefined
+        })
+    }
+    return running
+  }
+
+  const timer = setInterval(snapshot, intervalMs)
+  timer.unref?.()
+
+  onShutdown(async () => {
+    await getStatsWriteBuffer().flush()
+    // Wait out a periodic snapshot that may have started before the flush
+    await running
+    await snapshot()
+  })
+}
+import { mkdirSync, readdirSync, statSync } from "node:fs"
+import { open, type FileHandle } from "node:fs/promises"
+import { join } from "node:path"
+import { onShutdown } from "@/lib/shutdown"
+
+// Segmented, append-only log of game events.
+//
+// Record: u16 length of the rest, u8 type, f64 timestamp, f64 value,
+//         u8 game id length, game id, u8 player id length, player id
+//
+// `value` is the target for "start", the guessed number for "guess" and the
+// score for "won"/"lost". Appends only buffer in memory; a background group
+// commit writes and fsyncs everything pending at most every FSYNC_INTERVAL_MS,
+// so one fsync covers many games. Segments roll over at SEGMENT_BYTES.
+
+export type GameEventType = "start" | "guess" | "won" | "lost"
+
+export interface GameEvent {
+  type: GameEventType
+  timestamp: number
+  gameId: string
+  playerId: string
+  value: number
+}
+
+const TYPES: GameEventType[] = ["start", "guess", "won", "lost"]
+const TYPE_CODES: Record<GameEventType, number> = { start: 0, guess: 1, won: 2, lost: 3 }
+
+const SEGMENT_BYTES = 64 * 1024 * 1024
+const FSYNC_INTERVAL_MS = 50
+const MAX_PENDING_BYTES = 1024 * 1024
+const FIXED_BYTES = 2 + 1 + 8 + 8 + 1 + 1
+
+export class EventLog {
+  private pending: Buffer[] = []
+  private pendingBytes = 0
+  private file: FileHandle | undefined
+  private segmentBytes = 0
+  private segment: number
+  private timer: ReturnType<typeof setTimeout> | undefined
+  private writing: Promise<void> = Promise.resolve()
+
+  constructor(
+    private readonly dir: string,
+    private readonly prefix: string,
+  ) {
+    mkdirSync(dir, { recursive: true })
+    // Never append to an existing segment; its tail may be a torn write
+    const existing = listSegments(dir).filter((name) => name.startsWith(`${prefix}-`))
+    this.segment = existing.length ? segmentNumber(existing[existing.length - 1]) + 1 : 1
+  }
+
+  append(event: Omit<GameEvent, "timestamp"> & { timestamp?: number }) {
+    const gameIdLength = Buffer.byteLength(event.gameId, "latin1")
+    const playerIdLength = Buffer.byteLength(event.playerId, "latin1")
+    if (gameIdLength > 255 || playerIdLength > 255) return
+
+    const record = Buffer.allocUnsafe(FIXED_BYTES + gameIdLength + playerIdLength)
+    let offset = record.writeUInt16LE(record.length - 2, 0)
+    offset = record.writeUInt8(TYPE_CODES[event.type], offset)
+    offset = record.writeDoubleLE(event.timestamp ?? Date.now(), offset)
+    offset = record.writeDoubleLE(event.value, offset)
+    offset = record.writeUInt8(gameIdLength, offset)
+    offset += record.write(event.gameId, offset, "latin1")
+    offset = record.writeUInt8(playerIdLength, offset)
+    record.write(event.playerId, offset, "latin1")
+
+    this.pending.push(record)
+    this.pendingBytes += record.length
+    if (this.pendingBytes >= MAX_PENDING_BYTES) {
+      void this.flush()
+    } else if (!this.timer) {
+      this.timer = setTimeout(() => void this.flush(), FSYNC_INTERVAL_MS)
+    }
+  }
+
+  // Resolves once everything appended so far is on disk
+  flush(): Promise<void> {
+    if (this.timer) {
+      clearTimeout(this.timer)
+      this.timer = undefined
+    }
+    const batch = this.pending
+    const bytes = this.pendingBytes
+    this.pending = []
+    this.pendingBytes = 0
+
+    this.writing = this.writing.then(async () => {
+      if (batch.length === 0) return
+      try {
+        await this.write(Buffer.concat(batch, bytes))
+      } catch (error) {
+        console.error("Failed to write game events:", error)
+      }
+    })
+    return this.writing
+  }
+
+  private async write(data: Buffer) {
+    if (!this.file || this.segmentBytes + data.length > SEGMENT_BYTES) {
+      await this.file?.close()
+      this.file = await open(join(this.dir, segmentName(this.prefix, this.segment++)), "a")
+      this.segmentBytes = 0
+    }
+    await this.file.write(data)
+    await this.file.sync()
+    this.segmentBytes += data.length
+  }
+}
+
+function segmentName(prefix: string, segment: number) {
+  return `${prefix}-${String(segment).padStart(10, "0")}.log`
+}
+
+function segmentNumber(name: string) {
+  return Number(name.slice(name.lastIndexOf("-") + 1, -".log".length))
+}
+
+// Segment files by writer prefix, then by sequence number
+export function listSegments(dir: string) {
+  return readdirSync(dir)
+    .filter((name) => name.endsWith(".log"))
+    .sort()
+}
+
+const READ_CHUNK_BYTES = 4 * 1024 * 1024
+
+// One writer's segments, read in order a record at a time. `event` is
+// overwritten by each successful next()/load().
+class WriterCursor {
+  readonly event: GameEvent = { type: "start", timestamp: 0, gameId: "", playerId: "", value: 0 }
+  private data = Buffer.alloc(0)
+  private offset = 0
+  private segment = -1
+  private file: FileHandle | undefined
+  private size = 0
+  private position = 0
+
+  constructor(
+    private readonly dir: string,
+    private readonly segments: string[],
+  ) {}
+
+  // Decode the next buffered record; false if more has to be read first
+  next() {
+    const data = this.data
+    let at = this.offset
+    if (at + 2 > data.length) return false
+    const length = data.readUInt16LE(at)
+    if (at + 2 + length > data.length) return false
+    this.offset = at + 2 + length
+
+    at += 2
+    const event = this.event
+    event.type = TYPES[data.readUInt8(at)]
+    event.timestamp = data.readDoubleLE(at + 1)
+    event.value = data.readDoubleLE(at + 9)
+    at += 17
+    const gameIdLength = data.readUInt8(at++)
+    event.gameId = data.toString("latin1", at, at + gameIdLength)
+    at += gameIdLength
+    const playerIdLength = data.readUInt8(at++)
+    event.playerId = data.toString("latin1", at, at + playerIdLength)
+    return true
+  }
+
+  // Read on until the next record decodes; false once the writer runs out
+  async load() {
+    for (;;) {
+      if (this.next()) return true
+
+      if (this.file && this.position < this.size) {
+        const chunk = Buffer.allocUnsafe(Math.min(READ_CHUNK_BYTES, this.size - this.position))
+        const { bytesRead } = await this.file.read(chunk, 0, chunk.length, this.position)
+        if (bytesRead > 0) {
+          this.position += bytesRead
+          const rest = this.data.subarray(this.offset)
+          const read = chunk.subarray(0, bytesRead)
+          this.data = rest.length ? Buffer.concat([rest, read]) : read
+          this.offset = 0
+          continue
+        }
+      }
+
+      // End of the segment; anything left over is a torn record
+      await this.close()
+      if (++this.segment >= this.segments.length) return false
+      const path = join(this.dir, this.segments[this.segment])
+      this.size = statSync(path).size
+      this.position = 0
+      this.data = Buffer.alloc(0)
+      this.offset = 0
+      this.file = await open(path, "r")
+    }
+  }
+
+  async close() {
+    await this.file?.close()
+    this.file = undefined
+  }
+}
+
+// Calls `visit` for every event in the log in timestamp order, merging the
+// writers' segments; ties keep each writer's own order and go to the writer
+// that sorts first. The event object is reused between calls so replay
+// doesn't allocate per record; copy it if you need to keep it. A torn
+// record at the end of a segment is skipped.
+export async function replayEvents(dir: string, visit: (event: GameEvent) => void) {
+  const writers = new Map<string, string[]>()
+  for (const name of listSegments(dir)) {
+    const prefix = name.slice(0, name.lastIndexOf("-"))
+    writers.set(prefix, [...(writers.get(prefix) || []), name])
+  }
+
+  const all = [...writers.values()].map((segments) => new WriterCursor(dir, segments))
+  let count = 0
+  try {
+    const cursors: WriterCursor[] = []
+    for (const cursor of all) {
+      if (await cursor.load()) cursors.push(cursor)
+    }
+
+    // Few writers (one per worker), so a scan beats a heap
+    while (cursors.length > 0) {
+      let first = 0
+      for (let i = 1; i < cursors.length; i++) {
+        if (cursors[i].event.timestamp < cursors[first].event.timestamp) first = i
+      }
+
+      const cursor = cursors[first]
+      visit(cursor.event)
+      count++
+      if (!cursor.next() && !(await cursor.load())) cursors.splice(first, 1)
+    }
+  } finally {
+    await Promise.all(all.map((cursor) => cursor.close()))
+  }
+  return count
+}
+
+let eventLog: EventLog | null | undefined
+
+// Off unless EVENT_LOG_DIR is set. Cluster workers write their own segments.
+export function getEventLog() {
+  if (eventLog === undefined) {
+    const dir = process.env.EVENT_LOG_DIR
+    if (!dir) {
+      eventLog = null
+    } else {
+      const log = new EventLog(dir, process.env.WORKER_INDEX ? `w${process.env.WORKER_INDEX}` : "w")
+      onShutdown(() => log.flush())
+      eventLog = log
+    }
+  }
+  return eventLog
+}
+import { performance } from "node:perf_hooks"
+import { parseArgs } from "node:util"
+import { replayEvents } from "@/lib/event-log"
+import { applyOutcome, emptyStats, getGameStore, type PlayerStats } from "@/lib/game-store"
+import { LeaderboardIndex, toLeaderboardRow } from "@/lib/leaderboard-index"
+
+// Rebuild player stats and the leaderboard from the game event log.
+//
+//   tsx scripts/replay-events.ts --dir data/events [--write] [--top 10]
+//
+// --write saves the rebuilt stats into the configured GameStore (GAME_STORE),
+// replacing what is there for every player found in the log. It needs
+// GAME_STORE=sqlite: the memory store only lives as long as this process, so
+// writing to it would report success and keep nothing. It also refuses if
+// the store holds games the log doesn't: a log switched on late or with
+// segments removed would otherwise wipe out that history.
+
+const { values: args } = parseArgs({
+  options: {
+    dir: { type: "string", default: process.env.EVENT_LOG_DIR || "data/events" },
+    write: { type: "boolean", default: false },
+    top: { type: "string", default: "10" },
+  },
+})
+
+async function main() {
+  if (args.write && process.env.GAME_STORE !== "sqlite") {
+    console.error(`Not writing: --write needs GAME_STORE=sqlite, not "${process.env.GAME_STORE || "memory"}"`)
+    process.exit(1)
+  }
+
+  const stats = new Map<string, PlayerStats>()
+  const started = performance.now()
+
+  const count = await replayEvents(args.dir!, (event) => {
+    if (event.type !== "won" && event.type !== "lost") return
+
+    let playerStats = stats.get(event.playerId)
+    if (!playerStats) {
+      playerStats = emptyStats()
+      stats.set(event.playerId, playerStats)
+    }
+    applyOutcome(playerStats, event.type === "won", event.value)
+  })
+
+  const leaderboard = new LeaderboardIndex()
+  for (const [playerId, playerStats] of stats) {
+    leaderboard.upsert({
+      id: playerId,
+      score: playerStats.totalScore,
+      gamesWon: playerStats.gamesWon,
+      totalGames: playerStats.totalGames,
+    })
+  }
+  const seconds = (performance.now() - started) / 1000
+
+  console.log(`Replayed ${count} events for ${stats.size} players in ${seconds.toFixed(2)}s`)
+  console.log(`(${Math.round(count / seconds).toLocaleString()} events/s)`)
+  console.table(leaderboard.range(0, Number(args.top)).map((entry, i) => toLeaderboardRow(entry, i + 1)))
+
+  if (args.write) {
+    const store = await getGameStore()
+
+    let uncovered = 0
+    for await (const [playerId, stored] of store.listStats()) {
+      if (stored.totalGames > (stats.get(playerId)?.totalGames ?? 0)) uncovered++
+    }
+    if (uncovered > 0) {
+      console.error(`Not writing: the store has games the log doesn't cover for ${uncovered} players`)
+      process.exit(1)
+    }
+
+    await store.saveStatsBatch([...stats])
+    console.log(`Wrote stats for ${stats.size} players`)
+  }
+  process.exit(0)
+}
+
+main()
+import type { GameState } from "@/lib/game-store"
+
+// Streaming aggregates over finished games: attempts-to-win and score
+// histograms, win rate over time and by range size, and a quantile sketch of
+// game duration. Everything lives in preallocated typed arrays, one slot per
+// minute for the last hour plus an all-time slot, so recording an outcome is
+// a handful of increments and memory never grows.
+
+const SLOT_MS = 60 * 1000
+const SLOTS = 60
+const ATTEMPT_BUCKETS = 32
+const SCORE_BUCKETS = 11
+// log2 of the range size, so ranges up to 2^64 fit
+const RANGE_BUCKETS = 65
+
+// Log-bucketed sketch (DDSketch style): every value in a bucket is within
+// 2% of the bucket's representative value, so quantiles carry at most that
+// relative error. 1024 buckets reach from 1ms to well past a day.
+const SKETCH_ACCURACY = 0.02
+const SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+const SKETCH_LOG_GAMMA = Math.log(SKETCH_GAMMA)
+const SKETCH_BUCKETS = 1024
+
+class Slot {
+  minute = -1
+  games = 0
+  wins = 0
+  readonly attempts = new Uint32Array(ATTEMPT_BUCKETS)
+  readonly scores = new Uint32Array(SCORE_BUCKETS)
+  readonly rangeGames = new Uint32Array(RANGE_BUCKETS)
+  readonly rangeWins = new Uint32Array(RANGE_BUCKETS)
+  readonly durations = new Uint32Array(SKETCH_BUCKETS)
+
+  reset(minute: number) {
+    this.minute = minute
+    this.games = 0
+    this.wins = 0
+    this.attempts.fill(0)
+    this.scores.fill(0)
+    this.rangeGames.fill(0)
+    this.rangeWins.fill(0)
+    this.durations.fill(0)
+  }
+
+  record(won: boolean, attempts: number, score: number, rangeBucket: number, durationBucket: number) {
+    this.games++
+    this.rangeGames[rangeBucket]++
+    if (won) {
+      this.wins++
+      this.rangeWins[rangeBucket]++
+      this.attempts[Math.min(attempts, ATTEMPT_BUCKETS - 1)]++
+      this.scores[Math.min(Math.max(Math.round(score / 10), 0), SCORE_BUCKETS - 1)]++
+    }
+    if (durationBucket >= 0) this.durations[durationBucket]++
+  }
+}
+
+const slots = Array.from({ length: SLOTS }, () => new Slot())
+const allTime = new Slot()
+
+function durationBucket(ms: number) {
+  if (ms < 1) return 0
+  return Math.min(Math.ceil(Math.log(ms) / SKETCH_LOG_GAMMA), SKETCH_BUCKETS - 1)
+}
+
+export function recordOutcome(game: GameState, won: boolean, score: number, now = Date.now()) {
+  const minute = Math.floor(now / SLOT_MS)
+  const slot = slots[minute % SLOTS]
+  if (slot.minute !== minute) slot.reset(minute)
+
+  const rangeBucket = Math.min(Math.ceil(Math.log2(game.maxRange - game.minRange + 1)), RANGE_BUCKETS - 1)
+  // Games restored from before start times were tracked have startedAt 0
+  const duration = game.startedAt > 0 ? durationBucket(now - game.startedAt) : -1
+
+  slot.record(won, game.attempts, score, rangeBucket, duration)
+  allTime.record(won, game.attempts, score, rangeBucket, duration)
+}
+
+function sum(into: Float64Array, from: Uint32Array) {
+  for (let i = 0; i < from.length; i++) into[i] += from[i]
+}
+
+function histogramQuantile(counts: Float64Array, total: number, q: number) {
+  let seen = 0
+  for (let i = 0; i < counts.length; i++) {
+    seen += counts[i]
+    if (seen > 0 && seen >= q * total) return i
+  }
+  return 0
+}
+
+function sketchQuantile(counts: Float64Array, total: number, q: number) {
+  if (total === 0) return 0
+  const bucket = histogramQuantile(counts, total, q)
+  // Midpoint of the bucket's [gamma^(i-1), gamma^i] range in relative terms
+  return Math.round((2 * Math.pow(SKETCH_GAMMA, bucket)) / (SKETCH_GAMMA + 1))
+}
+
+function summarize(source: Slot[]) {
+  let games = 0
+  let wins = 0
+  const attempts = new Float64Array(ATTEMPT_BUCKETS)
+  const scores = new Float64Array(SCORE_BUCKETS)
+  const rangeGames = new Float64Array(RANGE_BUCKETS)
+  const rangeWins = new Float64Array(RANGE_BUCKETS)
+  const durations = new Float64Array(SKETCH_BUCKETS)
+
+  for (const slot of source) {
+    games += slot.games
+    wins += slot.wins
+    sum(attempts, slot.attempts)
+    sum(scores, slot.scores)
+    sum(rangeGames, slot.rangeGames)
+    sum(rangeWins, slot.rangeWins)
+    sum(durations, slot.durations)
+  }
+  const timed = durations.reduce((total, count) => total + count, 0)
+
+  return {
+    games,
+    wins,
+    winRate: games > 0 ? Math.round((wins / games) * 1000) / 10 : 0,
+    attemptsToWin: {
+      histogram: Object.fromEntries([...attempts].flatMap((count, i) => (count ? [[i, count]] : []))),
+      p50: histogramQuantile(attempts, wins, 0.5),
+      p90: histogramQuantile(attempts, wins, 0.9),
+    },
+    scores: Object.fromEntries([...scores].flatMap((count, i) => (count ? [[i * 10, count]] : []))),
+    byRange: [...rangeGames].flatMap((count, i) =>
+      count ? [{ maxRangeSize: 2 ** i, games: count, winRate: Math.round((rangeWins[i] / count) * 1000) / 10 }] : [],
+    ),
+    durationMs: {
+      p50: sketchQuantile(durations, timed, 0.5),
+      p90: sketchQuantile(durations, timed, 0.9),
+      p99: sketchQuantile(durations, timed, 0.99),
+    },
+  }
+}
+
+// Aggregates over the last `minutes` minutes (at most an hour) and all time,
+// plus the per-minute win rate series for the window
+export function analyticsSnapshot(minutes: number, now = Date.now()) {
+  const current = Math.floor(now / SLOT_MS)
+  const window = Math.min(Math.max(minutes, 1), SLOTS)
+  const recent = slots.filter((slot) => slot.minute > current - window && slot.minute <= current)
+
+  return {
+    windowMinutes: window,
+    window: summarize(recent),
+    allTime: summarize([allTime]),
+    winRateByMinute: recent
+      .sort((a, b) => a.minute - b.minute)
+      .map((slot) => ({
+        minute: new Date(slot.minute * SLOT_MS).toISOString(),
+        games: slot.games,
+        wins: slot.wins,
+      })),
+  }
+}
+import { type NextRequest, NextResponse } from "next/server"
+import { analyticsSnapshot } from "@/lib/game-analytics"
+import { WORKER_ID } from "@/lib/metrics"
+import { rejectUnauthorized } from "@/lib/operator-auth"
+
+// GET /api/analytics?window=<minutes>   gameplay aggregates for this process
+//
+// Needs METRICS_TOKEN, like /api/metrics. Under cluster.ts add ?worker=<index>
+// to read a given worker; `worker` in the response says which one answered.
+export async function GET(request: NextRequest) {
+  const rejected = rejectUnauthorized(request)
+  if (rejected) return rejected
+
+  const window = Number.parseInt(request.nextUrl.searchParams.get("window") || "60")
+
+  return NextResponse.json({
+    success: true,
+    worker: WORKER_ID,
+    analytics: analyticsSnapshot(isNaN(window) ? 60 : window),
+  })
+}
+// Seedable random numbers for game targets.
+//
+// Targets come from xoshiro128** rather than Math.random so a run can be
+// replayed: with GAME_SEED set, the n-th game started in a process always
+// gets the same target. Targets are drawn ahead of time into a ring buffer
+// that refills between requests, so starting a game is a single array read.
+// (Game IDs still come from the CSPRNG in lib/ids.)
+
+export interface RandomSource {
+  // Uniform integer in [0, 2^32)
+  nextUint32(): number
+}
+
+// xoshiro128** by Blackman and Vigna: 128 bits of state, 32-bit output
+export class Xoshiro128 implements RandomSource {
+  private s0: number
+  private s1: number
+  private s2: number
+  private s3: number
+
+  // A number is a replayable 32-bit seed; four words (see entropySeed) fill
+  // the whole state
+  constructor(seed: number | Uint32Array) {
+    if (typeof seed !== "number") {
+      this.s0 = seed[0] | 0
+      this.s1 = seed[1] | 0
+      this.s2 = seed[2] | 0
+      this.s3 = seed[3] | 0
+      // All zeros is the one state xoshiro can't leave
+      if (this.s0 || this.s1 || this.s2 || this.s3) return
+      seed = 0
+    }
+
+    // Expand the 32-bit seed with splitmix32 so similar seeds diverge
+    let state = seed | 0
+    const next = () => {
+      state = (state + 0x9e3779b9) | 0
+      let z = state
+      z = Math.imul(z ^ (z >>> 16), 0x85ebca6b)
+      z = Math.imul(z ^ (z >>> 13), 0xc2b2ae35)
+      return (z ^ (z >>> 16)) | 0
+    }
+    this.s0 = next()
+    this.s1 = next()
+    this.s2 = next()
+    this.s3 = next()
+  }
+
+  nextUint32() {
+    const result = Math.imul(rotl(Math.imul(this.s1, 5), 7), 9) >>> 0
+    const t = this.s1 << 9
+
+    this.s2 ^= this.s0
+    this.s3 ^= this.s1
+    this.s1 ^= this.s2
+    this.s0 ^= this.s3
+    this.s2 ^= t
+    this.s3 = rotl(this.s3, 11)
+
+    return result
+  }
+}
+
+function rotl(x: number, k: number) {
+  return (x << k) | (x >>> (32 - k))
+}
+
+// Uniform integer in [min, max], without modulo bias. Ranges wider than 2^32
+// go through randomBigInt; a single draw can't cover them.
+export function randomInt(source: RandomSource, min: number, max: number) {
+  const range = max - min + 1
+  if (range > 2 ** 32) return Number(randomBigInt(source, BigInt(min), BigInt(max)))
+  const limit = 2 ** 32 - (2 ** 32 % range)
+  let x = source.nextUint32()
+  while (x >= limit) {
+    x = source.nextUint32()
+  }
+  return min + (x % range)
+}
+
+// Uniform bigint in [min, max], for ranges too wide for randomInt. Draws just
+// enough 32-bit words to cover the range and rejects anything past the end.
+export function randomBigInt(source: RandomSource, min: bigint, max: bigint) {
+  const span = max - min
+  const bits = span.toString(2).length
+  const words = Math.ceil(bits / 32)
+  const mask = (BigInt(1) << BigInt(bits)) - BigInt(1)
+  for (;;) {
+    let x = BigInt(0)
+    for (let i = 0; i < words; i++) {
+      x = (x << BigInt(32)) | BigInt(source.nextUint32())
+    }
+    x &= mask
+    if (x <= span) return min + x
+  }
+}
+
+// 128 bits from the CSPRNG, for generators that never need replaying
+export function entropySeed() {
+  return crypto.getRandomValues(new Uint32Array(4))
+}
+
+// FNV-1a, so GAME_SEED can be any string
+export function hashSeed(seed: string) {
+  let hash = 0x811c9dc5
+  for (let i = 0; i < seed.length; i++) {
+    hash = Math.imul(hash ^ seed.charCodeAt(i), 0x01000193)
+  }
+  return hash >>> 0
+}
+
+const POOL_SIZE = 4096
+const REFILL_BELOW = 1024
+
+export class TargetPool {
+  private readonly targets = new Float64Array(POOL_SIZE)
+  private head = 0
+  private count = 0
+  private refillScheduled = false
+
+  constructor(
+    private readonly source: RandomSource,
+    private readonly min: number,
+    private readonly max: number,
+  ) {
+    this.refill()
+  }
+
+  take() {
+    if (this.count === 0) this.refill()
+
+    const target = this.targets[this.head]
+    this.head = (this.head + 1) % POOL_SIZE
+    this.count--
+
+    if (this.count < REFILL_BELOW && !this.refillScheduled) {
+      this.refillScheduled = true
+      setImmediate(() => this.refill())
+    }
+    return target
+  }
+
+  // Draws are appended in order, so the sequence is the same no matter when
+  // refills happen to run
+  private refill() {
+    this.refillScheduled = false
+    let tail = (this.head + this.count) % POOL_SIZE
+    while (this.count < POOL_SIZE) {
+      this.targets[tail] = randomInt(this.source, this.min, this.max)
+      tail = (tail + 1) % POOL_SIZE
+      this.count++
+    }
+  }
+}
+
+const pools = new Map<string, TargetPool>()
+
+// Each range gets its own generator, seeded from GAME_SEED and the range when
+// set, so one range's refills never shift another range's sequence
+export function createRandomSource(stream: string): RandomSource {
+  const seed = process.env.GAME_SEED
+  return new Xoshiro128(seed ? hashSeed(`${seed}:${stream}`) : entropySeed())
+}
+
+export function getTargetPool(min: number, max: number) {
+  const key = `${min}:${max}`
+  let pool = pools.get(key)
+  if (!pool) {
+    pool = new TargetPool(createRandomSource(key), min, max)
+    pools.set(key, pool)
+  }
+  return pool
+}
+import { randomBigInt, randomInt, type RandomSource } from "@/lib/rng"
+
+// Rules of the guessing game, shared by the /api/game handler and the
+// client-only games so a range, attempt limit or scoring change lands in one
+// place.
+//
+// Bounds are numbers or bigints: number ranges are exact up to 2^53, bigint
+// ranges can be as wide as needed. Everything that depends on the range is
+// worked out once in createRules, so judging a guess is a few comparisons and
+// never allocates.
+
+export type Bound = number | bigint
+export type ScoringCurve = "linear" | "proportional"
+export type Difficulty = "easy" | "normal" | "hard" | "expert"
+
+export interface GameRules<T extends Bound = number> {
+  minRange: T
+  maxRange: T
+  maxAttempts: number
+  scoring: ScoringCurve
+}
+
+// What a guess did, as a plain number so callers can switch on it
+export const GUESS_CORRECT = 0
+export const GUESS_TOO_LOW = 1
+export const GUESS_TOO_HIGH = 2
+export const GUESS_OUT_OF_ATTEMPTS = 3
+export type GuessOutcome =
+  | typeof GUESS_CORRECT
+  | typeof GUESS_TOO_LOW
+  | typeof GUESS_TOO_HIGH
+  | typeof GUESS_OUT_OF_ATTEMPTS
+
+const MAX_SCORE = 100
+const MIN_SCORE = 10
+const LINEAR_STEP = 10
+
+// floor(log2(size)) + 1, i.e. the bit length of size: exactly enough guesses
+// for a binary search to always find the number (a range of 2 needs 2)
+export function attemptLimit(minRange: Bound, maxRange: Bound) {
+  const size =
+    typeof minRange === "bigint" ? BigInt(maxRange) - minRange + BigInt(1) : Number(maxRange) - minRange + 1
+  return Math.max(size.toString(2).length, 1)
+}
+
+export function createRules<T extends Bound>(
+  minRange: T,
+  maxRange: T,
+  scoring: ScoringCurve = "linear",
+  maxAttempts = attemptLimit(minRange, maxRange),
+): GameRules<T> {
+  if (typeof minRange === "number" && !(Number.isSafeInteger(minRange) && Number.isSafeInteger(maxRange))) {
+    throw new Error(`Number ranges must be safe integers, got ${minRange}..${maxRange}`)
+  }
+  if (maxRange < minRange) {
+    throw new Error(`Empty range ${minRange}..${maxRange}`)
+  }
+  if (!Number.isInteger(maxAttempts) || maxAttempts < 1) {
+    throw new Error(`maxAttempts must be a positive integer, got ${maxAttempts}`)
+  }
+  return { minRange, maxRange, maxAttempts, scoring }
+}
+
+export const RULES: Record<Difficulty, GameRules> = {
+  easy: createRules(1, 50),
+  normal: createRules(1, 100),
+  hard: createRules(1, 1000, "proportional"),
+  expert: createRules(1, 1_000_000, "proportional"),
+}
+
+export const DEFAULT_DIFFICULTY: Difficulty = "normal"
+
+export function isDifficulty(value: unknown): value is Difficulty {
+  return typeof value === "string" && Object.prototype.hasOwnProperty.call(RULES, value)
+}
+
+export function isInRange<T extends Bound>(rules: Pick<GameRules<T>, "minRange" | "maxRange">, guess: T) {
+  return guess >= rules.minRange && guess <= rules.maxRange
+}
+
+// `attempts` includes this guess
+export function evaluateGuess<T extends Bound>(
+  target: T,
+  guess: T,
+  attempts: number,
+  maxAttempts: number,
+): GuessOutcome {
+  if (guess === target) return GUESS_CORRECT
+  if (attempts >= maxAttempts) return GUESS_OUT_OF_ATTEMPTS
+  return guess < target ? GUESS_TOO_LOW : GUESS_TOO_HIGH
+}
+
+// Points for a win on the given attempt. "linear" is the original curve, 10
+// points off per extra guess; "proportional" spreads the same 100..10 over
+// the attempt limit so wide ranges don't bottom out halfway through.
+export function scoreFor(scoring: ScoringCurve, attempts: number, maxAttempts: number) {
+  if (scoring === "linear") {
+    return Math.max(MAX_SCORE - (attempts - 1) * LINEAR_STEP, MIN_SCORE)
+  }
+  const spent = maxAttempts > 1 ? (attempts - 1) / (maxAttempts - 1) : 0
+  return Math.max(Math.round(MAX_SCORE - spent * (MAX_SCORE - MIN_SCORE)), MIN_SCORE)
+}
+
+export function randomTarget<T extends Bound>(rules: GameRules<T>, source: RandomSource): T {
+  const { minRange, maxRange } = rules
+  if (typeof minRange === "bigint") {
+    return randomBigInt(source, minRange, maxRange as bigint) as T
+  }
+  return randomInt(source, minRange, maxRange as number) as T
+}